@@ -0,0 +1,55 @@
+import argparse
+import sys
+
+from libs.scheduler import build_matrix, format_summary, list_boards
+
+
+def parse_project(value):
+    """
+    NAME=file1.v,file2.v
+    """
+    name, _, files = value.partition('=')
+    if not name or not files:
+        raise argparse.ArgumentTypeError(f"Progetto non valido: {value} (atteso NAME=file1.v,file2.v)")
+    return name, files.split(',')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compila piu progetti per piu board in parallelo')
+    parser.add_argument('quartus_dir', nargs='?', default='C:\\intelFPGA_lite\\23.1std\\quartus',
+                        help='Directory di installazione di Quartus')
+    parser.add_argument('--board', '-b', action='append', dest='boards',
+                        help='Board da compilare (ripetibile, default: tutte le boards/*.yaml)')
+    parser.add_argument('--project', '-p', action='append', type=parse_project, dest='projects',
+                        help='Progetto come NAME=file1.v,file2.v (ripetibile)')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='Numero di build in parallelo')
+    parser.add_argument('--max-ram', type=int, default=None, help='Memoria totale massima in MB')
+    parser.add_argument('--projects-dir', default='./projects', help='Directory dei progetti')
+    parser.add_argument('--program', action='store_true', help='Programma il dispositivo dopo la build')
+    parser.add_argument('--profile', default=None,
+                        help='Profilo di compilazione (fast-iteration, max-fmax, ...), default: FAYA_PROFILE')
+
+    args = parser.parse_args()
+
+    boards = args.boards or list_boards()
+    projects = dict(args.projects or [
+        ('DE0_NANO', ['./verilogs/helloworld/DE0_NANO.v', './verilogs/helloworld/vjtag_interface.v'])
+    ])
+
+    # Tutti i job userebbero lo stesso cavo
+    if args.program and len(boards) * len(projects) > 1:
+        parser.error("--program richiede una sola board e un solo progetto")
+
+    results = build_matrix(args.quartus_dir, boards, projects,
+                           jobs=args.jobs, max_ram_mb=args.max_ram,
+                           projects_root=args.projects_dir, program=args.program, profile=args.profile)
+
+    print()
+    print(format_summary(results))
+
+    if any(result['status'] != 'ok' for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
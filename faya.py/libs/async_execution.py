@@ -0,0 +1,311 @@
+import asyncio
+import codecs
+import contextvars
+import locale
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Generator, List, Optional
+
+from libs.build_trace import bind_track, trace_command, trace_phase
+from libs.execution import (Parallel, QuartusError, StepResult, check_exit_status, command_label, kill_pid_tree,
+                            split_command)
+from libs.flow_graph import FlowError, FlowGraph, NodeResult
+from libs.quartus_messages import QuartusMessages, QuartusOutput, ERROR, CRITICAL_WARNING, WARNING
+
+
+class QuartusTimeoutError(TimeoutError):
+    """
+    Raised when a Quartus command does not complete within its timeout.
+
+    The process tree has been killed; stdout keeps the last lines it printed.
+    """
+    def __init__(self, message, stdout: str = ''):
+        super().__init__(message)
+        self.stdout = stdout
+
+
+async def iter_chunks_async(reader: asyncio.StreamReader, chunk_size: int = 1 << 16,
+                            encoding: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Decoded output of a process pipe in blocks of complete lines, see iter_chunks.
+    """
+    decoder = codecs.getincrementaldecoder(encoding or locale.getpreferredencoding(False))(errors='replace')
+    pending = ''
+    while True:
+        data = await reader.read(chunk_size)
+        if not data:
+            break
+        pending += decoder.decode(data)
+        cut = pending.rfind('\n') + 1
+        if cut:
+            yield pending[:cut].replace('\r\n', '\n')
+            pending = pending[cut:]
+
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending.replace('\r\n', '\n') + '\n'
+
+
+def kill_async_process(process: asyncio.subprocess.Process):
+    """
+    Kill a process started by run_quartus_async together with its children.
+    """
+    if process.returncode is not None:
+        return
+    if not kill_pid_tree(process.pid):
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def run_quartus_async(command: list, working_dir: str = None, engine=None, stream: bool = False,
+                            log_file: str = None, abort_on_error: bool = False, timeout: Optional[float] = None,
+                            echo: bool = False, tail_lines: Optional[int] = None) -> str:
+    """
+    Coroutine counterpart of run_quartus, on asyncio.create_subprocess_exec.
+
+    Many commands can run concurrently in one event loop. The output is
+    parsed as it is produced (see run_quartus_streaming); if the command
+    times out, fails with abort_on_error or the awaiting task is cancelled,
+    the whole process tree is killed.
+
+    The command is recorded in the active BuildTrace, if any, with its wall
+    time and exit status (CPU time and peak RSS are not measured).
+
+    Args:
+        command (list): Command and arguments, as passed to run_quartus
+        working_dir (str): Working directory for the command
+        engine: Ignored: the persistent shells are synchronous, every command
+                runs in its own process
+        stream (bool): Ignored, the output is always processed as it is produced
+        log_file (str): File receiving the full output
+        abort_on_error (bool): Kill the command at the first error
+        timeout (float): Seconds before the command is killed (no limit if None)
+        echo (bool): Print the output while it is produced
+        tail_lines (int): Number of final lines returned and kept in memory
+                          (all of them, unless the output goes to a log file)
+
+    Returns:
+        QuartusOutput: The output, with the parsed messages
+
+    Raises:
+        QuartusError: If errors were reported or the command was aborted
+        QuartusExitError: If the command exited with a non-zero status without reporting errors
+        QuartusTimeoutError: If the command did not complete in time
+    """
+    if tail_lines is None and log_file:
+        tail_lines = 200
+
+    with trace_command(command_label(command), command, working_dir) as record:
+        process = await asyncio.create_subprocess_exec(
+            *split_command(command),
+            env=os.environ.copy(),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=working_dir,
+            # Own process group, so that the whole tree can be killed
+            start_new_session=(os.name != 'nt'),
+            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
+        )
+
+        # Info messages are only counted, a fitter log has millions of them
+        messages = QuartusMessages(keep=(ERROR, CRITICAL_WARNING, WARNING))
+        tail = deque(maxlen=tail_lines)
+        stderr_lines = deque(maxlen=tail_lines or 200)
+        aborted = []
+
+        async def read_stdout():
+            log = open(log_file, 'w') if log_file else None
+            try:
+                async for chunk in iter_chunks_async(process.stdout):
+                    if log is not None:
+                        log.write(chunk)
+                    if echo:
+                        sys.stdout.write(chunk)
+                        sys.stdout.flush()
+                    messages.feed_text(chunk)
+                    tail.extend(chunk.splitlines())
+                    if abort_on_error and messages.has_errors and not aborted:
+                        aborted.append(True)
+                        kill_async_process(process)
+            finally:
+                if log is not None:
+                    log.close()
+
+        async def read_stderr():
+            async for chunk in iter_chunks_async(process.stderr):
+                stderr_lines.extend(chunk.splitlines())
+
+        try:
+            await asyncio.wait_for(asyncio.gather(read_stdout(), read_stderr(), process.wait()), timeout)
+        except asyncio.TimeoutError:
+            kill_async_process(process)
+            await process.wait()
+            record['exit_status'] = process.returncode
+            raise QuartusTimeoutError(f"{command_label(command)}: no result after {timeout} s",
+                                      stdout='\n'.join(tail))
+        except BaseException:
+            # Cancelled: nothing must survive the task
+            kill_async_process(process)
+            raise
+        record['exit_status'] = process.returncode
+
+    out = '\n'.join(tail)
+    stderr = '\n'.join(stderr_lines)
+
+    if messages.has_errors or stderr:
+        message = '\n'.join(error.text for error in messages.errors[:20]) or stderr
+        if aborted:
+            message = "Aborted at the first error: " + message
+        if log_file:
+            message += f"\n(full output in {log_file})"
+        raise QuartusError(message, stdout=out, stderr=stderr, messages=messages)
+    check_exit_status(process.returncode, command, out, stderr, messages, log_file)
+
+    return QuartusOutput(out, messages)
+
+
+async def run_parallel_async(requests: Parallel, timeout: Optional[float] = None) -> List[StepResult]:
+    """
+    Run the commands of a Parallel step concurrently, see run_parallel.
+    """
+    async def run(request):
+        command, options = request
+        start = time.perf_counter()
+        try:
+            return StepResult(await run_quartus_async(command, timeout=timeout, **options), None,
+                              time.perf_counter() - start)
+        except Exception as e:
+            return StepResult(None, e, time.perf_counter() - start)
+
+    return list(await asyncio.gather(*(run(request) for request in requests)))
+
+
+def _advance(method, *args):
+    # StopIteration cannot cross a Future: the end of the steps is returned instead
+    try:
+        return False, method(*args)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+async def run_command_steps_async(steps: Generator, timeout: Optional[float] = None):
+    """
+    Coroutine counterpart of run_command_steps: the commands yielded by the
+    steps run with run_quartus_async.
+
+    The code of the steps between two commands (hashing, caches, source
+    scanning, quartus_sh --version) runs in the default executor, so that
+    it does not block the other builds of the event loop. It always runs in
+    the same context, where its trace phases are opened and closed.
+
+    Args:
+        steps (Generator): Steps of a flow, see run_command_steps
+        timeout (float): Timeout of each command
+
+    Returns:
+        The return value of the steps
+    """
+    loop = asyncio.get_running_loop()
+    bind_track()
+    context = contextvars.copy_context()
+    advancing = None
+
+    async def advance(method, *args):
+        nonlocal advancing
+        advancing = loop.run_in_executor(None, context.run, _advance, method, *args)
+        try:
+            # Shielded: cancelling the task does not stop the thread, see below
+            return await asyncio.shield(advancing)
+        finally:
+            # The commands of this task are recorded in the phases opened by the steps
+            for variable, value in context.items():
+                variable.set(value)
+
+    try:
+        finished, request = await advance(next, steps)
+        while not finished:
+            if isinstance(request, Parallel):
+                finished, request = await advance(steps.send, await run_parallel_async(request, timeout))
+                continue
+            command, options = request
+            try:
+                output = await run_quartus_async(command, timeout=timeout, **options)
+            except Exception as e:
+                finished, request = await advance(steps.throw, e)
+            else:
+                finished, request = await advance(steps.send, output)
+        return request
+    finally:
+        # A generator running in the executor cannot be closed: cancelled meanwhile, it is awaited
+        if advancing is not None and not advancing.done():
+            await asyncio.wait([advancing])
+        # Closed here when cancelled, so that its phases end in this task
+        context.run(steps.close)
+
+
+async def run_graph_async(graph: FlowGraph, timeout: Optional[float] = None) -> Dict[str, NodeResult]:
+    """
+    Coroutine counterpart of run_graph: every node is a task, started as
+    soon as its dependencies are done.
+
+    If the awaiting task is cancelled, the running nodes are cancelled as
+    well and their processes killed.
+
+    Args:
+        graph (FlowGraph): Nodes of the flow
+        timeout (float): Timeout of each command
+
+    Returns:
+        dict: Result of each node, see NodeResult
+
+    Raises:
+        FlowError: If any node failed
+    """
+    dependencies = graph.dependencies()
+    graph.order()
+
+    async def run(node, inputs):
+        with trace_phase(node.name):
+            return await run_command_steps_async(node.steps(inputs), timeout)
+
+    results: Dict[str, NodeResult] = {}
+    artifacts = {}
+    done, started, failed = set(), set(), set()
+    running = {}  # {task: (name, start)}
+    start = time.perf_counter()
+
+    try:
+        while True:
+            blocked = graph.downstream(dependencies, failed)
+            for name in graph.ready(dependencies, done, started | blocked):
+                started.add(name)
+                task = asyncio.ensure_future(run(graph.nodes[name], graph.inputs_of(name, artifacts)))
+                running[task] = (name, time.perf_counter())
+            if not running:
+                break
+
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                name, node_start = running.pop(task)
+                wall_s = time.perf_counter() - node_start
+                if task.exception() is None:
+                    results[name] = NodeResult(task.result(), None, node_start - start, wall_s)
+                    artifacts.update(dict.fromkeys(graph.nodes[name].outputs, results[name].value))
+                    done.add(name)
+                else:
+                    results[name] = NodeResult(None, task.exception(), node_start - start, wall_s)
+                    failed.add(name)
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    if failed:
+        raise FlowError(results, [name for name in graph.order() if name not in results])
+    return results
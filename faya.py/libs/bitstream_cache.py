@@ -0,0 +1,192 @@
+import glob
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from libs.hashing import hash_strings
+from libs.materialize import materialize
+from libs.paths import write_cache_entry
+
+# Artifacts kept for every build ({rev} = revision name)
+ARTIFACT_PATTERNS = ['{rev}.sof', '{rev}.pof', '{rev}.*.rpt', '{rev}.*.summary', '{rev}.sld']
+
+META_NAME = "meta.json"
+
+
+class BitstreamCache:
+    """
+    Content-addressed cache of compiled bitstreams (.sof/.pof) and reports.
+
+    Entries are keyed on the hashes of the sources and of the settings, the
+    device part and the Quartus version, so it can be shared between projects
+    and machines through a common directory. Entries are written atomically
+    and the least recently used ones are evicted above `max_size` bytes.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], max_size: int = 10 * 1024 ** 3):
+        """
+        Args:
+            cache_dir (Union[str, Path]): Local or shared directory of the cache
+            max_size (int): Maximum total size of the entries in bytes
+        """
+        self.cache_dir = Path(cache_dir)
+        self.entries_dir = self.cache_dir / "entries"
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def key(sources_hash: str, settings_hash: str, part: str, quartus_version: str) -> str:
+        """
+        Cache key of a build.
+
+        Args:
+            sources_hash (str): Hash of the sources (and IP core files)
+            settings_hash (str): Hash of the project settings
+            part (str): Device part, e.g. board['device']
+            quartus_version (str): Version of Quartus
+        """
+        return hash_strings('bitstream', sources_hash, settings_hash, part, quartus_version)
+
+    def entry_dir(self, key: str) -> Path:
+        return self.entries_dir / key
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """
+        Metadata of an entry, None if not cached. A hit marks the entry as recently used.
+        """
+        meta_path = self.entry_dir(key) / META_NAME
+        try:
+            with open(meta_path, 'r') as file:
+                meta = json.load(file)
+        except (FileNotFoundError, ValueError):
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        # The mtime of the metadata file is the "last used" time of the entry
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return meta
+
+    def restore(self, key: str, project_dir: Union[str, Path], project_name: str) -> bool:
+        """
+        Copy the artifacts of an entry into a project, renamed for its revision
+        (unchanged artifacts are skipped, see libs.materialize).
+
+        Returns:
+            bool: True on a cache hit
+        """
+        meta = self.lookup(key)
+        if meta is None:
+            return False
+
+        entry_dir = self.entry_dir(key)
+        for suffix in meta['files']:
+            # Rewritten by the next compilation: copies, or copy-on-write clones
+            materialize(entry_dir / ('top' + suffix), Path(project_dir) / (project_name + suffix))
+        return True
+
+    def artifacts(self, project_dir: Union[str, Path], project_name: str) -> List[str]:
+        paths = set()
+        for pattern in ARTIFACT_PATTERNS:
+            paths.update(glob.glob(str(Path(project_dir) / pattern.format(rev=glob.escape(project_name)))))
+        return sorted(paths)
+
+    def store(self, key: str, project_dir: Union[str, Path], project_name: str, info: Optional[Dict] = None) -> bool:
+        """
+        Store the artifacts of a compiled project.
+
+        Args:
+            key (str): Cache key, see key()
+            project_dir (Union[str, Path]): Project directory
+            project_name (str): Revision name, the prefix of the artifacts
+            info (dict): Extra metadata saved with the entry
+
+        Returns:
+            bool: True if a new entry has been written
+        """
+        if self.entry_dir(key).exists():
+            return False
+
+        artifacts = self.artifacts(project_dir, project_name)
+        if not any(path.endswith('.sof') for path in artifacts):
+            return False
+
+        def fill(tmp_dir: Path):
+            files = []
+            size = 0
+            for path in artifacts:
+                suffix = os.path.basename(path)[len(project_name):]
+                materialize(path, tmp_dir / ('top' + suffix))
+                files.append(suffix)
+                size += os.path.getsize(path)
+
+            meta = dict(info or {}, key=key, files=files, size=size, created=time.time())
+            with open(tmp_dir / META_NAME, 'w') as file:
+                json.dump(meta, file, indent=1)
+
+        if not write_cache_entry(self.cache_dir, self.entry_dir(key), fill):
+            return False
+
+        self.stats['stores'] += 1
+        self.evict()
+        return True
+
+    def entries(self) -> List[Dict]:
+        """
+        Metadata of all the entries, with 'last_used' time, least recently used first.
+        """
+        entries = []
+        for entry_dir in self.entries_dir.iterdir():
+            meta_path = entry_dir / META_NAME
+            try:
+                with open(meta_path, 'r') as file:
+                    meta = json.load(file)
+                meta['last_used'] = os.path.getmtime(meta_path)
+            except (FileNotFoundError, NotADirectoryError, ValueError):
+                continue
+            entries.append(meta)
+        return sorted(entries, key=lambda meta: meta['last_used'])
+
+    def size(self) -> int:
+        return sum(meta['size'] for meta in self.entries())
+
+    def evict(self, max_size: Optional[int] = None):
+        """
+        Remove least recently used entries until the cache fits in max_size bytes.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        entries = self.entries()
+        total = sum(meta['size'] for meta in entries)
+
+        for meta in entries:
+            if total <= max_size:
+                break
+            # Renamed first, so that the entry disappears atomically
+            trash = self.cache_dir / f"tmp-{uuid.uuid4().hex}"
+            try:
+                os.rename(self.entry_dir(meta['key']), trash)
+            except OSError:
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= meta['size']
+            self.stats['evictions'] += 1
+
+    def get_stats(self) -> Dict:
+        """
+        Hit/miss statistics of this instance, plus the current state of the cache.
+        """
+        entries = self.entries()
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(self.stats,
+                    hit_rate=self.stats['hits'] / lookups if lookups else 0.0,
+                    entries=len(entries),
+                    size=sum(meta['size'] for meta in entries),
+                    max_size=self.max_size)
@@ -0,0 +1,263 @@
+import os
+import pickle
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+from libs.hashing import hash_bytes, hash_strings
+from libs.paths import get_cache_dir
+from libs.profiles import PerformanceProfile, parse_profiles
+
+# Bumped when the Board model changes, so that compiled caches are rebuilt
+BOARD_CACHE_VERSION = 5
+
+REQUIRED_BOARD_KEYS = ['name', 'device_family', 'device']
+
+
+class BoardError(Exception):
+    """
+    Base class of the errors raised while loading a board definition.
+    """
+
+
+class BoardNotFoundError(BoardError, FileNotFoundError):
+    pass
+
+
+class BoardValidationError(BoardError, ValueError):
+    pass
+
+
+class Pin(NamedTuple):
+    """
+    A pin assignment of a board.
+    """
+    signal: str                 # e.g. "LED[0]"
+    pin: str                    # e.g. "A15"
+    io_standard: Optional[str]  # e.g. "3.3-V LVTTL"
+    group: str                  # section of the YAML, e.g. "leds"
+
+
+class Board:
+    """
+    Validated board definition (boards/<name>.yaml).
+
+    Typed access to the board section, plus the pin table indexed by signal
+    and by group. The parsed YAML is kept in `data`, for the keys the model
+    does not know about.
+    """
+
+    def __init__(self, data: Dict[str, Any], source: str = '', content_hash: str = ''):
+        """
+        Args:
+            data (dict): Parsed YAML
+            source (str): File it was read from, for error messages
+            content_hash (str): Hash of the YAML file, identifies the definition
+
+        Raises:
+            BoardValidationError: If the definition is incomplete or inconsistent
+        """
+        if not isinstance(data, dict) or not isinstance(data.get('board'), dict):
+            raise BoardValidationError(f"{source}: missing 'board' section")
+
+        board = data['board']
+        missing = [key for key in REQUIRED_BOARD_KEYS if not board.get(key)]
+        if missing:
+            raise BoardValidationError(f"{source}: missing board keys: {', '.join(missing)}")
+
+        self.data = data
+        self.source = source
+        self.content_hash = content_hash
+        self.name = str(board['name'])
+        self.device_family = str(board['device_family'])
+        self.device = str(board['device'])
+        self.program_device = board.get('program_device')
+        # Serial configuration device programmed in EPCS mode, e.g. EPCS64
+        self.flash_device = board.get('flash_device')
+        if self.flash_device is not None and not isinstance(self.flash_device, str):
+            raise BoardValidationError(f"{source}: 'flash_device' must be a device name")
+        self.top_level_entity = board.get('top_level_entity')
+        self.copy_project = bool(board.get('copy_project', False))
+
+        # Optional board-wide global assignments, e.g. RESERVE_DATA0_AFTER_CONFIGURATION
+        assignments = data.get('assignments') or {}
+        if not isinstance(assignments, dict):
+            raise BoardValidationError(f"{source}: 'assignments' must map names to values")
+        self.assignments: Dict[str, str] = {str(name): str(value) for name, value in assignments.items()}
+
+        # Performance profiles (built-in ones plus the 'profiles' section) and the one used by
+        # default, if the board asks for one: without it Quartus keeps its own settings
+        try:
+            self.profiles: Dict[str, PerformanceProfile] = parse_profiles(data.get('profiles'))
+        except ValueError as e:
+            raise BoardValidationError(f"{source}: {e}")
+        self.default_profile = board.get('profile')
+        if self.default_profile is not None and self.default_profile not in self.profiles:
+            raise BoardValidationError(f"{source}: unknown profile '{self.default_profile}'")
+
+        self.pins: List[Pin] = []
+        self.pins_by_signal: Dict[str, Pin] = {}
+        self.groups: Dict[str, List[Pin]] = {}
+
+        pins = data.get('pins') or {}
+        if not isinstance(pins, dict):
+            raise BoardValidationError(f"{source}: 'pins' must map groups to lists of pins")
+
+        for group, entries in pins.items():
+            if not isinstance(entries, list):
+                raise BoardValidationError(f"{source}: pin group '{group}' must be a list")
+            self.groups[group] = []
+            for entry in entries:
+                if not isinstance(entry, dict) or not entry.get('signal') or not entry.get('pin'):
+                    raise BoardValidationError(f"{source}: pin group '{group}': every pin needs 'signal' and 'pin'")
+                pin = Pin(str(entry['signal']), str(entry['pin']), entry.get('io_standard'), str(group))
+                if pin.signal in self.pins_by_signal:
+                    raise BoardValidationError(f"{source}: signal '{pin.signal}' assigned twice")
+                self.pins.append(pin)
+                self.pins_by_signal[pin.signal] = pin
+                self.groups[group].append(pin)
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        """
+        The 'board' section of the YAML.
+        """
+        return self.data['board']
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Value of a key of the 'board' section.
+        """
+        return self.info.get(key, default)
+
+    def pin(self, signal: str) -> Optional[Pin]:
+        return self.pins_by_signal.get(signal)
+
+    def profile(self, name: Optional[str] = None) -> Optional[PerformanceProfile]:
+        """
+        A performance profile, by default the one named by board.profile.
+
+        Returns:
+            PerformanceProfile: None if no profile is requested
+
+        Raises:
+            BoardValidationError: If the profile does not exist
+        """
+        name = name or self.default_profile
+        if name is None:
+            return None
+        if name not in self.profiles:
+            raise BoardValidationError(f"{self.source}: unknown profile '{name}' "
+                                       f"(available: {', '.join(sorted(self.profiles))})")
+        return self.profiles[name]
+
+    def __repr__(self):
+        return f"<Board {self.name} {self.device} ({len(self.pins)} pins)>"
+
+
+# Boards already loaded by this process: {path: (mtime_ns, size, Board)}
+_loaded: Dict[str, tuple] = {}
+
+
+def board_yaml_path(board_name: str, boards_dir: Union[str, Path] = 'boards') -> Path:
+    return Path(boards_dir) / (board_name + '.yaml')
+
+
+def compiled_board_path(yaml_path: Path, cache_dir: Union[str, Path, None] = None) -> Path:
+    cache_dir = Path(cache_dir) if cache_dir else get_cache_dir() / "boards"
+    return cache_dir / f"{yaml_path.stem}-{hash_strings(str(yaml_path.resolve()))[:16]}.pickle"
+
+
+def compile_board(yaml_path: Union[str, Path]) -> Board:
+    """
+    Parse and validate a board YAML, without caches.
+
+    Raises:
+        BoardNotFoundError: If the file does not exist
+        BoardValidationError: If the YAML is invalid or the definition incomplete
+    """
+    # ruamel is only imported when a board has to be compiled
+    from libs.yaml import read_yaml_file
+
+    try:
+        with open(yaml_path, 'rb') as file:
+            content_hash = hash_bytes(file.read())
+        data = read_yaml_file(str(yaml_path))
+    except FileNotFoundError as e:
+        raise BoardNotFoundError(f"Board file not found: {yaml_path}") from e
+    except Exception as e:
+        raise BoardValidationError(f"Error parsing {yaml_path}: {e}") from e
+
+    return Board(data, str(yaml_path), content_hash)
+
+
+def load_board(board_name: str, boards_dir: Union[str, Path] = 'boards',
+               cache_dir: Union[str, Path, None] = None) -> Board:
+    """
+    Load boards/<board_name>.yaml through the compiled board cache.
+
+    The YAML is parsed and validated once; the Board is then pickled and
+    reused while the file keeps its mtime and size (or, if only those
+    changed, its content hash). Within a process, repeated loads return the
+    same Board object.
+
+    Args:
+        board_name (str): Board name
+        boards_dir (Union[str, Path]): Directory of the board definitions
+        cache_dir (Union[str, Path]): Directory of the compiled boards (default: user cache)
+
+    Raises:
+        BoardNotFoundError: If the board does not exist
+        BoardValidationError: If the definition is invalid
+    """
+    yaml_path = board_yaml_path(board_name, boards_dir)
+    try:
+        stat = os.stat(yaml_path)
+    except OSError as e:
+        raise BoardNotFoundError(f"Board file not found: {yaml_path}") from e
+
+    key = str(yaml_path.resolve())
+    loaded = _loaded.get(key)
+    if loaded is not None and loaded[:2] == (stat.st_mtime_ns, stat.st_size):
+        return loaded[2]
+
+    compiled_path = compiled_board_path(yaml_path, cache_dir)
+    compiled = None
+    try:
+        with open(compiled_path, 'rb') as file:
+            compiled = pickle.load(file)
+        if compiled.get('version') != BOARD_CACHE_VERSION:
+            compiled = None
+    except (OSError, pickle.PickleError, EOFError, AttributeError, ImportError, TypeError):
+        compiled = None
+
+    board = None
+    if compiled is not None and (compiled['mtime_ns'], compiled['size']) == (stat.st_mtime_ns, stat.st_size):
+        board = compiled['board']
+    else:
+        with open(yaml_path, 'rb') as file:
+            content_hash = hash_bytes(file.read())
+        if compiled is not None and compiled['hash'] == content_hash:
+            # Touched but not modified (e.g. by a checkout)
+            board = compiled['board']
+        else:
+            board = compile_board(yaml_path)
+
+        save_compiled_board(compiled_path, {'version': BOARD_CACHE_VERSION, 'mtime_ns': stat.st_mtime_ns,
+                                            'size': stat.st_size, 'hash': content_hash, 'board': board})
+
+    _loaded[key] = (stat.st_mtime_ns, stat.st_size, board)
+    return board
+
+
+def save_compiled_board(path: Path, compiled: Dict):
+    # Written aside and renamed, parallel builds may compile the same board
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(compiled, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        # The cache is an optimization: a read-only cache directory is not an error
+        pass
@@ -0,0 +1,296 @@
+import glob
+import json
+import os
+import re
+import subprocess
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from libs.hashing import StatHashCache, hash_strings, hash_bytes
+from libs.this_platform import check_exe
+
+MANIFEST_NAME = "faya_manifest.json"
+
+# Compilation stages in order, with the files each one produces ({rev} = revision)
+STAGES = ['map', 'fit', 'asm']
+STAGE_OUTPUTS = {
+    'map': ['{rev}.map.rpt', 'db/{rev}.map.*'],
+    'fit': ['{rev}.fit.rpt', 'db/{rev}.cmp.*'],
+    'asm': ['{rev}.sof', '{rev}.asm.rpt'],
+}
+
+SOURCE_TYPES = ['VERILOG_FILE', 'SYSTEMVERILOG_FILE', 'VHDL_FILE', 'VERILOG_INCLUDE_FILE',
+                'MIF_FILE', 'HEX_FILE']
+IP_TYPES = ['QIP_FILE', 'QSYS_FILE', 'IP_FILE', 'SIP_FILE']
+SETTINGS_TYPES = ['SDC_FILE', 'TCL_SCRIPT_FILE']
+
+_assignment_pattern = re.compile(
+    r'^\s*set_global_assignment\s+(?:-library\s+\S+\s+)?-name\s+(\w+)\s+(.+?)\s*$', re.MULTILINE)
+_qip_path_pattern = re.compile(r'\[file join \$::quartus\(qip_path\)\s+"([^"]+)"\]')
+
+# .qsf lines rewritten by Quartus on every project creation, not real settings; the
+# number of processors does not change the results, only how long they take
+_volatile_settings = re.compile(r'^\s*(#.*|set_global_assignment\s+-name\s+'
+                                r'(PROJECT_CREATION_TIME_DATE|LAST_QUARTUS_VERSION|NUM_PARALLEL_PROCESSORS)\s+.*)?$')
+
+
+def read_file_assignments(settings_file: Union[str, Path]) -> List[tuple]:
+    """
+    List the file assignments of a .qsf or .qip file.
+
+    Args:
+        settings_file (Union[str, Path]): The .qsf/.qip file
+
+    Returns:
+        list: [(assignment name, absolute path)]
+    """
+    base_dir = Path(settings_file).resolve().parent
+    with open(settings_file, 'r', errors='replace') as file:
+        content = file.read()
+
+    files = []
+    for match in _assignment_pattern.finditer(content):
+        name, value = match.group(1), match.group(2)
+        qip_path = _qip_path_pattern.search(value)
+        value = qip_path.group(1) if qip_path else value.strip('"{}')
+        files.append((name, str((base_dir / value).resolve())))
+    return files
+
+
+class BuildManifest:
+    """
+    Content-hash manifest of a compiled project, stored in the project directory.
+
+    It records a key for every stage (map, fit, asm), computed from the
+    sources, the settings, the IP core files and the Quartus version, chained
+    with the outputs of the previous stage. A stage whose key and outputs are
+    unchanged since the last run can be skipped.
+
+    The creation of the project (setup) is recorded as well, with a key of
+    its own inputs, so that it can be skipped before the .qsf even exists.
+
+    The stages of a flow graph (e.g. asm and sta) use the same manifest from
+    different threads: every access to its data holds self.lock.
+    """
+
+    def __init__(self, project_dir: Union[str, Path], project_name: str, quartus_bin: Union[str, Path]):
+        """
+        Args:
+            project_dir (Union[str, Path]): Directory of the Quartus project
+            project_name (str): Project name (and revision)
+            quartus_bin (Union[str, Path]): Directory of the Quartus executables
+        """
+        self.project_dir = Path(project_dir)
+        self.project_name = project_name
+        self.quartus_bin = Path(quartus_bin)
+        self.path = self.project_dir / MANIFEST_NAME
+        self.data = self.load()
+        self.hashes = StatHashCache(self.data.setdefault('files', {}))
+        # Reentrant: record() hashes the outputs and saves
+        self.lock = threading.RLock()
+
+    def load(self) -> Dict:
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self):
+        # Written atomically, an interrupted build must not leave a broken manifest
+        with self.lock:
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as file:
+                json.dump(self.data, file, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def tool_version(self) -> str:
+        """
+        Version of Quartus, cached by size/mtime of quartus_sh so that the
+        (slow) `quartus_sh --version` only runs after an update.
+        """
+        quartus_sh = self.quartus_bin / check_exe("quartus_sh")
+        try:
+            stat = os.stat(quartus_sh)
+            fingerprint = [str(quartus_sh), stat.st_size, stat.st_mtime_ns]
+        except FileNotFoundError:
+            return "unknown"
+
+        with self.lock:
+            tool = self.data.get('tool', {})
+            if tool.get('fingerprint') == fingerprint:
+                return tool['version']
+
+        version = hash_strings(*fingerprint)
+        try:
+            result = subprocess.run([str(quartus_sh), '--version'], capture_output=True, text=True)
+            lines = [line.strip() for line in result.stdout.splitlines() if 'Version' in line]
+            if lines:
+                version = lines[0]
+        except OSError:
+            pass
+
+        with self.lock:
+            self.data['tool'] = {'fingerprint': fingerprint, 'version': version}
+        return version
+
+    def project_files(self) -> Dict[str, List[str]]:
+        """
+        Files of the project grouped as 'sources', 'ip' and 'settings', read
+        from the .qsf and recursively from the .qip files it includes.
+        """
+        qsf = self.project_dir / (self.project_name + '.qsf')
+        files = {'sources': [], 'ip': [], 'settings': []}
+        if not qsf.exists():
+            return files
+
+        pending = [qsf]
+        seen = set()
+        while pending:
+            settings_file = pending.pop()
+            for name, path in read_file_assignments(settings_file):
+                if path in seen:
+                    continue
+                seen.add(path)
+
+                if name in IP_TYPES:
+                    files['ip'].append(path)
+                    if name == 'QIP_FILE' and os.path.exists(path):
+                        pending.append(Path(path))
+                elif settings_file != qsf:
+                    # Everything referenced by a .qip belongs to the IP core
+                    files['ip'].append(path)
+                elif name in SOURCE_TYPES:
+                    files['sources'].append(path)
+                elif name in SETTINGS_TYPES:
+                    files['settings'].append(path)
+        return files
+
+    def settings_hash(self) -> str:
+        """
+        Hash of the .qpf/.qsf, without volatile lines and file assignments
+        (the referenced files are hashed by content, see input_hashes).
+        """
+        file_types = set(SOURCE_TYPES + IP_TYPES + SETTINGS_TYPES)
+        parts = []
+        for suffix in ('.qpf', '.qsf'):
+            path = self.project_dir / (self.project_name + suffix)
+            if not path.exists():
+                parts.append('missing')
+                continue
+            lines = []
+            with open(path, 'r', errors='replace') as file:
+                for line in file:
+                    match = _assignment_pattern.match(line)
+                    if _volatile_settings.match(line) or (match and match.group(1) in file_types):
+                        continue
+                    lines.append(line.strip())
+            parts.append(hash_bytes("\n".join(lines).encode('utf-8')))
+        return hash_strings(*parts)
+
+    def input_hashes(self) -> Dict[str, str]:
+        """
+        Hashes of what the compilation depends on: 'sources', 'ip', 'settings' and 'tool'.
+
+        File names are relative to the project directory, so the same design
+        gives the same hashes wherever the project lives.
+        """
+        files = self.project_files()
+        with self.lock:
+            hashes = {
+                'sources': self.hashes.hash_files(files['sources'], base_dir=self.project_dir),
+                'ip': self.hashes.hash_files(files['ip'], base_dir=self.project_dir),
+                'settings': hash_strings(self.settings_hash(),
+                                         self.hashes.hash_files(files['settings'], base_dir=self.project_dir)),
+            }
+        hashes['tool'] = self.tool_version()
+        return hashes
+
+    def input_hash(self) -> str:
+        """
+        Hash of everything the compilation depends on.
+        """
+        hashes = self.input_hashes()
+        return hash_strings(*(f"{name}={hashes[name]}" for name in sorted(hashes)))
+
+    def files_hash(self, paths: List[Union[str, Path]]) -> str:
+        """
+        Hash of some files by content (e.g. the inputs of the project setup).
+        """
+        with self.lock:
+            return self.hashes.hash_files(paths)
+
+    def sources_hash(self) -> str:
+        """
+        Hash of the sources assigned in the .qsf, as copied in the project directory.
+        """
+        files = self.project_files()
+        with self.lock:
+            return self.hashes.hash_files(files['sources'], base_dir=self.project_dir)
+
+    def is_setup_up_to_date(self, key: str) -> bool:
+        """
+        Whether the project was created from inputs with this key, and its
+        settings and sources are unchanged since (see record_setup).
+        """
+        with self.lock:
+            record = self.data.get('setup')
+        if not record or record['key'] != key:
+            return False
+        return record['settings'] == self.settings_hash() and record['sources'] == self.sources_hash()
+
+    def record_setup(self, key: str):
+        with self.lock:
+            self.data['setup'] = {'key': key, 'settings': self.settings_hash(), 'sources': self.sources_hash()}
+            self.save()
+
+    def invalidate_setup(self):
+        with self.lock:
+            # Until the project is created again, e.g. if the creation is interrupted
+            self.data.pop('setup', None)
+            self.save()
+
+    def stage_outputs(self, stage: str) -> List[str]:
+        paths = []
+        for pattern in STAGE_OUTPUTS[stage]:
+            paths.extend(glob.glob(str(self.project_dir / pattern.format(rev=self.project_name))))
+        return paths
+
+    def outputs_hash(self, stage: str) -> Optional[str]:
+        """
+        Hash of the outputs of a stage, None if it has not produced any.
+        """
+        outputs = self.stage_outputs(stage)
+        if not outputs:
+            return None
+        with self.lock:
+            return self.hashes.hash_files(outputs, base_dir=self.project_dir)
+
+    def stage_key(self, stage: str, input_hash: str) -> str:
+        """
+        Key of a stage: the project inputs chained with the outputs of the previous stage.
+        """
+        index = STAGES.index(stage)
+        upstream = self.outputs_hash(STAGES[index - 1]) if index > 0 else ''
+        return hash_strings(stage, input_hash, upstream)
+
+    def is_up_to_date(self, stage: str, key: str) -> bool:
+        with self.lock:
+            record = self.data.get('stages', {}).get(stage)
+        if not record or record['key'] != key:
+            return False
+        return record['outputs'] == self.outputs_hash(stage)
+
+    def record(self, stage: str, key: str):
+        with self.lock:
+            self.data.setdefault('stages', {})[stage] = {'key': key, 'outputs': self.outputs_hash(stage)}
+            self.save()
+
+    def invalidate(self, stage: str):
+        with self.lock:
+            # Downstream stages depend on this one, they are invalidated as well
+            stages = self.data.get('stages', {})
+            for name in STAGES[STAGES.index(stage):]:
+                stages.pop(name, None)
+            self.save()
@@ -0,0 +1,270 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+TRACE_JSONL_NAME = "faya_trace.jsonl"
+TRACE_CHROME_NAME = "faya_trace.json"
+
+# Trace receiving the records, set while a BuildTrace is entered
+_active_trace = None
+
+# Open phases, per thread and per asyncio task: concurrent builds do not mix them
+_phase_stack = contextvars.ContextVar('faya_phase_stack', default=())
+
+# Track pinned by bind_track, for work of a task moved to other threads
+_bound_track = contextvars.ContextVar('faya_bound_track', default=None)
+
+
+def _track_id() -> int:
+    if _bound_track.get() is not None:
+        return _bound_track.get()
+    # Concurrent asyncio tasks get their own track in the Chrome trace
+    # (asyncio is not imported here: it is slow to import, and only in use if already loaded)
+    asyncio = sys.modules.get('asyncio')
+    try:
+        task = asyncio.current_task() if asyncio is not None else None
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+class BuildTrace:
+    """
+    Timing and resource usage of the Quartus commands run by a build.
+
+    Every command is recorded with its wall time, CPU time, peak RSS of the
+    process tree (sampled with psutil, if installed), peak RSS of its largest
+    process (wait4, POSIX) and exit status, inside the phase (create_project,
+    compile_project, ...) that ran it. Records are appended to a JSON lines
+    file as they complete, and a Chrome trace-event file (chrome://tracing,
+    Perfetto) is written when the trace is closed.
+
+    Usage:
+        with BuildTrace(project_dir) as trace:
+            automation.create_project(...)
+        print(trace.summary())
+    """
+
+    def __init__(self, directory: Union[str, Path, None] = None, jsonl_path: Union[str, Path, None] = None,
+                 chrome_path: Union[str, Path, None] = None):
+        """
+        Args:
+            directory (Union[str, Path]): Directory of the trace files (default names)
+            jsonl_path (Union[str, Path]): JSON lines file, overrides the default
+            chrome_path (Union[str, Path]): Chrome trace-event file, overrides the default
+        """
+        if directory is not None:
+            jsonl_path = jsonl_path or Path(directory) / TRACE_JSONL_NAME
+            chrome_path = chrome_path or Path(directory) / TRACE_CHROME_NAME
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self.chrome_path = Path(chrome_path) if chrome_path else None
+
+        self.records: List[Dict] = []
+        self.spans: List[Dict] = []
+        self.origin = time.time()
+        self._lock = threading.Lock()
+        self._jsonl = None
+        self._previous = None
+
+    def __enter__(self):
+        global _active_trace
+        if self.jsonl_path is not None:
+            self._jsonl = open(self.jsonl_path, 'w')
+        self._previous = _active_trace
+        _active_trace = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        global _active_trace
+        if _active_trace is self:
+            _active_trace = self._previous
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+        if self.chrome_path is not None:
+            self.write_chrome_trace(self.chrome_path)
+
+    def phase_stack(self) -> List[str]:
+        return list(_phase_stack.get())
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Group the commands run inside the block under a named phase.
+        """
+        parent = _phase_stack.get()
+        token = _phase_stack.set(parent + (name,))
+        start = time.time()
+        status = 'ok'
+        try:
+            yield
+        except BaseException:
+            status = 'failed'
+            raise
+        finally:
+            _phase_stack.reset(token)
+            with self._lock:
+                self.spans.append({'name': name, 'parent': '/'.join(parent), 'start': start,
+                                   'wall_s': time.time() - start, 'status': status,
+                                   'tid': _track_id()})
+
+    def add(self, record: Dict):
+        record['phase'] = '/'.join(self.phase_stack())
+        record['tid'] = _track_id()
+        with self._lock:
+            self.records.append(record)
+            if self._jsonl is not None:
+                self._jsonl.write(json.dumps(record) + "\n")
+                self._jsonl.flush()
+
+    def chrome_events(self) -> List[Dict]:
+        pid = os.getpid()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'faya build'}}]
+        for span in self.spans:
+            events.append({'name': span['name'], 'cat': 'phase', 'ph': 'X', 'pid': pid, 'tid': span['tid'],
+                           'ts': (span['start'] - self.origin) * 1e6, 'dur': span['wall_s'] * 1e6,
+                           'args': {'status': span['status']}})
+        for record in self.records:
+            args = {key: value for key, value in record.items()
+                    if key not in ('name', 'start', 'tid') and value is not None}
+            events.append({'name': record['name'], 'cat': 'command', 'ph': 'X', 'pid': pid, 'tid': record['tid'],
+                           'ts': (record['start'] - self.origin) * 1e6, 'dur': record['wall_s'] * 1e6,
+                           'args': args})
+            if record.get('peak_rss_mb') is not None:
+                events.append({'name': 'peak RSS (MB)', 'ph': 'C', 'pid': pid,
+                               'ts': (record['start'] - self.origin) * 1e6,
+                               'args': {'rss': record['peak_rss_mb']}})
+        return events
+
+    def write_chrome_trace(self, path: Union[str, Path]):
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': self.chrome_events(), 'displayTimeUnit': 'ms'}, file)
+
+    def totals(self) -> Dict[str, Dict]:
+        """
+        Commands aggregated by name: count, wall and CPU time, peak RSS (of the tree and of its largest process).
+        """
+        totals = defaultdict(lambda: {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_mb': None,
+                                      'max_process_rss_mb': None})
+        for record in self.records:
+            total = totals[record['name']]
+            total['count'] += 1
+            total['wall_s'] += record['wall_s']
+            total['cpu_s'] += (record.get('cpu_user_s') or 0.0) + (record.get('cpu_system_s') or 0.0)
+            for key in ('peak_rss_mb', 'max_process_rss_mb'):
+                if record.get(key) is not None:
+                    total[key] = max(total[key] or 0.0, record[key])
+        return dict(totals)
+
+    def summary(self) -> str:
+        """
+        Table of the commands by total wall time, slowest first.
+        """
+        totals = sorted(self.totals().items(), key=lambda item: item[1]['wall_s'], reverse=True)
+        lines = [f"{'command':<40} {'runs':>5} {'wall':>9} {'cpu':>9} {'peak RSS':>10}"]
+        for name, total in totals:
+            if total['peak_rss_mb'] is not None:
+                rss = f"{total['peak_rss_mb']:.0f} MB"
+            elif total['max_process_rss_mb'] is not None:
+                # Only the largest process is known: the tree used at least as much
+                rss = f">={total['max_process_rss_mb']:.0f} MB"
+            else:
+                rss = '-'
+            lines.append(f"{name:<40} {total['count']:>5} {total['wall_s']:>8.2f}s {total['cpu_s']:>8.2f}s {rss:>10}")
+        return "\n".join(lines)
+
+
+def bind_track():
+    """
+    Keep the current track (thread or asyncio task) for the work done in
+    copies of the current context, e.g. in a thread pool on behalf of a task.
+    """
+    _bound_track.set(_track_id())
+
+
+def get_active_trace() -> Optional[BuildTrace]:
+    return _active_trace
+
+
+@contextmanager
+def trace_command(name: str, command: list, working_dir: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Record a command in the active trace, if any.
+
+    Yields the record, which the caller completes with the measures of the
+    process (exit_status, cpu_user_s, cpu_system_s, peak_rss_mb,
+    max_process_rss_mb). A record
+    with 'discard' set is not kept (the command did not run).
+    """
+    record = {'name': name, 'command': ' '.join(command), 'working_dir': working_dir,
+              'exit_status': None, 'cpu_user_s': None, 'cpu_system_s': None, 'peak_rss_mb': None,
+              'max_process_rss_mb': None}
+    trace = _active_trace
+    if trace is None:
+        yield record
+        return
+
+    record['start'] = time.time()
+    start = time.perf_counter()
+    record['status'] = 'ok'
+    try:
+        yield record
+    except BaseException as e:
+        record['status'] = 'failed'
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['wall_s'] = time.perf_counter() - start
+        if not record.pop('discard', False):
+            trace.add(record)
+
+
+@contextmanager
+def trace_phase(name: str) -> Iterator[None]:
+    """
+    Phase of the active trace, if any (see BuildTrace.phase).
+    """
+    trace = _active_trace
+    if trace is None:
+        yield
+        return
+    with trace.phase(name):
+        yield
+
+
+def traced_phase(method):
+    """
+    Decorator: run a method as a trace phase named after it.
+
+    Generators of steps (see run_command_steps) are traced while they run,
+    and a "_steps" suffix is dropped from the name: create_project_steps is
+    the create_project phase.
+    """
+    name = method.__name__
+    if inspect.isgeneratorfunction(method):
+        if name.endswith('_steps'):
+            name = name[:-len('_steps')]
+
+        @functools.wraps(method)
+        def steps_wrapper(*args, **kwargs):
+            with trace_phase(name):
+                return (yield from method(*args, **kwargs))
+        return steps_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with trace_phase(name):
+            return method(*args, **kwargs)
+    return wrapper
@@ -1,42 +1,613 @@
+import codecs
+import contextvars
+import locale
 import os
+import shlex
+import signal
 import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Generator, Iterable, Iterator, List, NamedTuple, Optional, TextIO
 
-def run_quartus(command: list, working_dir: str = None) -> str:
+try:
+    # Optional: process tree measures where os.wait4 is not available (Windows)
+    import psutil
+except ImportError:
+    psutil = None
+
+from libs.build_trace import trace_command
+from libs.quartus_messages import QuartusMessages, QuartusOutput, parse_messages, ERROR, CRITICAL_WARNING, WARNING
+
+
+class QuartusError(RuntimeError):
+    """
+    Raised when a Quartus command reports errors.
+
+    Keeps the full stdout/stderr of the failed command, so callers can
+    inspect what went wrong after the exception has been raised.
+    """
+    def __init__(self, message, stdout: str = '', stderr: str = '', messages: QuartusMessages = None):
+        super().__init__(message)
+        self.stdout = stdout
+        self.stderr = stderr
+        self.messages = messages
+
+
+class QuartusExitError(QuartusError, subprocess.CalledProcessError):
+    """
+    Raised when a Quartus command exits with a non-zero status without
+    reporting any error message.
+    """
+    def __init__(self, returncode: int, command: list, message, stdout: str = '', stderr: str = '',
+                 messages: QuartusMessages = None):
+        QuartusError.__init__(self, message, stdout=stdout, stderr=stderr, messages=messages)
+        self.returncode = returncode
+        self.cmd = command
+
+    # The message, not the generic one of CalledProcessError
+    __str__ = QuartusError.__str__
+
+
+def check_exit_status(returncode: Optional[int], command: list, stdout: str = '', stderr: str = '',
+                      messages: QuartusMessages = None, log_file: Optional[str] = None):
+    """
+    Raise QuartusExitError if a command that reported no errors exited with a non-zero status.
+    """
+    if not returncode:
+        return
+    message = f"{command_label(command)} exited with status {returncode}"
+    if log_file:
+        message += f"\n(full output in {log_file})"
+    raise QuartusExitError(returncode, command, message, stdout=stdout, stderr=stderr, messages=messages)
+
+
+def split_command(command: list) -> List[str]:
+    """
+    Arguments of a command line as passed to run_quartus, as the shell would see them.
+
+    Arguments are often already quoted for shell=True, e.g. '-t "dir"/file.tcl',
+    so the list is joined and split again with the shell quoting rules: quotes
+    only group words, quotes escaped inside an argument are kept. On Windows
+    backslashes are path separators and not escapes, as for cmd.exe.
+    """
+    lexer = shlex.shlex(' '.join(command), posix=True)
+    lexer.whitespace_split = True
+    lexer.commenters = ''
+    if os.name == 'nt':
+        lexer.escape = ''
+    return list(lexer)
+
+
+def command_label(command: list) -> str:
+    """
+    Short name of a Quartus command for reports, e.g. "quartus_sh -t add_verilog_file.tcl"
+    """
+    tokens = split_command(command)
+    if not tokens:
+        return ''
+    label = Path(tokens[0]).stem
+    for i, token in enumerate(tokens[1:-1], 1):
+        if token == '-t':
+            return f"{label} -t {Path(tokens[i + 1]).name}"
+        if token == '--flow':
+            return f"{label} --flow {tokens[i + 1]}"
+        if token == '--tcl_eval':
+            return f"{label} --tcl_eval {tokens[i + 1]}"
+    return label
+
+
+def wait_process(process: subprocess.Popen) -> Dict:
+    """
+    Wait for a process and measure it.
+
+    On POSIX the resource usage comes from wait4: with shell=True the shell
+    has waited for Quartus, so the CPU times cover the whole process tree.
+    ru_maxrss is not a sum but the peak of the largest single process of the
+    tree, reported as max_process_rss_mb; the peak RSS of the whole tree
+    (peak_rss_mb) is sampled by ProcessTreeSampler.
+
+    Returns:
+        dict: exit_status, cpu_user_s, cpu_system_s, max_process_rss_mb (None when not measurable)
+    """
+    if not hasattr(os, 'wait4'):
+        process.wait()
+        return {'exit_status': process.returncode}
+
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # Already reaped
+        process.wait()
+        return {'exit_status': process.returncode}
+
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    rss_unit = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'exit_status': process.returncode,
+        'cpu_user_s': usage.ru_utime,
+        'cpu_system_s': usage.ru_stime,
+        'max_process_rss_mb': usage.ru_maxrss * rss_unit / (1024 * 1024)
+    }
+
+
+class ProcessTreeSampler:
+    """
+    Peak RSS of a process tree (the sum over its processes), sampled with
+    psutil while it runs, and its CPU time where wait4 is not available.
+
+    Without psutil it measures nothing.
+    """
+
+    def __init__(self, process: subprocess.Popen, interval: float = 0.1):
+        self.process = process
+        self.interval = interval
+        self.peak_rss = 0
+        self.cpu_times = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> 'ProcessTreeSampler':
+        if psutil is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            root = psutil.Process(self.process.pid)
+        except psutil.Error:
+            return
+        while not self._stop.is_set():
+            rss = 0
+            try:
+                for proc in [root] + root.children(recursive=True):
+                    try:
+                        rss += proc.memory_info().rss
+                        self.cpu_times[proc.pid] = proc.cpu_times()
+                    except psutil.Error:
+                        pass
+            except psutil.Error:
+                break
+            self.peak_rss = max(self.peak_rss, rss)
+            self._stop.wait(self.interval)
+
+    def stop(self) -> Dict:
+        """
+        Returns:
+            dict: The measures, merged into the trace record (empty if not sampled)
+        """
+        if self._thread is None:
+            return {}
+        self._stop.set()
+        self._thread.join()
+        measures = {'peak_rss_mb': self.peak_rss / (1024 * 1024)}
+        if not hasattr(os, 'wait4'):
+            # Otherwise wait4 also counts the processes that ended between two samples
+            measures['cpu_user_s'] = sum(times.user for times in self.cpu_times.values())
+            measures['cpu_system_s'] = sum(times.system for times in self.cpu_times.values())
+        return measures
+
+
+def run_quartus(command: list, working_dir: str = None, engine=None, stream: bool = False,
+                log_file: str = None, abort_on_error: bool = False) -> str:
     """
     Run a Quartus command with proper environment setup and error handling.
 
+    The command is recorded in the active BuildTrace, if any (see libs/build_trace.py).
+
     Args:
         command (list): Command and arguments as list
         working_dir (str): Working directory for the command
+        engine: Optional persistent shell engine (e.g. QuartusShellPool); the
+                quartus_sh commands it supports run there instead of in a new process
+        stream (bool): Process the output line by line, see run_quartus_streaming
+        log_file (str): Write the full output to this file (implies stream)
+        abort_on_error (bool): Kill the command at the first error (implies stream)
+    """
+    if engine is not None:
+        with trace_command(command_label(command), command, working_dir) as record:
+            out = engine.run_command(command, working_dir=working_dir)
+            record['engine'] = True
+            # Not supported by the engine: only the process below is recorded
+            record['discard'] = out is None
+        if out is not None:
+            return out
+
+    with trace_command(command_label(command), command, working_dir) as record:
+        if stream or log_file or abort_on_error:
+            return run_quartus_streaming(command, working_dir=working_dir, log_file=log_file,
+                                         abort_on_error=abort_on_error, record=record)
+
+        return run_quartus_buffered(command, working_dir=working_dir, record=record)
+
+
+class Parallel(list):
+    """
+    A step made of several (command, options), run concurrently.
+
+    The flow receives a list of StepResult, in the same order.
+    """
+
+
+class StepResult(NamedTuple):
+    """
+    Outcome of one command of a Parallel step.
+    """
+    output: Any                     # None if the command failed
+    error: Optional[Exception]
+    wall_s: float
+
+
+def run_parallel(requests: Parallel) -> List[StepResult]:
+    """
+    Run the commands of a Parallel step in threads, see run_command_steps.
+    """
+    def run(request):
+        command, options = request
+        start = time.perf_counter()
+        try:
+            return StepResult(run_quartus(command, **options), None, time.perf_counter() - start)
+        except Exception as e:
+            return StepResult(None, e, time.perf_counter() - start)
+
+    if not requests:
+        return []
+    # Imported here, it slows down the startup of a programming-only run
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        # Each thread keeps the trace phase of the flow
+        futures = [executor.submit(contextvars.copy_context().run, run, request) for request in requests]
+        return [future.result() for future in futures]
+
+
+def parallel_steps(flows: List[Generator]):
+    """
+    Steps running several flows side by side.
+
+    At every round the pending commands of all the flows are yielded as one
+    Parallel step (a Parallel step of a flow is merged into it), and every
+    flow receives its own outputs or errors. A round lasts as long as its
+    slowest command.
+
+    Args:
+        flows ([Generator]): Steps of the flows
+
+    Returns:
+        list: The return values of the flows, in the same order
+
+    Raises:
+        Exception: The first error raised by a flow, once all of them are over
+    """
+    values = [None] * len(flows)
+    errors = []
+    pending = {}  # {index of the flow: its request}
+
+    def advance(index, output=None, error=None, first=False):
+        try:
+            if first:
+                request = next(flows[index])
+            elif error is not None:
+                request = flows[index].throw(error)
+            else:
+                request = flows[index].send(output)
+        except StopIteration as stop:
+            values[index] = stop.value
+        except Exception as e:
+            errors.append(e)
+        else:
+            pending[index] = request
+
+    try:
+        for index in range(len(flows)):
+            advance(index, first=True)
+
+        while pending:
+            requests, slices = Parallel(), []
+            for index, request in pending.items():
+                merged = isinstance(request, Parallel)
+                slices.append((index, len(requests), len(request) if merged else 1, merged))
+                if merged:
+                    requests.extend(request)
+                else:
+                    requests.append(request)
+            pending = {}
+
+            if len(slices) == 1 and not slices[0][3]:
+                # A single command: no thread needed
+                try:
+                    output = yield requests[0]
+                except Exception as e:
+                    advance(slices[0][0], error=e)
+                else:
+                    advance(slices[0][0], output)
+                continue
+
+            results = yield requests
+            for index, start, count, merged in slices:
+                if merged:
+                    advance(index, results[start:start + count])
+                elif results[start].error is not None:
+                    advance(index, error=results[start].error)
+                else:
+                    advance(index, results[start].output)
+    finally:
+        for flow in flows:
+            flow.close()
+
+    if errors:
+        raise errors[0]
+    return values
+
+
+def run_command_steps(steps: Generator):
+    """
+    Run the steps of a flow.
+
+    A flow (create_project, compile_project, ...) is written once as a
+    generator of steps: it yields (command, options) for every Quartus
+    command, with the options of run_quartus, and receives the output of the
+    command, or the exception it raised. The same steps run here one after
+    the other, or concurrently with other flows by run_command_steps_async
+    (see libs/async_execution.py). Commands yielded together in a Parallel
+    step run at the same time.
+
+    Args:
+        steps (Generator): Steps of the flow
+
+    Returns:
+        The return value of the steps
+    """
+    try:
+        request = next(steps)
+        while True:
+            if isinstance(request, Parallel):
+                request = steps.send(run_parallel(request))
+                continue
+            command, options = request
+            try:
+                output = run_quartus(command, **options)
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(output)
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        steps.close()
+
+
+def run_quartus_buffered(command: list, working_dir: str = None, record: Optional[Dict] = None) -> str:
+    """
+    Run a Quartus command keeping its whole output, see run_quartus.
+
+    Args:
+        record (dict): Receives the measures of the process (see wait_process)
     """
     try:
 
         # Method 1: Using shell=True (Windows preferred)
         cmds = command # just for debug purposes
         command = ' '.join(command)
-        result = subprocess.run(
+        process = subprocess.Popen(
             command,
             shell=True,
             env=os.environ.copy(), # shell or env
-            #check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            capture_output=True,
             cwd= working_dir
         )
+        sampler = ProcessTreeSampler(process).start()
+
+        # Both pipes are drained before waiting, so that wait4 can measure the process
+        stderr_parts = []
+        stderr_reader = threading.Thread(target=lambda: stderr_parts.append(process.stderr.read()), daemon=True)
+        stderr_reader.start()
+        out = process.stdout.read()
+        stderr_reader.join()
+        stderr = ''.join(stderr_parts)
 
-        out = result.stdout
+        usage = wait_process(process)
+        usage.update(sampler.stop())
+        if record is not None:
+            record.update(usage)
 
-        is_err = False if not('errors' in out and '0 errors' not in out) else True
-        is_err = is_err or 'Error: ' in out
+        # Errors are decided on the parsed messages (Error lines, "N errors" summaries)
+        messages = parse_messages(out)
 
-        if len(result.stderr) > 0 or is_err:
-            print("Error stdout: ", result.stdout)
-            raise RuntimeError(result.stderr)
+        if len(stderr) > 0 or messages.has_errors:
+            print("Error stdout: ", out)
+            message = stderr or "\n".join(error.text for error in messages.errors)
+            raise QuartusError(message, stdout=out, stderr=stderr, messages=messages)
+        check_exit_status(usage['exit_status'], command, out, stderr, messages)
 
         print("Quartus output:", out)
-        return out
+        return QuartusOutput(out, messages)
 
     except subprocess.CalledProcessError as e:
         print(f"Command failed with exit code {e.returncode}")
         print("Error output:", e.stderr)
         raise
+
+
+def iter_lines(stream: TextIO) -> Iterator[str]:
+    """
+    Lines of a text stream, without line terminators, as soon as they are written.
+    """
+    for line in stream:
+        yield line.rstrip('\r\n')
+
+
+def iter_chunks(stream: BinaryIO, chunk_size: int = 1 << 16, encoding: Optional[str] = None) -> Iterator[str]:
+    """
+    Decoded output of a binary pipe in blocks of complete lines, as soon as
+    they are available (os.read does not wait for chunk_size bytes).
+    """
+    decoder = codecs.getincrementaldecoder(encoding or locale.getpreferredencoding(False))(errors='replace')
+    fd = stream.fileno()
+    pending = ''
+    while True:
+        data = os.read(fd, chunk_size)
+        if not data:
+            break
+        pending += decoder.decode(data)
+        cut = pending.rfind('\n') + 1
+        if cut:
+            yield pending[:cut].replace('\r\n', '\n')
+            pending = pending[cut:]
+
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending.replace('\r\n', '\n') + '\n'
+
+
+def tee_to_file(chunks: Iterable[str], file: Optional[TextIO]) -> Iterator[str]:
+    for chunk in chunks:
+        if file is not None:
+            file.write(chunk)
+        yield chunk
+
+
+def echo_chunks(chunks: Iterable[str]) -> Iterator[str]:
+    for chunk in chunks:
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+        yield chunk
+
+
+def watch_errors(chunks: Iterable[str], messages: QuartusMessages, on_error) -> Iterator[str]:
+    """
+    Call on_error (once) as soon as the parsed messages report an error.
+    """
+    for chunk in chunks:
+        yield chunk
+        if messages.has_errors:
+            on_error()
+            break
+    # The rest of the output still flows through the pipeline
+    yield from chunks
+
+
+def kill_pid_tree(pid: int) -> bool:
+    """
+    Kill a process started in its own process group together with its children.
+
+    Returns:
+        bool: False if the tree could not be killed this way
+    """
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/T', '/F', '/PID', str(pid)], capture_output=True)
+        else:
+            os.killpg(pid, signal.SIGKILL)
+        return True
+    except OSError:
+        return False
+
+
+def kill_process_tree(process: subprocess.Popen):
+    """
+    Kill a process started by run_quartus_streaming together with its children
+    (with shell=True the Quartus executable is a child of the shell).
+    """
+    if process.poll() is not None:
+        return
+    if not kill_pid_tree(process.pid):
+        process.kill()
+
+
+def run_quartus_streaming(command: list, working_dir: str = None, log_file: str = None,
+                          abort_on_error: bool = False, echo: bool = True, tail_lines: int = 200,
+                          record: Optional[Dict] = None) -> str:
+    """
+    Run a Quartus command processing its output as it is produced.
+
+    The output goes through a generator pipeline (log file, live echo,
+    message parsing) in blocks of lines and is never held in memory as a
+    whole: errors are detected as soon as they are printed, and only the
+    last `tail_lines` lines are kept.
+
+    Args:
+        command (list): Command and arguments as list
+        working_dir (str): Working directory for the command
+        log_file (str): File receiving the full output
+        abort_on_error (bool): Kill the command at the first error
+        echo (bool): Print the output while it is produced
+        tail_lines (int): Number of final lines returned (and kept in memory)
+        record (dict): Receives the measures of the process (see wait_process)
+
+    Returns:
+        QuartusOutput: The last tail_lines lines of the output, with the parsed messages
+
+    Raises:
+        QuartusError: If errors were reported or the command was aborted
+        QuartusExitError: If the command exited with a non-zero status without reporting errors
+    """
+    process = subprocess.Popen(
+        ' '.join(command),
+        shell=True,
+        env=os.environ.copy(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=working_dir,
+        # Own process group, so that the whole tree can be killed
+        start_new_session=(os.name != 'nt'),
+        creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
+    )
+    sampler = ProcessTreeSampler(process).start()
+
+    # stderr is drained by a thread, so neither pipe can fill up and block Quartus
+    stderr_lines = deque(maxlen=tail_lines)
+    stderr_reader = threading.Thread(
+        target=lambda: stderr_lines.extend(line for chunk in iter_chunks(process.stderr)
+                                           for line in chunk.splitlines()),
+        daemon=True)
+    stderr_reader.start()
+
+    # Info messages are only counted, a fitter log has millions of them
+    messages = QuartusMessages(keep=(ERROR, CRITICAL_WARNING, WARNING))
+    aborted = []
+
+    def abort():
+        aborted.append(True)
+        kill_process_tree(process)
+
+    tail = deque(maxlen=tail_lines)
+    log = open(log_file, 'w') if log_file else None
+    try:
+        chunks = iter_chunks(process.stdout)
+        chunks = tee_to_file(chunks, log)
+        if echo:
+            chunks = echo_chunks(chunks)
+        chunks = messages.parse_chunks(chunks)
+        if abort_on_error:
+            chunks = watch_errors(chunks, messages, abort)
+        for chunk in chunks:
+            tail.extend(chunk.splitlines())
+    finally:
+        if log is not None:
+            log.close()
+        # stdout is at EOF (or the tree was killed), stderr follows shortly
+        stderr_reader.join()
+        usage = wait_process(process)
+        usage.update(sampler.stop())
+        if record is not None:
+            record.update(usage)
+
+    out = '\n'.join(tail)
+    stderr = '\n'.join(stderr_lines)
+
+    if messages.has_errors or stderr:
+        message = '\n'.join(error.text for error in messages.errors[:20]) or stderr
+        if aborted:
+            message = "Aborted at the first error: " + message
+        if log_file:
+            message += f"\n(full output in {log_file})"
+        raise QuartusError(message, stdout=out, stderr=stderr, messages=messages)
+    check_exit_status(usage['exit_status'], command, out, stderr, messages, log_file)
+
+    return QuartusOutput(out, messages)
@@ -0,0 +1,88 @@
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import List, Optional, Union
+
+from libs.hashing import hash_file, hash_strings, tool_fingerprint
+from libs.materialize import materialize
+from libs.paths import get_cache_dir
+
+# Bumped when the conversion command changes, so that cached images are converted again
+CONVERSION_VERSION = 1
+
+
+def cpf_command(quartus_cpf: Union[str, Path], sof_file: str, pof_file: str, flash_device: str) -> List[str]:
+    """
+    quartus_cpf command converting a .sof into a .pof for a serial
+    configuration device, in the quoting of run_quartus.
+    """
+    return [str(quartus_cpf), "-c", "-d", flash_device, f'"{sof_file}"', f'"{pof_file}"']
+
+
+class FlashImageCache:
+    """
+    .pof images converted by quartus_cpf, keyed on the content of the .sof,
+    the flash device and the converter.
+
+    The same bitstream programmed on many boards with the same flash device
+    is converted once: the other boards get a copy (or a copy-on-write clone)
+    of the cached image.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path, None] = None):
+        """
+        Args:
+            cache_dir (Union[str, Path]): Directory of the images (default: user cache directory)
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir() / "pof"
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0}
+
+    @staticmethod
+    def key(sof_path: Union[str, Path], flash_device: str, quartus_cpf: Union[str, Path]) -> str:
+        """
+        Cache key of a conversion.
+
+        Args:
+            sof_path (Union[str, Path]): Bitstream to convert
+            flash_device (str): Serial configuration device, e.g. EPCS64
+            quartus_cpf (Union[str, Path]): Path of the converter
+        """
+        return hash_strings('pof', CONVERSION_VERSION, hash_file(sof_path), flash_device.upper(),
+                            tool_fingerprint(quartus_cpf))
+
+    def image_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pof"
+
+    def restore(self, key: str, pof_path: Union[str, Path]) -> bool:
+        """
+        Copy a cached image to pof_path.
+
+        Returns:
+            bool: True on a cache hit
+        """
+        image_path = self.image_path(key)
+        try:
+            materialize(image_path, pof_path)
+        except FileNotFoundError:
+            self.stats['misses'] += 1
+            return False
+        self.stats['hits'] += 1
+        return True
+
+    def store(self, key: str, pof_path: Union[str, Path]) -> Optional[Path]:
+        """
+        Store a converted image.
+
+        Returns:
+            Path: The cached image, None if pof_path does not exist
+        """
+        if not os.path.exists(pof_path):
+            return None
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Copied aside and renamed, parallel programming sessions may store the same image
+        tmp_path = self.cache_dir / f"tmp-{uuid.uuid4().hex}.pof"
+        shutil.copyfile(pof_path, tmp_path)
+        os.replace(tmp_path, self.image_path(key))
+        self.stats['stores'] += 1
+        return self.image_path(key)
@@ -0,0 +1,221 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Generator, List, NamedTuple, Optional, Sequence, Set
+
+from libs.build_trace import trace_phase
+from libs.execution import run_command_steps
+
+
+class FlowNode(NamedTuple):
+    """
+    A stage of a flow graph.
+    """
+    name: str
+    steps: Callable[[Dict[str, Any]], Generator]  # creates the steps of the stage from its inputs
+    inputs: Sequence[str] = ()                    # artifacts needed, produced by other nodes
+    outputs: Sequence[str] = ()                   # artifacts produced
+
+
+class NodeResult(NamedTuple):
+    """
+    Outcome of a node of a flow graph.
+    """
+    value: Any                  # return value of the steps, None if the node failed
+    error: Optional[Exception]
+    start_s: float              # since the start of the graph
+    wall_s: float
+
+
+class FlowError(RuntimeError):
+    """
+    Raised when nodes of a flow graph fail; the nodes depending on them are not run.
+    """
+
+    def __init__(self, results: Dict[str, NodeResult], skipped: List[str]):
+        failed = {name: result.error for name, result in results.items() if result.error is not None}
+        lines = [f"{name}: {error}" for name, error in failed.items()]
+        if skipped:
+            lines.append(f"not run: {', '.join(skipped)}")
+        super().__init__("Failed stages:\n  " + "\n  ".join(lines))
+        self.results = results
+        self.errors = failed
+        self.skipped = skipped
+
+
+class FlowGraph:
+    """
+    The stages of a flow with the artifacts they need and produce.
+
+    A node depends on the nodes producing its inputs. The executors
+    (run_graph, run_graph_async) start every node as soon as its inputs
+    exist, so independent nodes run at the same time.
+
+    The steps of a node (see run_command_steps) are created when it starts,
+    from the values of its inputs; the return value of the steps is the
+    value of the outputs of the node.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, FlowNode] = {}
+
+    def add(self, name: str, steps: Callable[[Dict[str, Any]], Generator], inputs: Sequence[str] = (),
+            outputs: Sequence[str] = ()) -> 'FlowGraph':
+        """
+        Add a node.
+
+        Args:
+            name (str): Name of the node, also its trace phase
+            steps (Callable): Creates the steps of the node when it starts,
+                              receives {input: value}
+            inputs ([str]): Artifacts needed
+            outputs ([str]): Artifacts produced
+        """
+        if name in self.nodes:
+            raise ValueError(f"Node '{name}' defined twice")
+        self.nodes[name] = FlowNode(name, steps, tuple(inputs), tuple(outputs))
+        return self
+
+    def producers(self) -> Dict[str, str]:
+        """
+        Node producing each artifact.
+        """
+        producers = {}
+        for node in self.nodes.values():
+            for artifact in node.outputs:
+                if artifact in producers:
+                    raise ValueError(f"Artifact '{artifact}' produced by '{producers[artifact]}' and '{node.name}'")
+                producers[artifact] = node.name
+        return producers
+
+    def dependencies(self) -> Dict[str, Set[str]]:
+        """
+        Nodes each node depends on.
+
+        Raises:
+            ValueError: If an input is not produced by any node
+        """
+        producers = self.producers()
+        dependencies = {}
+        for node in self.nodes.values():
+            missing = [artifact for artifact in node.inputs if artifact not in producers]
+            if missing:
+                raise ValueError(f"Node '{node.name}': no node produces {', '.join(missing)}")
+            dependencies[node.name] = {producers[artifact] for artifact in node.inputs}
+        return dependencies
+
+    def order(self) -> List[str]:
+        """
+        The nodes in an order respecting their dependencies.
+
+        Raises:
+            ValueError: If the dependencies contain a cycle
+        """
+        dependencies = self.dependencies()
+        ordered, done = [], set()
+        while len(ordered) < len(self.nodes):
+            ready = [name for name in self.nodes if name not in done and dependencies[name] <= done]
+            if not ready:
+                cycle = sorted(set(self.nodes) - done)
+                raise ValueError(f"Cycle between the nodes {', '.join(cycle)}")
+            ordered.extend(ready)
+            done.update(ready)
+        return ordered
+
+    def ready(self, dependencies: Dict[str, Set[str]], done: Set[str], started: Set[str]) -> List[str]:
+        """
+        Nodes not started yet whose dependencies are all done.
+        """
+        return [name for name in self.nodes if name not in started and dependencies[name] <= done]
+
+    def downstream(self, dependencies: Dict[str, Set[str]], failed: Set[str]) -> Set[str]:
+        """
+        Nodes depending, directly or not, on failed ones.
+        """
+        blocked = set()
+        changed = True
+        while changed:
+            changed = False
+            for name, needs in dependencies.items():
+                if name not in blocked and needs & (failed | blocked):
+                    blocked.add(name)
+                    changed = True
+        return blocked
+
+    def inputs_of(self, name: str, artifacts: Dict[str, Any]) -> Dict[str, Any]:
+        return {artifact: artifacts[artifact] for artifact in self.nodes[name].inputs}
+
+
+def run_node(node: FlowNode, inputs: Dict[str, Any]):
+    """
+    Run the steps of a node in its own trace phase.
+    """
+    with trace_phase(node.name):
+        return run_command_steps(node.steps(inputs))
+
+
+def run_graph(graph: FlowGraph, max_workers: Optional[int] = None) -> Dict[str, NodeResult]:
+    """
+    Run a flow graph, every node in a thread as soon as its dependencies are done.
+
+    When a node fails the nodes depending on it are not run; the others
+    are completed.
+
+    Args:
+        graph (FlowGraph): Nodes of the flow
+        max_workers (int): Nodes running at the same time (all the ready ones if None)
+
+    Returns:
+        dict: Result of each node, see NodeResult
+
+    Raises:
+        FlowError: If any node failed
+        ValueError: If the graph is not valid
+    """
+    dependencies = graph.dependencies()
+    graph.order()
+
+    results: Dict[str, NodeResult] = {}
+    artifacts: Dict[str, Any] = {}
+    done, started, failed = set(), set(), set()
+    running = {}  # {future: (name, start)}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(graph.nodes) or 1) as executor:
+        while True:
+            blocked = graph.downstream(dependencies, failed)
+            for name in graph.ready(dependencies, done, started | blocked):
+                started.add(name)
+                # Each thread keeps the trace phase of the caller
+                future = executor.submit(contextvars.copy_context().run, run_node, graph.nodes[name],
+                                         graph.inputs_of(name, artifacts))
+                running[future] = (name, time.perf_counter())
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, node_start = running.pop(future)
+                wall_s = time.perf_counter() - node_start
+                try:
+                    results[name] = NodeResult(future.result(), None, node_start - start, wall_s)
+                    artifacts.update(dict.fromkeys(graph.nodes[name].outputs, results[name].value))
+                    done.add(name)
+                except Exception as e:
+                    results[name] = NodeResult(None, e, node_start - start, wall_s)
+                    failed.add(name)
+
+    if failed:
+        raise FlowError(results, [name for name in graph.order() if name not in results])
+    return results
+
+
+def format_flow_report(results: Dict[str, NodeResult]) -> str:
+    """
+    Table with the start, the duration and the outcome of every node.
+    """
+    lines = [f"{'stage':<16} {'start':>9} {'wall':>9} {'result':>8}"]
+    for name, result in sorted(results.items(), key=lambda item: item[1].start_s):
+        lines.append(f"{name[:16]:<16} {result.start_s:>8.2f}s {result.wall_s:>8.2f}s "
+                     f"{'ok' if result.error is None else 'FAILED':>8}")
+    return "\n".join(lines)
@@ -0,0 +1,96 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+
+def hash_bytes(data: bytes) -> str:
+    """
+    SHA-256 hex digest of some bytes.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_strings(*parts) -> str:
+    """
+    SHA-256 hex digest of a sequence of values, each converted to string.
+
+    The values are separated, so ("ab", "c") and ("a", "bc") differ.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def hash_file(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    """
+    SHA-256 hex digest of the content of a file, read in chunks.
+
+    Args:
+        path (Union[str, Path]): File to hash
+        chunk_size (int): Size of each read in bytes
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tool_fingerprint(executable: Union[str, Path]) -> str:
+    """
+    Identifies an installed tool by path, size and mtime, without running it.
+    """
+    try:
+        stat = os.stat(executable)
+    except OSError:
+        return str(executable)
+    return hash_strings(str(executable), stat.st_size, stat.st_mtime_ns)
+
+
+class StatHashCache:
+    """
+    Memoizes file hashes by (size, mtime), so unchanged files are not read again.
+
+    The state is a plain dict {path: [size, mtime_ns, hash]} that can be
+    stored in a JSON file and passed back on the next run.
+    """
+
+    def __init__(self, state: Optional[Dict[str, list]] = None):
+        self.state = state if state is not None else {}
+
+    def hash_file(self, path: Union[str, Path]) -> Optional[str]:
+        """
+        Hash of a file, None if it does not exist.
+        """
+        key = os.path.abspath(path)
+        try:
+            stat = os.stat(key)
+        except FileNotFoundError:
+            self.state.pop(key, None)
+            return None
+
+        cached = self.state.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+        digest = hash_file(key)
+        self.state[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def hash_files(self, paths: Iterable[Union[str, Path]], base_dir: Optional[Union[str, Path]] = None) -> str:
+        """
+        Combined hash of many files: names (relative to base_dir) and contents.
+        Missing files are part of the hash as well.
+        """
+        parts = []
+        for path in sorted(str(path) for path in paths):
+            name = os.path.relpath(path, base_dir) if base_dir else path
+            parts.append(name.replace('\\', '/'))
+            parts.append(self.hash_file(path) or 'missing')
+        return hash_strings(*parts)
@@ -0,0 +1,168 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+from libs.paths import get_cache_dir
+
+# Bumped when the analysis changes, so that cached results are recomputed
+ANALYZER_VERSION = 1
+
+ANALYZED_SUFFIXES = ['.v', '.tdf', '.vhd']
+
+_verilog_parameter = re.compile(r'parameter\s+(\w+)\s*=\s*([^;]+);')
+_verilog_port = re.compile(r'\b(input|output|inout)\s+(?:reg|wire)?\s*(\[[^\]]+\])?\s*(\w+)')
+_tdf_parameter = re.compile(r'PARAMETER\s*\("([^"]+)"\s*,\s*([^)]+)\)', re.IGNORECASE)
+_tdf_port = re.compile(r'\b(INPUT|OUTPUT|BIDIR)\s+(\w+)', re.IGNORECASE)
+_vhdl_parameter = re.compile(r'generic\s*\(\s*(\w+)\s*:\s*([^;]+);', re.IGNORECASE)
+_vhdl_port = re.compile(r'\b(in|out|inout)\s+(\w+)\s*:\s*([^;]+);', re.IGNORECASE)
+
+
+def analyze_content(content: str, file_type: str) -> Dict:
+    """
+    Parameters and ports declared in the source of an IP.
+
+    Args:
+        content (str): Content of the file
+        file_type (str): Suffix of the file (.v, .tdf, .vhd)
+
+    Returns:
+        dict: {'parameters': [{'name', 'value'}], 'ports': [{'direction', 'name', 'type'}]}
+    """
+    parameters = []
+    ports = []
+
+    if file_type == '.v':
+        parameters = [{'name': m.group(1), 'value': m.group(2).strip()} for m in _verilog_parameter.finditer(content)]
+        ports = [{'direction': m.group(1), 'name': m.group(3), 'type': m.group(2)}
+                 for m in _verilog_port.finditer(content)]
+    elif file_type == '.tdf':
+        parameters = [{'name': m.group(1), 'value': m.group(2).strip()} for m in _tdf_parameter.finditer(content)]
+        ports = [{'direction': m.group(1).lower(), 'name': m.group(2), 'type': None}
+                 for m in _tdf_port.finditer(content)]
+    elif file_type == '.vhd':
+        parameters = [{'name': m.group(1), 'value': m.group(2).strip()} for m in _vhdl_parameter.finditer(content)]
+        ports = [{'direction': m.group(1).lower(), 'name': m.group(2), 'type': m.group(3).strip()}
+                 for m in _vhdl_port.finditer(content)]
+
+    return {'parameters': parameters, 'ports': ports}
+
+
+def analyze_file(path: Union[str, Path]) -> Dict:
+    """
+    Analyze an IP file (see analyze_content); runs in the worker pool.
+
+    Returns:
+        dict: The analysis, plus 'path', 'type' and 'error' (None if the file was read)
+    """
+    path = str(path)
+    file_type = os.path.splitext(path)[1].lower()
+    try:
+        # Quartus sources are not always valid UTF-8
+        with open(path, 'r', errors='replace') as file:
+            result = analyze_content(file.read(), file_type)
+        result['error'] = None
+    except OSError as e:
+        result = {'parameters': [], 'ports': [], 'error': str(e)}
+    result['path'] = path
+    result['type'] = file_type
+    return result
+
+
+class IPAnalysisCache:
+    """
+    On-disk memo of analyze_file results, keyed on (path, mtime, size).
+    """
+
+    def __init__(self, cache_path: Union[str, Path, None] = None):
+        """
+        Args:
+            cache_path (Union[str, Path]): SQLite file (default: user cache directory)
+        """
+        self.cache_path = Path(cache_path) if cache_path else get_cache_dir() / "ip_analysis.sqlite"
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS analysis ("
+                        "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, version INTEGER, result TEXT)")
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def close(self):
+        self.db.close()
+
+    @staticmethod
+    def file_key(path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path: str, key: tuple) -> Optional[Dict]:
+        with self._lock:
+            row = self.db.execute("SELECT mtime_ns, size, version, result FROM analysis WHERE path = ?",
+                                  (path,)).fetchone()
+        if row is None or (row[0], row[1]) != key or row[2] != ANALYZER_VERSION:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return json.loads(row[3])
+
+    def put_many(self, entries: Iterable[tuple]):
+        """
+        Args:
+            entries: (path, key, result) tuples
+        """
+        rows = [(path, key[0], key[1], ANALYZER_VERSION, json.dumps(result)) for path, key, result in entries]
+        with self._lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO analysis (path, mtime_ns, size, version, result) "
+                                "VALUES (?, ?, ?, ?, ?)", rows)
+
+
+def analyze_files(paths: Iterable[Union[str, Path]], cache: Optional[IPAnalysisCache] = None,
+                  workers: Optional[int] = None, use_processes: bool = True) -> Dict[str, Dict]:
+    """
+    Analyze many IP files in a worker pool, reusing the cached results of unchanged files.
+
+    Args:
+        paths (Iterable): Files to analyze
+        cache (IPAnalysisCache): Memo of the results (None: no caching)
+        workers (int): Size of the pool (default: CPU count)
+        use_processes (bool): Process pool (regex matching is CPU bound) or thread pool
+
+    Returns:
+        dict: {path: analysis}, see analyze_file
+    """
+    results = {}
+    missing = []
+    keys = {}
+    for path in dict.fromkeys(str(path) for path in paths):
+        key = IPAnalysisCache.file_key(path)
+        cached = cache.get(path, key) if cache is not None and key is not None else None
+        if cached is not None:
+            results[path] = cached
+        else:
+            keys[path] = key
+            missing.append(path)
+
+    workers = workers or os.cpu_count() or 1
+    if len(missing) <= 1 or workers == 1:
+        analyzed = [analyze_file(path) for path in missing]
+    else:
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_class(max_workers=min(workers, len(missing))) as executor:
+            # Files are small: batches amortize the inter-process round trips
+            analyzed = list(executor.map(analyze_file, missing, chunksize=max(1, len(missing) // (workers * 4))))
+
+    for result in analyzed:
+        results[result['path']] = result
+
+    if cache is not None:
+        cache.put_many((result['path'], keys[result['path']], result) for result in analyzed
+                       if result['error'] is None and keys[result['path']] is not None)
+
+    return results
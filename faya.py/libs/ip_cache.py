@@ -0,0 +1,161 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from libs.hashing import hash_file, hash_strings, tool_fingerprint
+from libs.materialize import Materializer, WRITABLE_METHODS
+from libs.paths import get_cache_dir, write_cache_entry
+
+# Bumped when the layout of the entries changes
+IP_CACHE_VERSION = 1
+
+FILES_NAME = "files.json"
+
+
+def snapshot(directory: Union[str, Path]) -> Dict[str, Tuple[int, int]]:
+    """
+    Size and mtime of every file under a directory, by relative path.
+    """
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[os.path.relpath(path, directory)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class GeneratedIPCache:
+    """
+    Output of qsys-generate, keyed on the content of the .qsys and on the
+    generator, so that an IP core is generated once per Quartus installation.
+
+    The generated files are recognized by comparing the project directory
+    before and after the generation. Projects get reflinks or copies of the
+    cached files, never hard links: qsys-generate rewrites them in place
+    when the .qsys changes.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path, None] = None):
+        """
+        Args:
+            cache_dir (Union[str, Path]): Directory of the cache (default: user cache directory)
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir() / "ip"
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0}
+
+    @staticmethod
+    def key(qsys_path: Union[str, Path], generator: Union[str, Path]) -> str:
+        """
+        Cache key of a generation.
+
+        Args:
+            qsys_path (Union[str, Path]): Platform Designer system (the names
+                                          of the generated files follow its name)
+            generator (Union[str, Path]): Path of qsys-generate
+        """
+        return hash_strings('ip', IP_CACHE_VERSION, Path(qsys_path).name, hash_file(qsys_path),
+                            tool_fingerprint(generator))
+
+    def entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def restore(self, key: str, project_dir: Union[str, Path], materializer: Optional[Materializer] = None) -> bool:
+        """
+        Place the cached generated files into a project.
+
+        Args:
+            key (str): Cache key, see key()
+            project_dir (Union[str, Path]): Project directory
+            materializer (Materializer): Counts the files placed, always with WRITABLE_METHODS
+
+        Returns:
+            bool: True on a cache hit
+        """
+        entry_dir = self.entry_dir(key)
+        try:
+            with open(entry_dir / FILES_NAME, 'r') as file:
+                files = json.load(file)
+        except (FileNotFoundError, ValueError):
+            self.stats['misses'] += 1
+            return False
+
+        # Never hard links: a later generation in the project would rewrite the entry
+        materializer = materializer or Materializer(WRITABLE_METHODS)
+        for relative_path in files:
+            destination = Path(project_dir) / relative_path
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            materializer.file(entry_dir / relative_path, destination, WRITABLE_METHODS)
+
+        # Marks the entry as recently used
+        os.utime(entry_dir / FILES_NAME)
+        self.stats['hits'] += 1
+        return True
+
+    def store(self, key: str, project_dir: Union[str, Path], before: Dict[str, Tuple[int, int]],
+              prefix: str = '') -> bool:
+        """
+        Store the files generated in a project.
+
+        Args:
+            key (str): Cache key, see key()
+            project_dir (Union[str, Path]): Project directory
+            before (dict): snapshot() of the project directory before the generation
+            prefix (str): Only store paths starting with it (e.g. the name of the
+                          IP core), other stages may be writing the project meanwhile
+
+        Returns:
+            bool: True if a new entry has been written
+        """
+        if self.entry_dir(key).exists():
+            return False
+
+        after = snapshot(project_dir)
+        generated = sorted(path for path, stat in after.items()
+                           if before.get(path) != stat and path.startswith(prefix))
+        if not generated:
+            return False
+
+        def fill(tmp_dir: Path):
+            # Never linked: the project may regenerate its files in place
+            materializer = Materializer(WRITABLE_METHODS)
+            for relative_path in generated:
+                destination = tmp_dir / relative_path
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                materializer.file(Path(project_dir) / relative_path, destination)
+            with open(tmp_dir / FILES_NAME, 'w') as file:
+                json.dump(generated, file, indent=1)
+
+        if not write_cache_entry(self.cache_dir, self.entry_dir(key), fill):
+            return False
+
+        self.stats['stores'] += 1
+        return True
+
+    def entries(self) -> Dict[str, float]:
+        """
+        Keys of the entries with their last use time.
+        """
+        entries = {}
+        if self.cache_dir.exists():
+            for entry_dir in self.cache_dir.iterdir():
+                try:
+                    entries[entry_dir.name] = os.path.getmtime(entry_dir / FILES_NAME)
+                except OSError:
+                    continue
+        return entries
+
+    def prune(self, max_age_days: Optional[float] = 90):
+        """
+        Remove the entries not used for max_age_days.
+        """
+        limit = time.time() - max_age_days * 86400
+        for key, last_used in self.entries().items():
+            if last_used < limit:
+                shutil.rmtree(self.entry_dir(key), ignore_errors=True)
@@ -0,0 +1,228 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from libs.hashing import hash_strings
+from libs.paths import get_cache_dir
+
+INDEX_VERSION = 1
+
+_schema = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,      -- relative to the install, '' for the root
+    parent INTEGER,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    dir INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    suffix TEXT NOT NULL            -- lower case, with the dot
+);
+CREATE INDEX IF NOT EXISTS files_name ON files (name_lower);
+CREATE INDEX IF NOT EXISTS files_suffix ON files (suffix);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+"""
+
+
+def default_index_path(quartus_dir: Union[str, Path]) -> Path:
+    """
+    Index file of a Quartus install in the user cache directory.
+    """
+    return get_cache_dir() / "ip_index" / (hash_strings(str(Path(quartus_dir).resolve()))[:16] + ".sqlite")
+
+
+class QuartusFileIndex:
+    """
+    Persistent index of the files of a Quartus install (SQLite).
+
+    Built once per install, the index maps file names to their directory and
+    suffix, so that prefix lookups of IP names take milliseconds instead of a
+    walk of the whole install tree. The index is keyed on the install path and
+    mtime; refresh() only lists again the directories whose mtime changed.
+    """
+
+    def __init__(self, quartus_dir: Union[str, Path], index_path: Union[str, Path, None] = None,
+                 auto_refresh: bool = True):
+        """
+        Args:
+            quartus_dir (Union[str, Path]): Quartus installation directory
+            index_path (Union[str, Path]): SQLite file, see default_index_path()
+            auto_refresh (bool): Refresh the index if the install changed since it was built
+        """
+        self.quartus_dir = Path(quartus_dir)
+        self.index_path = Path(index_path) if index_path else default_index_path(quartus_dir)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.db = sqlite3.connect(str(self.index_path))
+        self.db.executescript(_schema)
+
+        if self.get_meta('version') != str(INDEX_VERSION) or self.get_meta('quartus_dir') != self.install_key()[0]:
+            self.clear()
+
+        if auto_refresh and not self.is_fresh():
+            self.refresh()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def install_key(self) -> tuple:
+        """
+        (install path, install mtime): the index is rebuilt when the path changes
+        and refreshed when the mtime changes.
+        """
+        try:
+            mtime_ns = self.quartus_dir.stat().st_mtime_ns
+        except OSError:
+            mtime_ns = 0
+        return str(self.quartus_dir.resolve()), str(mtime_ns)
+
+    def is_fresh(self) -> bool:
+        path, mtime_ns = self.install_key()
+        return self.get_meta('quartus_dir') == path and self.get_meta('install_mtime_ns') == mtime_ns
+
+    def clear(self):
+        with self.db:
+            self.db.execute("DELETE FROM files")
+            self.db.execute("DELETE FROM dirs")
+            self.db.execute("DELETE FROM meta")
+            self.set_meta('version', INDEX_VERSION)
+            self.set_meta('quartus_dir', self.install_key()[0])
+
+    def refresh(self) -> Dict:
+        """
+        Bring the index up to date with the install.
+
+        Directories are compared by mtime (which changes when entries are
+        added, removed or renamed in them): unchanged ones are not listed,
+        but their subdirectories are still visited.
+
+        Returns:
+            dict: Statistics (dirs visited, dirs listed, files, seconds)
+        """
+        start = time.perf_counter()
+        known = {path: (dir_id, mtime_ns) for dir_id, path, mtime_ns
+                 in self.db.execute("SELECT id, path, mtime_ns FROM dirs")}
+        stats = {'dirs': 0, 'listed': 0}
+
+        with self.db:
+            pending = [('', None)]
+            while pending:
+                rel_path, parent = pending.pop()
+                abs_path = os.path.join(self.quartus_dir, rel_path)
+                try:
+                    mtime_ns = os.stat(abs_path).st_mtime_ns
+                except OSError:
+                    continue
+                stats['dirs'] += 1
+
+                entry = known.get(rel_path)
+                if entry is not None and entry[1] == mtime_ns:
+                    # Unchanged: same files and subdirectories as indexed
+                    dir_id = entry[0]
+                    pending.extend((path, dir_id) for (path,) in
+                                   self.db.execute("SELECT path FROM dirs WHERE parent = ?", (dir_id,)))
+                    continue
+
+                stats['listed'] += 1
+                if entry is None:
+                    dir_id = self.db.execute("INSERT INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                                             (rel_path, parent, mtime_ns)).lastrowid
+                else:
+                    dir_id = entry[0]
+                    self.db.execute("UPDATE dirs SET mtime_ns = ? WHERE id = ?", (mtime_ns, dir_id))
+                    self.db.execute("DELETE FROM files WHERE dir = ?", (dir_id,))
+
+                files = []
+                subdirs = set()
+                try:
+                    with os.scandir(abs_path) as entries:
+                        for dir_entry in entries:
+                            try:
+                                is_dir = dir_entry.is_dir(follow_symlinks=False)
+                            except OSError:
+                                continue
+                            if is_dir:
+                                subdirs.add(os.path.join(rel_path, dir_entry.name) if rel_path else dir_entry.name)
+                            else:
+                                name = dir_entry.name
+                                files.append((dir_id, name, name.lower(), os.path.splitext(name)[1].lower()))
+                except OSError:
+                    pass
+                self.db.executemany("INSERT INTO files (dir, name, name_lower, suffix) VALUES (?, ?, ?, ?)", files)
+
+                if entry is not None:
+                    # Subdirectories that no longer exist are dropped with their subtree
+                    for (path,) in self.db.execute("SELECT path FROM dirs WHERE parent = ?", (dir_id,)).fetchall():
+                        if path not in subdirs:
+                            self.remove_tree(path)
+                pending.extend((path, dir_id) for path in subdirs)
+
+            path, install_mtime_ns = self.install_key()
+            self.set_meta('install_mtime_ns', install_mtime_ns)
+
+        stats['files'] = self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        stats['seconds'] = time.perf_counter() - start
+        return stats
+
+    def remove_tree(self, rel_path: str):
+        prefix = rel_path + os.sep
+        ids = [dir_id for (dir_id,) in self.db.execute(
+            "SELECT id FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", (rel_path, len(prefix), prefix))]
+        self.db.executemany("DELETE FROM files WHERE dir = ?", [(dir_id,) for dir_id in ids])
+        self.db.executemany("DELETE FROM dirs WHERE id = ?", [(dir_id,) for dir_id in ids])
+
+    def find(self, prefix: str = '', suffixes: Optional[Iterable[str]] = None,
+             under: Union[str, Path, None] = None) -> List[Path]:
+        """
+        Files whose name starts with prefix (case insensitive).
+
+        Args:
+            prefix (str): Name prefix, e.g. an IP name
+            suffixes (Iterable[str]): Accepted suffixes, e.g. ['.v', '.tdf'] (all if None)
+            under (Union[str, Path]): Only files in this directory (absolute or relative to the install)
+
+        Returns:
+            list: Absolute paths, sorted
+        """
+        query = "SELECT dirs.path, files.name FROM files JOIN dirs ON dirs.id = files.dir WHERE 1"
+        params = []
+
+        if prefix:
+            # Range on the index instead of LIKE, which would need escaping and a NOCASE index
+            prefix = prefix.lower()
+            query += " AND files.name_lower >= ? AND files.name_lower < ?"
+            params += [prefix, prefix + '\U0010ffff']
+
+        if suffixes is not None:
+            suffixes = [suffix.lower() for suffix in suffixes]
+            query += f" AND files.suffix IN ({','.join('?' * len(suffixes))})"
+            params += suffixes
+
+        if under is not None:
+            under = Path(under)
+            rel = os.path.relpath(under, self.quartus_dir) if under.is_absolute() else str(under)
+            rel = '' if rel == '.' else rel
+            if rel:
+                query += " AND (dirs.path = ? OR substr(dirs.path, 1, ?) = ?)"
+                params += [rel, len(rel) + 1, rel + os.sep]
+
+        return sorted(self.quartus_dir / dir_path / name for dir_path, name in self.db.execute(query, params))
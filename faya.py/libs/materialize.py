@@ -0,0 +1,212 @@
+import errno
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+from typing import Iterable, Optional, Tuple, Union
+
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+SYMLINK = 'symlink'
+COPY = 'copy'
+
+METHODS = (REFLINK, HARDLINK, SYMLINK, COPY)
+
+# Files only read by Quartus (sources): they can share storage with the original
+READ_ONLY_METHODS = (REFLINK, HARDLINK, COPY)
+# Files Quartus rewrites (.qsf, generated IP, outputs restored from a cache): never shared with the original
+WRITABLE_METHODS = (REFLINK, COPY)
+
+# ioctl cloning a whole file (linux/fs.h), supported by btrfs, XFS, bcachefs, ...
+FICLONE = 0x40049409
+
+
+def reflink(source: Union[str, Path], destination: Union[str, Path]):
+    """
+    Copy-on-write clone of a file: the data is shared until one of the two
+    files is written.
+
+    Raises:
+        OSError: If the platform or the filesystem does not support reflinks
+    """
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, "reflinks are only supported on Linux")
+    import fcntl
+
+    try:
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        if os.path.lexists(destination):
+            os.remove(destination)
+        raise
+    shutil.copystat(source, destination)
+
+
+def format_size(size: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class Materializer:
+    """
+    Places files into project directories without copying their data where
+    the filesystem allows it.
+
+    Every file gets the first of the methods that works: a reflink, a hard
+    link, a symbolic link or a plain copy. Files already up to date in the
+    destination (same file, or same size and mtime) are skipped. A method
+    that fails between two devices is not tried again for them.
+
+    The files and bytes placed with each method are counted in stats.
+    """
+
+    def __init__(self, methods: Iterable[str] = READ_ONLY_METHODS):
+        """
+        Args:
+            methods ([str]): Methods tried in order, see METHODS; a copy is
+                             always the last resort
+        """
+        self.methods = tuple(methods)
+        unknown = set(self.methods) - set(METHODS)
+        if unknown:
+            raise ValueError(f"Unknown materialization methods: {', '.join(sorted(unknown))}")
+        if COPY not in self.methods:
+            self.methods += (COPY,)
+
+        self.stats = {method: {'files': 0, 'bytes': 0} for method in METHODS + ('skipped',)}
+        self._unsupported = set()
+        # Shared by the stages of a flow running in parallel
+        self._lock = threading.Lock()
+
+    def _methods(self, methods: Optional[Iterable[str]]) -> Tuple[str, ...]:
+        if methods is None:
+            return self.methods
+        methods = tuple(methods)
+        return methods if COPY in methods else methods + (COPY,)
+
+    def up_to_date(self, source: Union[str, Path], destination: Union[str, Path],
+                   methods: Optional[Iterable[str]] = None) -> bool:
+        """
+        True if destination already holds the content of source.
+        """
+        methods = self._methods(methods)
+        try:
+            dst_stat = os.lstat(destination)
+            src_stat = os.stat(source)
+        except OSError:
+            return False
+
+        if os.path.islink(destination) and SYMLINK not in methods:
+            return False
+        if os.path.samefile(source, destination):
+            # A link is fine only where files may share storage with the original
+            return HARDLINK in methods or SYMLINK in methods
+        if os.path.islink(destination):
+            return False
+        return dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+    def _place(self, method: str, source: Union[str, Path], destination: Union[str, Path]):
+        if method == REFLINK:
+            reflink(source, destination)
+        elif method == HARDLINK:
+            os.link(source, destination)
+        elif method == SYMLINK:
+            os.symlink(os.path.abspath(source), destination)
+        else:
+            shutil.copy2(source, destination)
+
+    def file(self, source: Union[str, Path], destination: Union[str, Path],
+             methods: Optional[Iterable[str]] = None) -> str:
+        """
+        Materialize one file.
+
+        Args:
+            source (Union[str, Path]): Original file
+            destination (Union[str, Path]): Path in the project (replaced if present)
+            methods ([str]): Methods for this file only (default: those of the materializer)
+
+        Returns:
+            str: The method used, or 'skipped' if destination was up to date
+
+        Raises:
+            OSError: If not even a copy was possible
+        """
+        methods = self._methods(methods)
+        size = os.path.getsize(source)
+        if self.up_to_date(source, destination, methods):
+            self._count('skipped', size)
+            return 'skipped'
+
+        devices = (os.stat(source).st_dev, os.stat(os.path.dirname(os.path.abspath(destination))).st_dev)
+        for method in methods:
+            if (method, devices) in self._unsupported:
+                continue
+            if os.path.lexists(destination):
+                os.remove(destination)
+            if method == COPY:
+                self._place(method, source, destination)
+            else:
+                try:
+                    self._place(method, source, destination)
+                except OSError:
+                    self._unsupported.add((method, devices))
+                    continue
+            self._count(method, size)
+            return method
+
+    def into(self, source: Union[str, Path], destination_dir: Union[str, Path]) -> str:
+        """
+        Materialize a file into a directory, keeping its name.
+        """
+        return self.file(source, os.path.join(destination_dir, os.path.basename(source)))
+
+    def tree(self, source_dir: Union[str, Path], destination_dir: Union[str, Path]) -> int:
+        """
+        Materialize every file of a directory tree.
+
+        Returns:
+            int: Number of files
+        """
+        count = 0
+        for root, _, names in os.walk(source_dir):
+            target_root = os.path.join(destination_dir, os.path.relpath(root, source_dir))
+            os.makedirs(target_root, exist_ok=True)
+            for name in names:
+                self.file(os.path.join(root, name), os.path.join(target_root, name))
+                count += 1
+        return count
+
+    def _count(self, method: str, size: int):
+        with self._lock:
+            self.stats[method]['files'] += 1
+            self.stats[method]['bytes'] += size
+
+    @property
+    def bytes_copied(self) -> int:
+        return self.stats[COPY]['bytes']
+
+    @property
+    def bytes_linked(self) -> int:
+        return sum(self.stats[method]['bytes'] for method in (REFLINK, HARDLINK, SYMLINK))
+
+    def summary(self) -> str:
+        """
+        One line report, e.g. "12 files: 3.1 MB linked, 2.0 KB copied, 5 unchanged".
+        """
+        files = sum(counts['files'] for counts in self.stats.values())
+        parts = [f"{format_size(self.bytes_linked)} linked", f"{format_size(self.bytes_copied)} copied"]
+        if self.stats['skipped']['files']:
+            parts.append(f"{self.stats['skipped']['files']} unchanged")
+        return f"{files} files: " + ", ".join(parts)
+
+
+def materialize(source: Union[str, Path], destination: Union[str, Path], methods: Iterable[str] = WRITABLE_METHODS) -> str:
+    """
+    Materialize a single file, see Materializer.file.
+    """
+    return Materializer(methods).file(source, destination)
@@ -1,9 +1,12 @@
 import os
 import sys
+import uuid
 from pathlib import Path
-from typing import Union, Optional
+from typing import Callable, Union, Optional
 import shutil
 
+from libs.materialize import Materializer, WRITABLE_METHODS
+
 def create_directory(path: Union[str, Path], *, parents: bool = True, exist_ok: bool = True) -> Optional[Path]:
     """
     Create a directory at the specified path if it doesn't exist.
@@ -84,40 +87,80 @@ def get_faya_path() -> str:
     script_path = Path(__file__).resolve()
     return script_path.parent.parent
 
-def copy_files(target_name, pathto_folder):
+def get_cache_dir() -> Path:
+    """
+    User cache directory of faya (FAYA_CACHE_DIR, or the platform default).
+    """
+    if os.environ.get('FAYA_CACHE_DIR'):
+        return Path(os.environ['FAYA_CACHE_DIR'])
+    if os.name == 'nt':
+        return Path(os.environ.get('LOCALAPPDATA', Path.home() / 'AppData' / 'Local')) / 'faya'
+    return Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'faya'
+
+def write_cache_entry(cache_dir: Union[str, Path], entry_dir: Union[str, Path], fill: Callable[[Path], None]) -> bool:
+    """
+    Write a cache entry atomically.
+
+    fill() writes the files into a private directory of cache_dir, which is
+    then renamed to entry_dir: readers never see partial entries.
+
+    Args:
+        cache_dir (Union[str, Path]): Directory of the cache, on the filesystem of entry_dir
+        entry_dir (Union[str, Path]): Final directory of the entry
+        fill (Callable): Receives the private directory
+
+    Returns:
+        bool: True if the entry has been written, False if stored meanwhile by another build
+    """
+    tmp_dir = Path(cache_dir) / f"tmp-{uuid.uuid4().hex}"
+    tmp_dir.mkdir(parents=True)
+    try:
+        fill(tmp_dir)
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            return False
+    finally:
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return True
+
+def copy_files(target_name, pathto_folder, source_dir='.', materializer=None):
   """
-  Copies every file and directory with a name that starts with target_name to pathto_folder.
+  Materializes every file and directory with a name that starts with target_name into pathto_folder.
 
   Args:
     target_name: The string to match at the beginning of file and directory names.
     pathto_folder: The destination folder to copy the files and directories to.
+    source_dir: The folder searched for matching names (default: the current directory).
+    materializer: Materializer placing the files (default: links where possible, see libs.materialize).
   """
+  materializer = materializer or Materializer()
 
-  for item in os.listdir():
+  for item in os.listdir(source_dir):
     if item.startswith(target_name):
+      source = os.path.join(source_dir, item)
       try:
-        shutil.copytree(item, os.path.join(pathto_folder, item))
-      except OSError as e:
-        if e.errno == shutil.errno.ENOTDIR:  # If it's not a directory, it's a file
-          shutil.copy2(item, pathto_folder)
+        if os.path.isdir(source):
+          materializer.tree(source, os.path.join(pathto_folder, item))
         else:
-          print(f"Error copying {item}: {e}")
+          materializer.into(source, pathto_folder)
+      except OSError as e:
+        print(f"Error copying {item}: {e}")
 
 def copy(source, target):
     shutil.copy(source, target)
 
-def copy_file(source_path, destination_dir):
-  """Copies a file to a specified directory without renaming it.
+def copy_file(source_path, destination_dir, materializer=None):
+  """Materializes a file into a specified directory without renaming it.
+
+  The file is linked where the filesystem allows it and skipped if the
+  destination is already up to date (see libs.materialize).
 
   Args:
     source_path: The path to the source file.
     destination_dir: The path to the destination directory.
-
-  Raises:
-    FileNotFoundError: If the source file does not exist.
-    shutil.SameFileError: If the source and destination paths refer to the same file.
-    PermissionError: If the user lacks necessary permissions to write to the destination directory.
-    OSError: For other operating system related errors.
+    materializer: Materializer placing the file (default: links where possible).
   """
   try:
     # Check if the destination is a directory
@@ -130,15 +173,12 @@ def copy_file(source_path, destination_dir):
     # Construct the destination path
     destination_path = os.path.join(destination_dir, file_name)
 
-    # Copy the file to the destination directory
-    shutil.copy2(source_path, destination_path)
+    method = (materializer or Materializer()).file(source_path, destination_path)
 
-    print(f"File copied successfully to: {destination_path}")
+    print(f"File materialized ({method}) to: {destination_path}")
 
   except FileNotFoundError:
     print(f"Error: Source file not found: {source_path}")
-  except shutil.SameFileError:
-    print(f"Error: Source and destination paths refer to the same file.")
   except PermissionError:
     print(f"Error: Permission denied to write to destination directory.")
   except OSError as e:
@@ -158,28 +198,20 @@ def get_filename_and_extension(file_path):
 
   return os.path.basename(file_path)
 
-def copy_and_rename(sorgente, destinazione, nuovo_nome):
+def copy_and_rename(sorgente, destinazione, nuovo_nome, materializer=None):
   """
-  Copia un file e lo rinomina.
+  Copia un file con un nuovo nome. Il file viene riscritto da Quartus (.qsf):
+  mai un link, al piu' un reflink copy-on-write (vedi libs.materialize).
 
   Args:
     sorgente: Il percorso del file sorgente.
     destinazione: Il percorso della cartella di destinazione.
     nuovo_nome: Il nuovo nome del file.
+    materializer: Materializer con i soli metodi WRITABLE_METHODS (opzionale).
   """
   try:
-    # Copia il file nella cartella di destinazione
-    shutil.copy(sorgente, destinazione)
-
-    # Crea il percorso completo del file copiato
-    vecchio_percorso = os.path.join(destinazione, os.path.basename(sorgente))
     nuovo_percorso = os.path.join(destinazione, nuovo_nome)
-
-    if os.path.exists(nuovo_percorso):
-        os.remove(nuovo_percorso)
-
-    # Rinomina il file copiato
-    os.rename(vecchio_percorso, nuovo_percorso)
+    (materializer or Materializer(WRITABLE_METHODS)).file(sorgente, nuovo_percorso)
 
     print(f"File copiato e rinominato con successo in: {nuovo_percorso}")
   except FileNotFoundError:
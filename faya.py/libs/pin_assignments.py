@@ -0,0 +1,132 @@
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from libs.boards import Board
+from libs.hashing import hash_bytes, hash_strings
+from libs.paths import get_cache_dir
+from libs.tcl_batch import tcl_quote
+
+# Bumped when the generated Tcl changes, so that cached scripts are regenerated
+GENERATOR_VERSION = 1
+
+# "set_location_assignment PIN_A15 -to LED[0]", "set_instance_assignment ... -to LED[0]"
+_qsf_target = re.compile(r'^\s*set_(location|instance)_assignment\b.*\s-to\s+"?([^"\s]+)"?')
+
+
+def render_pin_assignments(board: Board, signals: Optional[Iterable[str]] = None) -> str:
+    """
+    Tcl assignments of a board: its global assignments, then the location and
+    I/O standard of every pin, grouped as in the YAML.
+
+    The script is meant to be sourced while the project is open.
+
+    Args:
+        board (Board): Board definition
+        signals (Iterable[str]): Only assign these signals (all if None)
+
+    Returns:
+        str: Content of the Tcl script
+    """
+    selected = None if signals is None else set(signals)
+
+    lines = [f"# Generated by faya.py from {Path(board.source).name}: do not edit", ""]
+
+    for name, value in board.assignments.items():
+        lines.append(f"set_global_assignment -name {name} {tcl_quote(value)}")
+    if board.assignments:
+        lines.append("")
+
+    for group, pins in board.groups.items():
+        pins = [pin for pin in pins if selected is None or pin.signal in selected]
+        if not pins:
+            continue
+        lines.append(f"# {group}")
+        for pin in pins:
+            signal = tcl_quote(pin.signal)
+            lines.append(f"set_location_assignment {tcl_quote('PIN_' + pin.pin)} -to {signal}")
+            if pin.io_standard:
+                lines.append(f"set_instance_assignment -name IO_STANDARD {tcl_quote(pin.io_standard)} -to {signal}")
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+def pin_assignments_file(board: Board, signals: Optional[Iterable[str]] = None,
+                         cache_dir: Union[str, Path, None] = None) -> Path:
+    """
+    Generated pin assignments of a board (see render_pin_assignments), cached
+    per board definition hash: the script is only written when the YAML changes.
+
+    Returns:
+        Path: Tcl script to source in the project
+    """
+    selection = '' if signals is None else '\n'.join(sorted(set(signals)))
+    key = hash_strings('pins', str(GENERATOR_VERSION), board.content_hash or repr(board.data), selection)
+
+    cache_dir = Path(cache_dir) if cache_dir else get_cache_dir() / "pins"
+    path = cache_dir / f"{board.name}-{key[:16]}.tcl"
+    if path.exists():
+        return path
+
+    return write_cached(path, render_pin_assignments(board, signals))
+
+
+def write_cached(path: Path, content: str) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written aside and renamed, parallel builds may generate the same file
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'w') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def prune_qsf(content: str, keep) -> str:
+    """
+    Drop the assignments of the pins that are not kept from a .qsf.
+
+    The pins are the targets of the location assignments: their other
+    instance assignments (IO_STANDARD, ...) are dropped with them, while
+    assignments to anything else are left untouched.
+
+    Args:
+        content (str): Content of the .qsf
+        keep (callable): Predicate on the pin signal, see port_signal_filter
+    """
+    lines = content.splitlines()
+    pins = set()
+    for line in lines:
+        match = _qsf_target.match(line)
+        if match and match.group(1) == 'location':
+            pins.add(match.group(2))
+
+    kept = []
+    for line in lines:
+        match = _qsf_target.match(line)
+        if match and match.group(2) in pins and not keep(match.group(2)):
+            continue
+        kept.append(line)
+    return "\n".join(kept) + "\n"
+
+
+def pruned_qsf_file(base_qsf: Union[str, Path], keep, cache_dir: Union[str, Path, None] = None) -> Path:
+    """
+    A base .qsf with only the pin assignments that are kept (see prune_qsf),
+    cached per content of the base and set of kept pins.
+
+    Returns:
+        Path: The pruned .qsf
+    """
+    with open(base_qsf, 'r') as file:
+        content = file.read()
+    pruned = prune_qsf(content, keep)
+
+    key = hash_strings('qsf', str(GENERATOR_VERSION), hash_bytes(pruned.encode()))
+    cache_dir = Path(cache_dir) if cache_dir else get_cache_dir() / "pins"
+    path = cache_dir / f"{Path(base_qsf).stem}-{key[:16]}.qsf"
+    if path.exists():
+        return path
+    return write_cached(path, pruned)
@@ -0,0 +1,180 @@
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    # Not imported at runtime: boards (and so program.py) load the profiles without the build modules
+    from libs.tcl_batch import TclBatch
+
+# Friendly keys of a profile in the YAML and the global assignment they set
+PROFILE_KEYS = {
+    'parallel_processors': 'NUM_PARALLEL_PROCESSORS',
+    'optimization_mode': 'OPTIMIZATION_MODE',
+    'fitter_effort': 'FITTER_EFFORT',
+    'smart_recompile': 'SMART_RECOMPILE',
+    'timing_driven_synthesis': 'SYNTH_TIMING_DRIVEN_SYNTHESIS',
+    'physical_synthesis': ('PHYSICAL_SYNTHESIS_COMBO_LOGIC',
+                           'PHYSICAL_SYNTHESIS_REGISTER_DUPLICATION',
+                           'PHYSICAL_SYNTHESIS_REGISTER_RETIMING'),
+}
+
+# Netlist kept by a design partition between two compilations
+PARTITION_NETLIST_TYPES = ('SOURCE', 'POST_SYNTH', 'POST_FIT', 'EMPTY')
+
+
+class Partition(NamedTuple):
+    """
+    A design partition for incremental compilation.
+
+    Only Quartus Standard and Pro editions support partitions, so no built-in
+    profile uses them: they are defined in the 'profiles' section of a board.
+    """
+    name: str          # e.g. "Top"
+    hierarchy: str     # instance path, "|" for the top level entity
+    netlist_type: str  # see PARTITION_NETLIST_TYPES
+
+
+class PerformanceProfile(NamedTuple):
+    """
+    Compilation settings trading compile time against timing results.
+    """
+    name: str
+    assignments: Dict[str, str]
+    partitions: Tuple[Partition, ...] = ()
+    description: str = ''
+
+    def apply(self, batch: 'TclBatch') -> 'TclBatch':
+        """
+        Add the assignments of the profile to a batch, in the open project.
+        """
+        from libs.tcl_batch import tcl_quote
+
+        for name, value in self.assignments.items():
+            batch.set_global_assignment(name, value)
+
+        for partition in self.partitions:
+            section = tcl_quote(partition.name)
+            # The top level entity is always the root partition
+            hierarchy_name = 'root_partition' if partition.hierarchy == '|' else tcl_quote(partition.name)
+            batch.add_step(f"partition {partition.name}", "\n".join([
+                f'set_global_assignment -name PARTITION_NETLIST_TYPE {partition.netlist_type} -section_id {section}',
+                f'set_global_assignment -name PARTITION_FITTER_PRESERVATION_LEVEL PLACEMENT_AND_ROUTING '
+                f'-section_id {section}',
+                f'set_instance_assignment -name PARTITION_HIERARCHY {hierarchy_name} '
+                f'-to {tcl_quote(partition.hierarchy)} -section_id {section}'
+            ]))
+        return batch
+
+    def describe(self) -> List[str]:
+        """
+        The settings of the profile, one per line.
+        """
+        lines = [f"{name} = {value}" for name, value in self.assignments.items()]
+        lines.extend(f"partition {p.name} ({p.hierarchy}): {p.netlist_type}" for p in self.partitions)
+        return lines
+
+
+# Developer builds: every core, minimum effort, unchanged logic reused by smart recompilation
+FAST_ITERATION = {
+    'description': "Shortest compile time, for development builds",
+    'parallel_processors': 'ALL',
+    'optimization_mode': 'AGGRESSIVE COMPILE TIME',
+    'fitter_effort': 'FAST FIT',
+    'smart_recompile': True,
+    'timing_driven_synthesis': False,
+    'physical_synthesis': False,
+}
+
+# Release builds: best timing results, whatever the compile time
+MAX_FMAX = {
+    'description': "Best timing results, for release builds",
+    'parallel_processors': 'ALL',
+    'optimization_mode': 'HIGH PERFORMANCE EFFORT',
+    'fitter_effort': 'STANDARD FIT',
+    'smart_recompile': False,
+    'timing_driven_synthesis': True,
+    'physical_synthesis': True,
+    'assignments': {'PHYSICAL_SYNTHESIS_EFFORT': 'EXTRA',
+                    'ROUTER_TIMING_OPTIMIZATION_LEVEL': 'MAXIMUM',
+                    'OPTIMIZE_HOLD_TIMING': 'ALL PATHS'},
+}
+
+BUILTIN_PROFILES = {'fast-iteration': FAST_ITERATION, 'max-fmax': MAX_FMAX}
+
+
+def _setting(value: Any) -> str:
+    if isinstance(value, bool):
+        return 'ON' if value else 'OFF'
+    return str(value)
+
+
+def parse_profile(name: str, data: Dict[str, Any]) -> PerformanceProfile:
+    """
+    Build a profile from its YAML definition.
+
+    Args:
+        name (str): Name of the profile
+        data (dict): Friendly keys (see PROFILE_KEYS), 'partitions',
+                     'assignments' (raw global assignments) and 'description'
+
+    Raises:
+        ValueError: If the definition is not valid
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"profile '{name}' must map settings to values")
+
+    unknown = set(data) - set(PROFILE_KEYS) - {'partitions', 'assignments', 'description'}
+    if unknown:
+        raise ValueError(f"profile '{name}': unknown settings: {', '.join(sorted(unknown))}")
+
+    assignments = {}
+    for key, assignment in PROFILE_KEYS.items():
+        if data.get(key) is None:
+            continue
+        for assignment_name in (assignment if isinstance(assignment, tuple) else (assignment,)):
+            assignments[assignment_name] = _setting(data[key])
+
+    raw = data.get('assignments') or {}
+    if not isinstance(raw, dict):
+        raise ValueError(f"profile '{name}': 'assignments' must map names to values")
+    assignments.update((str(key), _setting(value)) for key, value in raw.items())
+
+    partitions_data = data.get('partitions') or {}
+    if not isinstance(partitions_data, dict):
+        raise ValueError(f"profile '{name}': 'partitions' must map names to partitions")
+
+    partitions = []
+    for partition_name, partition in partitions_data.items():
+        if not isinstance(partition, dict) or not partition.get('hierarchy'):
+            raise ValueError(f"profile '{name}': partition '{partition_name}' needs a 'hierarchy'")
+        netlist_type = str(partition.get('netlist_type', 'POST_FIT')).upper()
+        if netlist_type not in PARTITION_NETLIST_TYPES:
+            raise ValueError(f"profile '{name}': partition '{partition_name}': netlist_type must be one of "
+                             f"{', '.join(PARTITION_NETLIST_TYPES)}")
+        partitions.append(Partition(str(partition_name), str(partition['hierarchy']), netlist_type))
+
+    return PerformanceProfile(name, assignments, tuple(partitions), str(data.get('description', '')))
+
+
+def parse_profiles(data: Optional[Dict[str, Any]]) -> Dict[str, PerformanceProfile]:
+    """
+    The built-in profiles, extended or overridden by the 'profiles' section of a YAML.
+
+    A YAML profile with the name of a built-in one changes only the settings it lists.
+
+    Raises:
+        ValueError: If a definition is not valid
+    """
+    if data is not None and not isinstance(data, dict):
+        raise ValueError("'profiles' must map names to profiles")
+
+    definitions = {name: dict(definition) for name, definition in BUILTIN_PROFILES.items()}
+    for name, definition in (data or {}).items():
+        if not isinstance(definition, dict):
+            raise ValueError(f"profile '{name}' must map settings to values")
+        merged = definitions.setdefault(str(name), {})
+        for key, value in definition.items():
+            if key in ('assignments', 'partitions') and isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merged[key] = dict(merged[key], **value)
+            else:
+                merged[key] = value
+
+    return {name: parse_profile(name, definition) for name, definition in definitions.items()}
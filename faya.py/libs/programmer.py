@@ -0,0 +1,313 @@
+import fnmatch
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Union
+
+from libs.bitstream_cache import BitstreamCache
+from libs.boards import load_board
+from libs.execution import Parallel, run_command_steps
+from libs.flash_images import FlashImageCache, cpf_command
+from libs.paths import get_cache_dir, get_faya_path
+from libs.this_platform import check_exe
+
+# "1) USB-Blaster [1-1]", "2) DE-SoC on 192.168.0.2 [USB-1]"
+_cable_line = re.compile(r'^\s*(\d+)\)\s+(.+?)\s*$')
+_cable_port = re.compile(r'^(.*?)\s*\[([^\]]+)\]$')
+# "  020F30DD   EP3C25/EP4CE22", "  02D020DD   5CSEBA6(.|ES)/5CSEMA6/.."
+_chain_device = re.compile(r'^\s+([0-9A-Fa-f]{8})\s+(\S.*?)\s*$')
+
+DEFAULT_CABLE = "USB-Blaster"
+
+
+class JtagDevice(NamedTuple):
+    """
+    A device of a JTAG chain.
+    """
+    idcode: str
+    name: str
+
+
+class Cable(NamedTuple):
+    """
+    A programming cable as listed by quartus_pgm -l (or jtagconfig).
+    """
+    index: int              # position in the list, accepted by quartus_pgm -c
+    name: str               # hardware name, e.g. USB-Blaster
+    port: Optional[str]     # e.g. 1-1, None if not listed
+    devices: List[JtagDevice]
+
+    @property
+    def label(self) -> str:
+        """
+        Full cable name as accepted by quartus_pgm -c, e.g. "USB-Blaster [1-1]"
+        """
+        return f"{self.name} [{self.port}]" if self.port else self.name
+
+
+class ProgrammingResult(NamedTuple):
+    """
+    Outcome of programming one cable.
+    """
+    cable: str
+    ok: bool
+    wall_s: float
+    error: str
+
+
+class ProgrammingError(RuntimeError):
+    """
+    Raised when programming fails on one or more cables.
+    """
+    def __init__(self, results: List[ProgrammingResult]):
+        failed = [result for result in results if not result.ok]
+        lines = [f"{result.cable}: {result.error}" for result in failed]
+        super().__init__(f"Programming failed on {len(failed)} of {len(results)} cables:\n  " + "\n  ".join(lines))
+        self.results = results
+
+
+def parse_cable_list(output: str) -> List[Cable]:
+    """
+    Cables and their device chains in the output of quartus_pgm -l,
+    quartus_pgm -a or jtagconfig.
+
+    Chains are only listed by quartus_pgm -a and jtagconfig: with
+    quartus_pgm -l the devices are empty.
+    """
+    cables = []
+    for line in output.splitlines():
+        if line.startswith('Info') or line.startswith('Warning') or line.startswith('Error'):
+            continue
+        match = _cable_line.match(line)
+        if match:
+            name, port = match.group(2), None
+            port_match = _cable_port.match(name)
+            if port_match:
+                name, port = port_match.group(1), port_match.group(2)
+            cables.append(Cable(int(match.group(1)), name, port, []))
+            continue
+        match = _chain_device.match(line)
+        if match and cables:
+            cables[-1].devices.append(JtagDevice(match.group(1).upper(), match.group(2)))
+    return cables
+
+
+def match_cables(cables: Iterable[Cable], pattern: str = DEFAULT_CABLE) -> List[Cable]:
+    """
+    Cables matching a name, a full label or a glob pattern,
+    e.g. "USB-Blaster", "USB-Blaster [1-1]", "USB-Blaster*", "*[2-*]"
+    """
+    # Brackets are part of the labels, not character classes: only * and ? are wildcards
+    glob = re.sub(r'[\[\]]', lambda match: '[' + match.group(0) + ']', pattern)
+    selected = []
+    for cable in cables:
+        if pattern in (cable.name, cable.label, str(cable.index)) or fnmatch.fnmatchcase(cable.label, glob):
+            selected.append(cable)
+    return selected
+
+
+def pgm_command(quartus_pgm: str, cable: str, mode: str, file_name: str) -> List[str]:
+    """
+    Command programming a file with quartus_pgm, in the quoting of run_quartus.
+
+    Args:
+        quartus_pgm (str): Path of the quartus_pgm executable
+        cable (str): Cable label, see Cable.label
+        mode (str): Programming mode, "JTAG" or "AS"
+        file_name (str): .sof (JTAG) or .pof (AS)
+    """
+    command = [str(quartus_pgm), "-c", f'"{cable}"', "-m", mode, "-o", f'"P;{file_name}"']
+    if mode == "JTAG":
+        command.append("--program")
+    return command
+
+
+def format_programming_report(results: List[ProgrammingResult]) -> str:
+    """
+    Table with the outcome and the time of every cable.
+    """
+    lines = [f"{'cable':<40} {'result':>8} {'wall':>9}"]
+    for result in results:
+        lines.append(f"{result.cable[:40]:<40} {'ok' if result.ok else 'FAILED':>8} {result.wall_s:>8.2f}s")
+    return "\n".join(lines)
+
+
+def is_cable_pattern(cable: str) -> bool:
+    # "USB-Blaster*" and "*[2-*]" are patterns, "USB-Blaster [1-1]" is a cable label
+    return '*' in cable or '?' in cable
+
+
+def list_cables_steps(quartus_pgm: Union[str, Path], working_dir: Optional[str] = None, chains: bool = False):
+    """
+    Steps listing the connected cables (see run_command_steps).
+
+    Args:
+        quartus_pgm (Union[str, Path]): Path of the quartus_pgm executable
+        working_dir (str): Working directory of the commands
+        chains (bool): Also detect the JTAG chain of every cable (quartus_pgm -a, all cables at once)
+
+    Returns:
+        list: Cables, see Cable
+    """
+    quartus_pgm = str(quartus_pgm)
+    result = yield [quartus_pgm, "-l"], {'working_dir': working_dir}
+    cables = parse_cable_list(result)
+
+    if chains and cables:
+        results = yield Parallel(([quartus_pgm, "-c", f'"{cable.label}"', "-a"], {'working_dir': working_dir})
+                                 for cable in cables)
+        for cable, detected in zip(cables, results):
+            if detected.error is None:
+                for listed in parse_cable_list(detected.output)[:1]:
+                    cable.devices.extend(listed.devices)
+
+    return cables
+
+
+def program_cables_steps(quartus_pgm: Union[str, Path], cables: List[str], mode: str, file_name: str,
+                         working_dir: Optional[str] = None, fan_out: bool = False):
+    """
+    Steps programming the same file on some cables at once (see run_command_steps).
+
+    Args:
+        quartus_pgm (Union[str, Path]): Path of the quartus_pgm executable
+        cables (list): Cable labels, see Cable.label
+        mode (str): "JTAG" or "AS", see pgm_command
+        file_name (str): .sof (JTAG) or .pof (AS)
+        working_dir (str): Working directory of the commands
+        fan_out (bool): Print the per-cable report and raise ProgrammingError if any
+                        cable failed; otherwise the error of the first cable is raised
+
+    Returns:
+        list: Outcome and time of every cable, see ProgrammingResult
+    """
+    results = yield Parallel((pgm_command(quartus_pgm, cable, mode, file_name), {'working_dir': working_dir})
+                             for cable in cables)
+
+    if not fan_out:
+        for result in results:
+            if result.error is not None:
+                raise result.error
+
+    report = [ProgrammingResult(cable, result.error is None, result.wall_s,
+                                '' if result.error is None else (str(result.error).splitlines() or [''])[0])
+              for cable, result in zip(cables, results)]
+    if fan_out:
+        print(format_programming_report(report))
+        if not all(result.ok for result in report):
+            raise ProgrammingError(report)
+    return report
+
+
+def resolve_bitstream(bitstream: Union[str, Path, None] = None, cache_key: Optional[str] = None,
+                      cache_dir: Union[str, Path, None] = None, board_name: Optional[str] = None) -> Path:
+    """
+    File to program: a .sof/.pof, or the bitstream stored in a BitstreamCache
+    under a key (or a unique prefix of it, as printed by compile_project).
+
+    Args:
+        bitstream (Union[str, Path]): .sof or .pof file
+        cache_key (str): Key (or prefix) of a BitstreamCache entry
+        cache_dir (Union[str, Path]): Directory of the BitstreamCache (default: user cache directory)
+        board_name (str): Checked against the board the cached bitstream was built for
+
+    Raises:
+        FileNotFoundError: If the file or the cache entry does not exist
+        ValueError: If the key is ambiguous or the entry belongs to another board
+    """
+    if bitstream is not None:
+        bitstream = Path(bitstream)
+        if not bitstream.exists():
+            raise FileNotFoundError(f"Bitstream not found: {bitstream}")
+        return bitstream
+
+    cache = BitstreamCache(cache_dir or get_cache_dir() / "bitstreams")
+    keys = [entry.name for entry in cache.entries_dir.iterdir() if entry.name.startswith(cache_key)]
+    if not keys:
+        raise FileNotFoundError(f"No cached bitstream with key {cache_key} in {cache.cache_dir}")
+    if len(keys) > 1:
+        raise ValueError(f"Ambiguous cache key {cache_key}: {len(keys)} entries")
+
+    meta = cache.lookup(keys[0])
+    if meta is None or '.sof' not in meta['files'] and '.pof' not in meta['files']:
+        raise FileNotFoundError(f"No bitstream in cache entry {keys[0]}")
+    if board_name and meta.get('board') not in (None, board_name):
+        raise ValueError(f"Cache entry {keys[0][:12]} was built for {meta['board']}, not {board_name}")
+    return cache.entry_dir(keys[0]) / ('top.sof' if '.sof' in meta['files'] else 'top.pof')
+
+
+def program_bitstream_steps(quartus_dir: Union[str, Path], board_name: str, bitstream: Union[str, Path],
+                            mode: Optional[str] = None, cable: str = DEFAULT_CABLE, all_cables: bool = False,
+                            flash_cache: Optional[FlashImageCache] = None):
+    """
+    Steps of program_bitstream (see run_command_steps).
+    """
+    quartus_pgm = Path(quartus_dir) / "bin64" / check_exe("quartus_pgm")
+    bitstream = Path(bitstream).resolve()
+    working_dir = str(bitstream.parent)
+
+    mode = (mode or ("AS" if bitstream.suffix.lower() == '.pof' else "JTAG")).upper()
+    if mode == "EPCS":
+        mode = "AS"
+
+    if mode == "AS" and bitstream.suffix.lower() == '.sof':
+        # Converted once per bitstream and flash device, then programmed from the cache
+        flash_device = load_board(board_name, get_faya_path() / "boards").flash_device
+        if not flash_device:
+            raise ValueError(f"No flash_device in the definition of board {board_name}")
+        flash_cache = flash_cache or FlashImageCache()
+        quartus_cpf = Path(quartus_dir) / "bin64" / check_exe("quartus_cpf")
+        key = flash_cache.key(bitstream, flash_device, quartus_cpf)
+        pof_path = flash_cache.image_path(key)
+        if not pof_path.exists():
+            # Converted next to the cache, the .sof may be in a read-only directory
+            flash_cache.cache_dir.mkdir(parents=True, exist_ok=True)
+            converted = flash_cache.cache_dir / f"tmp-{uuid.uuid4().hex}.pof"
+            yield cpf_command(quartus_cpf, str(bitstream), converted.name, flash_device), \
+                {'working_dir': str(flash_cache.cache_dir)}
+            flash_cache.store(key, converted)
+            os.remove(converted)
+        bitstream = pof_path
+        working_dir = str(pof_path.parent)
+
+    # An exact cable is used as is: listing the cables costs a quartus_pgm run
+    if all_cables or is_cable_pattern(cable):
+        cables = [listed.label for listed in
+                  match_cables((yield from list_cables_steps(quartus_pgm, working_dir)), cable)]
+        if not cables:
+            raise RuntimeError(f"No cable matching {cable}: check that it is connected and recognized")
+        if not all_cables:
+            cables = cables[:1]
+    else:
+        cables = [cable]
+
+    return (yield from program_cables_steps(quartus_pgm, cables, mode, bitstream.name, working_dir,
+                                            fan_out=all_cables))
+
+
+def program_bitstream(quartus_dir: Union[str, Path], board_name: str, bitstream: Union[str, Path, None] = None,
+                      cache_key: Optional[str] = None, cache_dir: Union[str, Path, None] = None,
+                      mode: Optional[str] = None, cable: str = DEFAULT_CABLE,
+                      all_cables: bool = False) -> List[ProgrammingResult]:
+    """
+    Program a known bitstream, without creating or compiling a project.
+
+    Only the programming machinery is loaded: this is the fast path for
+    flashing a known-good image, see program.py.
+
+    Args:
+        quartus_dir (Union[str, Path]): Quartus installation directory
+        board_name (str): Board name
+        bitstream (Union[str, Path]): .sof or .pof to program
+        cache_key (str): Or the key of a BitstreamCache entry, see resolve_bitstream
+        cache_dir (Union[str, Path]): Directory of the BitstreamCache
+        mode (str): "JTAG" or "EPCS"/"AS" (default: JTAG for a .sof, AS for a .pof)
+        cable (str): Cable name, label or pattern, see match_cables
+        all_cables (bool): Program every matching cable at once
+
+    Returns:
+        list: Outcome and time of every cable, see ProgrammingResult
+    """
+    bitstream = resolve_bitstream(bitstream, cache_key, cache_dir, board_name)
+    return run_command_steps(program_bitstream_steps(quartus_dir, board_name, bitstream, mode, cable, all_cables))
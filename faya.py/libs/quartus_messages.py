@@ -0,0 +1,267 @@
+import re
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+INFO = 'Info'
+EXTRA_INFO = 'Extra Info'
+WARNING = 'Warning'
+CRITICAL_WARNING = 'Critical Warning'
+ERROR = 'Error'
+
+SEVERITIES = [ERROR, CRITICAL_WARNING, WARNING, INFO, EXTRA_INFO]
+
+# e.g. "Error (10161): Verilog HDL error at a.v(3): object "x" is not declared"
+#      "    Info (12023): Found entity 1: top"
+#      "Info: Quartus Prime Shell was successful. 0 errors, 0 warnings"
+# Messages are matched from the "\n" that precedes them rather than with
+# "^" and re.MULTILINE: the regex engine scans for a literal character much
+# faster than it tries a pattern at every position.
+_message_format = r'\n([ \t]*)({})(?: \((\d+)\))?: ([^\r\n]*)'
+_summary_pattern = re.compile(r'\b(\d+) errors?, (\d+) warnings?\b')
+
+# Keywords that contain another one: "Critical Warning" and "Extra Info"
+_containers = {WARNING: CRITICAL_WARNING, INFO: EXTRA_INFO}
+
+
+class QuartusMessage(NamedTuple):
+    """
+    A message printed by a Quartus tool.
+    """
+    severity: str
+    id: Optional[int]
+    text: str
+    line: int   # line number in the output, starting from 1
+    depth: int  # nesting level (sub-messages are indented)
+
+
+class QuartusMessages:
+    """
+    Messages of a Quartus run, indexed by severity and message ID.
+
+    Output is fed in blocks of complete lines, so a log can be parsed while
+    it is being produced. Only the severities in `keep` are searched line
+    by line and become records: the others are just counted, which bounds
+    time and memory on multi-hundred-MB fitter logs.
+    """
+
+    def __init__(self, keep: Iterable[str] = SEVERITIES):
+        """
+        Args:
+            keep (Iterable[str]): Severities whose records are stored
+        """
+        self.keep = frozenset(keep)
+        self.messages: List[QuartusMessage] = []
+        self.by_severity: Dict[str, List[QuartusMessage]] = defaultdict(list)
+        self.by_id: Dict[int, List[QuartusMessage]] = defaultdict(list)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.summary_errors = 0
+        self.summary_warnings = 0
+        self.line_count = 0
+
+        kept = [severity for severity in SEVERITIES if severity in self.keep]
+        self._kept_pattern = re.compile(_message_format.format('|'.join(kept))) if kept else None
+
+    def feed_text(self, text: str):
+        """
+        Parse a block of output made of complete lines.
+
+        Severities not in `keep` are counted by occurrence of the keyword,
+        without checking that it begins a line.
+        """
+        if not text:
+            return
+
+        if self._kept_pattern is not None:
+            # The leading newline makes the first line match like the others
+            text = '\n' + text
+            line = self.line_count
+            last = 0
+            for match in self._kept_pattern.finditer(text):
+                line += text.count('\n', last, match.start() + 1)
+                last = match.start() + 1
+
+                indent, severity, message_id, message_text = match.groups()
+                message = QuartusMessage(severity, int(message_id) if message_id else None, message_text,
+                                         line, len(indent.expandtabs(4)) // 4)
+                self.counts[severity] += 1
+                self.messages.append(message)
+                self.by_severity[severity].append(message)
+                if message.id is not None:
+                    self.by_id[message.id].append(message)
+            text = text[1:]
+
+        for severity in SEVERITIES:
+            if severity not in self.keep:
+                count = text.count(severity + ' (') + text.count(severity + ':')
+                container = _containers.get(severity)
+                if container:
+                    count -= text.count(container + ' (') + text.count(container + ':')
+                self.counts[severity] += count
+
+        # "... was successful. 0 errors, 2 warnings" closes every tool run
+        if ' error' in text:
+            for summary in _summary_pattern.finditer(text):
+                self.summary_errors += int(summary.group(1))
+                self.summary_warnings += int(summary.group(2))
+
+        self.line_count += text.count('\n') + (0 if text.endswith('\n') else 1)
+
+    def feed(self, line: str):
+        """
+        Parse one line of output.
+        """
+        self.feed_text(line.rstrip('\r\n') + '\n')
+
+    def feed_lines(self, lines: Iterable[str], block_size: int = 4096) -> 'QuartusMessages':
+        block = []
+        for line in lines:
+            block.append(line.rstrip('\r\n'))
+            if len(block) == block_size:
+                self.feed_text('\n'.join(block) + '\n')
+                block = []
+        self.feed_text('\n'.join(block) + '\n' if block else '')
+        return self
+
+    def parse_chunks(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Pipeline stage: parse blocks of complete lines while passing them through.
+        """
+        for chunk in chunks:
+            self.feed_text(chunk)
+            yield chunk
+
+    @property
+    def errors(self) -> List[QuartusMessage]:
+        return self.by_severity[ERROR]
+
+    @property
+    def critical_warnings(self) -> List[QuartusMessage]:
+        return self.by_severity[CRITICAL_WARNING]
+
+    @property
+    def warnings(self) -> List[QuartusMessage]:
+        return self.by_severity[WARNING]
+
+    @property
+    def has_errors(self) -> bool:
+        """
+        True if an error message was printed or a summary reported errors.
+        """
+        return self.counts[ERROR] > 0 or self.summary_errors > 0
+
+    def query(self, severity: Optional[str] = None, message_id: Optional[int] = None,
+              contains: Optional[str] = None) -> List[QuartusMessage]:
+        """
+        Stored messages matching all the given filters.
+
+        Args:
+            severity (str): e.g. ERROR or WARNING
+            message_id (int): Quartus message ID, e.g. 332012
+            contains (str): Substring of the message text
+        """
+        if message_id is not None:
+            messages = self.by_id.get(message_id, [])
+        elif severity is not None:
+            messages = self.by_severity.get(severity, [])
+        else:
+            messages = self.messages
+
+        return [message for message in messages
+                if (severity is None or message.severity == severity)
+                and (contains is None or contains in message.text)]
+
+    def summary(self) -> str:
+        return ", ".join(f"{self.counts[severity]} {severity.lower()}" for severity in SEVERITIES
+                         if self.counts[severity])
+
+    def __repr__(self):
+        return f"<QuartusMessages {self.summary() or 'empty'}>"
+
+
+def parse_messages(output: str, keep: Iterable[str] = SEVERITIES) -> QuartusMessages:
+    """
+    Parse the whole output of a Quartus tool.
+    """
+    return QuartusMessages(keep).feed_lines(output.splitlines())
+
+
+class QuartusOutput(str):
+    """
+    Output of run_quartus: the text itself, plus the parsed `messages`.
+    """
+
+    def __new__(cls, text: str, messages: QuartusMessages):
+        output = super().__new__(cls, text)
+        output.messages = messages
+        return output
+
+
+def benchmark(size_mb: int = 200, chunk_size: int = 1 << 16):
+    """
+    Measure the parser throughput on a synthetic fitter log of about size_mb MB,
+    fed in chunks as run_quartus does while streaming.
+
+    Returns:
+        dict: lines, megabytes, seconds, lines_per_second, mb_per_second, messages
+    """
+    sample = "\n".join([
+        "Info (12021): Found 1 design units, including 1 entities, in source file DE0_NANO.v",
+        "    Info (12023): Found entity 1: DE0_NANO File: DE0_NANO.v Line: 1",
+        "Info (176233): Starting register packing",
+        "    Extra Info (176218): Packed 8 registers into blocks of type I/O Output Buffer",
+        "Info (170189): Fitter placement preparation operations beginning",
+        "Info (14951): The Fitter is using Advanced Physical Optimization.",
+        "    Info (170191): Fitter placement operations beginning",
+        "Info (332146): Worst-case setup slack is 14.209",
+        "    Info (332119):     Slack       End Point TNS Clock",
+        "    Info (332119): ========= =================== =====================",
+        "    Info (332119):    14.209               0.000 CLOCK_50",
+        "Warning (10230): Verilog HDL assignment warning at vjtag_interface.v(32): truncated value",
+        "Info (170194): Fitter routing operations ending: elapsed time is 00:00:01",
+        "; Fitter Status ; Successful - Sat Nov  2 12:33:49 2024 ;",
+        "Info (11888): Total time spent on timing analysis during the Fitter is 0.41 seconds.",
+        "Critical Warning (332012): Synopsys Design Constraints File file not found: 'DE0_NANO.sdc'",
+    ]) + "\n"
+    repeat = max(1, chunk_size // len(sample))
+    chunk = sample * repeat
+    chunks = max(1, size_mb * 1024 * 1024 // len(chunk))
+
+    messages = QuartusMessages(keep=(ERROR, CRITICAL_WARNING, WARNING))
+    start = time.perf_counter()
+    for _ in range(chunks):
+        messages.feed_text(chunk)
+    seconds = time.perf_counter() - start
+
+    megabytes = chunks * len(chunk) / (1024 * 1024)
+    return {
+        'lines': messages.line_count,
+        'megabytes': megabytes,
+        'seconds': seconds,
+        'lines_per_second': messages.line_count / seconds,
+        'mb_per_second': megabytes / seconds,
+        'messages': messages,
+    }
+
+
+def main():
+    if len(sys.argv) > 1:
+        # Parse a log file
+        with open(sys.argv[1], 'r', errors='replace') as file:
+            messages = QuartusMessages().feed_lines(file)
+        print(messages.summary())
+        for message in messages.errors + messages.critical_warnings:
+            print(f"  line {message.line}: {message.severity} ({message.id}): {message.text}")
+        return
+
+    size_mb = 200
+    print(f"Benchmark parser su un log sintetico di {size_mb} MB...")
+    result = benchmark(size_mb)
+    print(f"{result['lines']} righe, {result['megabytes']:.0f} MB in {result['seconds']:.2f}s: "
+          f"{result['lines_per_second'] / 1e6:.2f}M righe/s, {result['mb_per_second']:.0f} MB/s")
+    print(result['messages'])
+
+
+if __name__ == "__main__":
+    main()
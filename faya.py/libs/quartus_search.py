@@ -4,21 +4,54 @@ import subprocess
 from pathlib import Path
 import re
 
+from libs.ip_analysis import ANALYZED_SUFFIXES, IPAnalysisCache, analyze_content, analyze_files
+from libs.ip_index import QuartusFileIndex
+
+# Directory comuni degli IP, relative all'installazione di Quartus
+IP_SEARCH_DIRS = [
+    Path("libraries") / "megafunctions",
+    Path("ip") / "altera",
+    Path("ip") / "altera_mf",
+    Path("ip")
+]
+
+IP_FILE_SUFFIXES = ['.tdf', '.v', '.vhd', '.mif']
+
 class QuartusIPInfo:
-    def __init__(self, quartus_dir):
+    def __init__(self, quartus_dir, index_path=None):
         """
         Inizializza la ricerca degli IP di Quartus
 
         Args:
             quartus_dir (str): Percorso della directory di installazione di Quartus
+            index_path (str): File dell'indice dei file di Quartus (default: cache utente)
         """
         self.quartus_dir = Path(quartus_dir)
         self.quartus_bin = self.quartus_dir / "bin64"
         self.ip_dir = self.quartus_dir / "ip"
+        self.index_path = index_path
+        self._index = None
+        self._analysis_cache = None
 
         if not self.quartus_dir.exists():
             raise FileNotFoundError(f"Directory Quartus non trovata: {self.quartus_dir}")
 
+    @property
+    def index(self):
+        """
+        Indice dei file dell'installazione, creato alla prima ricerca
+        (vedi QuartusFileIndex)
+        """
+        if self._index is None:
+            self._index = QuartusFileIndex(self.quartus_dir, self.index_path)
+        return self._index
+
+    def refresh_index(self):
+        """
+        Aggiorna l'indice rileggendo solo le directory modificate
+        """
+        return self.index.refresh()
+
     def run_command(self, command, args):
         """
         Esegue un comando Quartus e attende il suo completamento
@@ -42,31 +75,26 @@ class QuartusIPInfo:
         Returns:
             list: Lista di percorsi dei file .mif trovati
         """
-        mif_files = []
-        for root, dirs, files in os.walk(self.quartus_dir):
-            for file in files:
-                if file.endswith('.mif') or file.endswith('.tdf'):
-                    mif_files.append(os.path.join(root, file))
-        return mif_files
+        return [str(file) for file in self.index.find(suffixes=['.mif', '.tdf'])]
 
     def get_ip_files(self, ip_name):
-        # Cerca nelle directory comuni degli IP
-        ip_paths = [
-            self.quartus_dir / "libraries" / "megafunctions",
-            self.quartus_dir / "ip" / "altera",
-            self.quartus_dir / "ip" / "altera_mf",
-            self.quartus_dir / "ip"
-        ]
+        """
+        Cerca i file di un IP (per prefisso del nome) nelle directory comuni degli IP
+
+        Args:
+            ip_name (str): Nome (o prefisso) dell'IP
 
+        Returns:
+            list: Percorsi dei file trovati
+        """
         print(f"\nRicerca informazioni per IP: {ip_name}")
         found_files = []
 
-        for ip_path in ip_paths:
-            if ip_path.exists():
-                for file in ip_path.rglob("*"):
-                    if file.name.lower().startswith(ip_name.lower()):
-                        if file.suffix in ['.tdf', '.v', '.vhd', '.mif']:
-                            found_files.append(file)
+        for ip_path in IP_SEARCH_DIRS:
+            for file in self.index.find(ip_name, suffixes=IP_FILE_SUFFIXES, under=ip_path):
+                # ip/ contiene anche ip/altera: ogni file una sola volta
+                if file not in found_files:
+                    found_files.append(file)
 
         return found_files
 
@@ -83,16 +111,96 @@ class QuartusIPInfo:
             print(f"Nessun file trovato per l'IP {ip_name}")
             return None
 
+        analysis = self.analyze_files(found_files)
+
         print(f"\nFile trovati per {ip_name}:")
         for file in found_files:
             print(f"\nAnalisi file: {file}")
-            try:
-                with open(file, 'r') as f:
-                    content = f.read()
-                    # Cerca parametri e porte
-                    self.analyze_file_content(content, file.suffix)
-            except Exception as e:
-                print(f"Errore nella lettura del file {file}: {e}")
+            result = analysis.get(str(file))
+            if result is None:
+                continue
+            if result['error']:
+                print(f"Errore nella lettura del file {file}: {result['error']}")
+                continue
+            # Parametri e porte
+            self.print_analysis(result, file.suffix)
+
+    @property
+    def analysis_cache(self):
+        """
+        Cache su disco delle analisi dei file (vedi IPAnalysisCache)
+        """
+        if self._analysis_cache is None:
+            self._analysis_cache = IPAnalysisCache()
+        return self._analysis_cache
+
+    def analyze_files(self, files, workers=None):
+        """
+        Analizza piu' file in parallelo, riusando i risultati dei file non modificati
+
+        Args:
+            files (list): Percorsi dei file
+            workers (int): Numero di processi (default: numero di CPU)
+
+        Returns:
+            dict: {percorso: analisi}, vedi analyze_file
+        """
+        files = [file for file in files if Path(file).suffix.lower() in ANALYZED_SUFFIXES]
+        return analyze_files(files, cache=self.analysis_cache, workers=workers)
+
+    def describe_ips(self, ip_names, workers=None):
+        """
+        Parametri e porte di piu' IP, analizzando tutti i file in un'unica passata
+
+        Args:
+            ip_names (list): Nomi (o prefissi) degli IP
+            workers (int): Numero di processi (default: numero di CPU)
+
+        Returns:
+            dict: {nome IP: [analisi dei suoi file]}, con 'parameters' e 'ports' per file
+        """
+        files = {ip_name: self.get_ip_files(ip_name) for ip_name in ip_names}
+        analysis = self.analyze_files([file for ip_files in files.values() for file in ip_files], workers)
+        return {ip_name: [analysis[str(file)] for file in ip_files if str(file) in analysis]
+                for ip_name, ip_files in files.items()}
+
+    def describe_ip(self, ip_name):
+        """
+        Parametri e porte di un IP, vedi describe_ips
+        """
+        return self.describe_ips([ip_name])[ip_name]
+
+    def build_catalog(self, workers=None):
+        """
+        Catalogo di tutte le megafunction dell'installazione
+
+        Returns:
+            dict: {nome megafunction: [analisi dei suoi file]}
+        """
+        files = self.index.find(suffixes=ANALYZED_SUFFIXES, under=IP_SEARCH_DIRS[0])
+        analysis = self.analyze_files(files, workers)
+
+        catalog = {}
+        for file in files:
+            if str(file) in analysis:
+                catalog.setdefault(file.stem.lower(), []).append(analysis[str(file)])
+        return catalog
+
+    def print_analysis(self, result, file_type):
+        """
+        Stampa parametri e porte trovati in un file
+        """
+        print("\nParametri trovati:")
+        separator = ':' if file_type == '.vhd' else '='
+        for parameter in result['parameters']:
+            print(f"  {parameter['name']} {separator} {parameter['value']}")
+
+        print("\nPorte trovate:")
+        for port in result['ports']:
+            if port['type'] and file_type == '.vhd':
+                print(f"  {port['direction']} {port['name']} : {port['type']}")
+            else:
+                print(f"  {port['direction']} {port['name']}")
 
     def analyze_file_content(self, content, file_type):
         """
@@ -101,58 +209,32 @@ class QuartusIPInfo:
         Args:
             content (str): Contenuto del file
             file_type (str): Tipo di file (.v, .tdf, etc.)
+
+        Returns:
+            dict: Parametri e porte, vedi analyze_content
         """
-        if file_type == '.v':
-            self.analyze_verilog(content)
-        elif file_type == '.tdf':
-            self.analyze_tdf(content)
-        elif file_type == '.vhd':
-            self.analyze_vhdl(content)
+        result = analyze_content(content, file_type)
+        if file_type in ANALYZED_SUFFIXES:
+            self.print_analysis(result, file_type)
+        return result
 
     def analyze_verilog(self, content):
         """
         Analizza un file Verilog per estrarre parametri e porte
         """
-        print("\nParametri trovati:")
-        # Cerca definizioni di parametri
-        import re
-        param_pattern = r'parameter\s+(\w+)\s*=\s*([^;]+);'
-        for match in re.finditer(param_pattern, content):
-            print(f"  {match.group(1)} = {match.group(2)}")
-
-        print("\nPorte trovate:")
-        # Cerca definizioni di porte
-        port_pattern = r'\b(input|output|inout)\s+(?:reg|wire)?\s*(?:\[[^\]]+\])?\s*(\w+)'
-        for match in re.finditer(port_pattern, content):
-            print(f"  {match.group(1)} {match.group(2)}")
+        return self.analyze_file_content(content, '.v')
 
     def analyze_tdf(self, content):
         """
         Analizza un file TDF per estrarre parametri e porte
         """
-        print("\nParametri trovati:")
-        param_pattern = r'PARAMETER\s*\("([^"]+)"\s*,\s*([^)]+)\)'
-        for match in re.finditer(param_pattern, content, re.IGNORECASE):
-            print(f"  {match.group(1)} = {match.group(2)}")
-
-        print("\nPorte trovate:")
-        port_pattern = r'\b(INPUT|OUTPUT|BIDIR)\s+(\w+)'
-        for match in re.finditer(port_pattern, content, re.IGNORECASE):
-            print(f"  {match.group(1).lower()} {match.group(2)}")
+        return self.analyze_file_content(content, '.tdf')
 
     def analyze_vhdl(self, content):
         """
         Analizza un file VHDL per estrarre parametri e porte
         """
-        print("\nParametri trovati:")
-        param_pattern = r'generic\s*\(\s*(\w+)\s*:\s*([^;]+);'
-        for match in re.finditer(param_pattern, content, re.IGNORECASE):
-            print(f"  {match.group(1)} : {match.group(2)}")
-
-        print("\nPorte trovate:")
-        port_pattern = r'\b(in|out|inout)\s+(\w+\s*:\s*[^;]+);'
-        for match in re.finditer(port_pattern, content, re.IGNORECASE):
-            print(f"  {match.group(1)} {match.group(2)}")
+        return self.analyze_file_content(content, '.vhd')
 
 
 def main():
@@ -0,0 +1,276 @@
+import queue
+import subprocess
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional, Union
+
+from libs.execution import QuartusError, split_command
+from libs.tcl_batch import tcl_quote
+
+BEGIN = "__FAYA_BEGIN__"
+RESULT = "__FAYA_RESULT__"
+END = "__FAYA_END__"
+
+# Defined in every shell at startup. `exit` is replaced by an error, so the
+# helper scripts in quartus_tcls/ can be sourced without killing the shell.
+_prelude = "; ".join([
+    'if {[info commands __faya_exit] eq ""} {catch {rename exit __faya_exit}}',
+    'proc exit {{code 0}} {if {$code != 0} {error "exit $code"}; return -code return}',
+    'proc __faya_request {id script} {'
+    f'puts "{BEGIN} $id"; '
+    'set rc [catch {uplevel #0 $script} result]; '
+    f'puts "{RESULT} $id"; puts $result; '
+    f'puts "{END} $id $rc"; flush stdout'
+    '}'
+])
+
+
+def get_fake_shell_command() -> List[str]:
+    """
+    Command line of the local quartus_sh stand-in (tools/fake_quartus_sh.py),
+    usable when Quartus is not installed.
+    """
+    import sys
+    fake = Path(__file__).resolve().parent.parent / "tools" / "fake_quartus_sh.py"
+    return [sys.executable, str(fake), "-s"]
+
+
+def command_to_tcl(command: list) -> Optional[str]:
+    """
+    Translate a quartus_sh command line, as passed to run_quartus, into the
+    Tcl that a persistent shell has to evaluate.
+
+    Args:
+        command (list): quartus_sh command and arguments
+
+    Returns:
+        str: Tcl script, None if the command cannot run in a shell
+    """
+    tokens = split_command(command)
+    if len(tokens) < 2 or Path(tokens[0]).stem != 'quartus_sh':
+        return None
+
+    if tokens[1] == '--tcl_eval':
+        return ' '.join(tokens[2:])
+
+    if tokens[1] == '-t' and len(tokens) > 2:
+        args = ' '.join(tcl_quote(arg) for arg in tokens[3:])
+        return "; ".join([
+            f'set argv [list {args}]',
+            f'set argc {len(tokens) - 3}',
+            f'set argv0 {tcl_quote(tokens[2])}',
+            f'source {tcl_quote(tokens[2])}'
+        ])
+
+    return None
+
+
+class QuartusShell:
+    """
+    A long-lived `quartus_sh -s` process driven over stdin/stdout.
+
+    Every request is wrapped in a catch block and its reply is delimited by
+    sentinel lines, so output, result and return code of each command can be
+    told apart without restarting Quartus.
+    """
+
+    def __init__(self, command: List[str], working_dir: Optional[str] = None, timeout: float = 300):
+        """
+        Args:
+            command (list): Command line of the shell, e.g. ['quartus_sh', '-s']
+            working_dir (str): Initial working directory of the shell
+            timeout (float): Default timeout in seconds of each request
+        """
+        self.command = command
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            cwd=working_dir
+        )
+
+        # A reader thread keeps the pipe drained and allows timeouts on reads
+        self.lines = queue.Queue()
+        self.reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self.reader.start()
+
+        self._send(_prelude)
+        self.eval("info patchlevel")
+
+    def _read_stdout(self):
+        for line in self.process.stdout:
+            self.lines.put(line.rstrip('\n'))
+        self.lines.put(None)
+
+    def _send(self, line: str):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def _next_line(self, timeout: float) -> str:
+        try:
+            line = self.lines.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"quartus_sh did not answer within {timeout} seconds")
+        if line is None:
+            raise QuartusError(f"quartus_sh terminated with code {self.process.poll()}")
+        return line
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def eval(self, tcl: str, working_dir: Optional[str] = None, timeout: Optional[float] = None) -> str:
+        """
+        Evaluate Tcl in the shell.
+
+        Args:
+            tcl (str): Tcl script to evaluate
+            working_dir (str): Directory to `cd` into before evaluating
+            timeout (float): Timeout in seconds, default the one of the shell
+
+        Returns:
+            str: Output printed by the script followed by its result
+
+        Raises:
+            QuartusError: If the script raised a Tcl error
+            TimeoutError: If the shell does not reply in time
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        if working_dir is not None:
+            tcl = f'cd {tcl_quote(Path(working_dir).resolve().as_posix())}\n' + tcl
+
+        with self.lock:
+            request_id = self.next_id
+            self.next_id += 1
+
+            # Newlines are escaped, so the whole request is a single line
+            self._send(f'__faya_request {request_id} ' + tcl_quote(tcl).replace('\n', '\\n'))
+
+            # Anything before the begin marker (banner, prompts) is discarded
+            while not self._next_line(timeout).endswith(f"{BEGIN} {request_id}"):
+                pass
+
+            output = []
+            while True:
+                line = self._next_line(timeout)
+                if line.endswith(f"{RESULT} {request_id}"):
+                    break
+                output.append(line)
+
+            result = []
+            while True:
+                line = self._next_line(timeout)
+                if line.startswith(f"{END} {request_id} "):
+                    code = int(line.split()[-1])
+                    break
+                result.append(line)
+
+        output = "\n".join(output)
+        result = "\n".join(result)
+
+        if code != 0:
+            raise QuartusError(result, stdout=output, stderr=result)
+
+        return "\n".join(part for part in (output, result) if part)
+
+    def close(self, timeout: float = 10):
+        if not self.is_alive():
+            return
+        try:
+            self._send("__faya_exit")
+            self.process.stdin.close()
+            self.process.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+
+
+class QuartusShellPool:
+    """
+    A pool of N persistent quartus_sh shells.
+
+    It can be passed as `engine` to run_quartus (and to QuartusAutomation):
+    quartus_sh commands (`--tcl_eval` and `-t script`) are then evaluated
+    in an idle shell instead of starting a new Quartus process.
+    """
+
+    def __init__(self, size: int = 2, quartus_dir: Optional[Union[str, Path]] = None,
+                 command: Optional[List[str]] = None, timeout: float = 300):
+        """
+        Args:
+            size (int): Number of shells
+            quartus_dir (str): Quartus installation, used to find quartus_sh
+            command (list): Shell command line, overrides quartus_dir
+                            (e.g. get_fake_shell_command() for tests)
+            timeout (float): Default timeout in seconds of each request
+        """
+        if command is None:
+            if quartus_dir is None:
+                raise ValueError("Either quartus_dir or command must be specified")
+            from libs.this_platform import check_exe
+            command = [str(Path(quartus_dir) / "bin64" / check_exe("quartus_sh")), "-s"]
+
+        self.command = command
+        self.timeout = timeout
+        self.size = size
+        self.shells = []
+        self.idle = queue.Queue()
+
+        for _ in range(size):
+            shell = QuartusShell(command, timeout=timeout)
+            self.shells.append(shell)
+            self.idle.put(shell)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @contextmanager
+    def shell(self):
+        """
+        Check out an idle shell for a sequence of requests, e.g. keeping a project open.
+        """
+        shell = self.idle.get()
+        try:
+            if not shell.is_alive():
+                # Replace shells that crashed or were killed
+                self.shells.remove(shell)
+                shell = QuartusShell(self.command, timeout=self.timeout)
+                self.shells.append(shell)
+            yield shell
+        finally:
+            self.idle.put(shell)
+
+    def eval(self, tcl: str, working_dir: Optional[str] = None, timeout: Optional[float] = None) -> str:
+        with self.shell() as shell:
+            return shell.eval(tcl, working_dir=working_dir, timeout=timeout)
+
+    def run_command(self, command: list, working_dir: Optional[str] = None) -> Optional[str]:
+        """
+        Run a quartus_sh command line in the pool (used by run_quartus).
+
+        Returns:
+            str: Output of the command, None if it must run as a new process
+        """
+        tcl = command_to_tcl(command)
+        if tcl is None:
+            return None
+
+        output = self.eval(tcl, working_dir=working_dir)
+        print("Quartus output:", output)
+        return output
+
+    def close(self):
+        for shell in self.shells:
+            shell.close()
+        self.shells = []
@@ -0,0 +1,259 @@
+import json
+import os
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from libs.boards import BoardError, load_board
+from libs.build_trace import TRACE_JSONL_NAME, BuildTrace
+
+# Memory reserved for a job when it was never measured and the board does not declare `build_memory_mb`
+DEFAULT_JOB_MEMORY_MB = 4096
+
+# Headroom on the peak RSS measured by the last build of a job
+MEASURED_MEMORY_MARGIN = 1.25
+
+
+class BuildJob:
+    """
+    One cell of the build matrix: a project built for a board.
+    """
+
+    def __init__(self, board_name: str, project_name: str, verilog_files: List[str],
+                 memory_mb: int = DEFAULT_JOB_MEMORY_MB):
+        """
+        Args:
+            board_name (str): Board name, as in boards/<board_name>.yaml
+            project_name (str): Project name (and top level entity)
+            verilog_files (list): Verilog files of the project
+            memory_mb (int): Memory reserved for the job while it runs
+        """
+        self.board_name = board_name
+        self.project_name = project_name
+        self.verilog_files = verilog_files
+        self.memory_mb = memory_mb
+
+    @property
+    def name(self) -> str:
+        return f"{self.board_name}/{self.project_name}"
+
+
+def list_boards(boards_dir: str = 'boards') -> List[str]:
+    """
+    Names of all the boards defined in boards/*.yaml
+    """
+    return sorted(path.stem for path in Path(boards_dir).glob('*.yaml'))
+
+
+def measured_memory_mb(project_dir: str) -> Optional[int]:
+    """
+    Memory used by the last build of a project, from the peak RSS in its trace.
+
+    Only a build that ran the fitter is a measure: a cached build runs just
+    the project setup.
+
+    Returns:
+        int: Peak RSS in MB plus MEASURED_MEMORY_MARGIN, None if not measured
+    """
+    try:
+        with open(Path(project_dir) / TRACE_JSONL_NAME) as file:
+            lines = file.readlines()
+    except OSError:
+        return None
+
+    fitted = False
+    peak_mb = 0.0
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        fitted = fitted or str(record.get('name', '')).startswith('quartus_fit')
+        # The tree when psutil sampled it, otherwise its largest process (wait4)
+        peak_mb = max(peak_mb, record.get('peak_rss_mb') or record.get('max_process_rss_mb') or 0.0)
+
+    if not fitted or not peak_mb:
+        return None
+    return int(peak_mb * MEASURED_MEMORY_MARGIN)
+
+
+def run_build_job(quartus_dir: str, job: BuildJob, projects_root: str, options: Dict) -> Dict:
+    """
+    Build a single job; runs in a worker process.
+
+    The project is created in <projects_root>/<board>/<project>, so jobs never
+    share files, and the output of Quartus goes to <project>.log next to it.
+
+    Returns:
+        dict: Result of the job (status, time, error, log file)
+    """
+    projects_dir = os.path.join(projects_root, job.board_name)
+    os.makedirs(projects_dir, exist_ok=True)
+    log_file = os.path.join(projects_dir, job.project_name + '.log')
+
+    start = time.time()
+    result = {'job': job.name, 'board': job.board_name, 'project': job.project_name,
+              'status': 'ok', 'error': None, 'log': log_file, 'pid': os.getpid()}
+
+    with open(log_file, 'w') as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            # Imported here: main.py is the entry point of the single-board flow
+            from main import QuartusAutomation
+
+            automation = QuartusAutomation(quartus_dir, job.board_name, job.project_name,
+                                           projects_dir=projects_dir, profile=options.get('profile'))
+            with BuildTrace(automation.project_dir):
+                automation.create_project(job.verilog_files, batch=options.get('batch', True))
+                automation.compile_project(incremental=options.get('incremental', True))
+                if options.get('program'):
+                    automation.program_device()
+        except BaseException as e:
+            traceback.print_exc()
+            result['status'] = 'failed'
+            result['error'] = f"{type(e).__name__}: {e}"
+
+    result['time'] = time.time() - start
+    return result
+
+
+class BuildScheduler:
+    """
+    Runs a matrix of boards x projects in a process pool.
+
+    At most `jobs` builds run at the same time, and a build only starts when
+    the memory reserved by the running ones plus its own stays within
+    `max_ram_mb` (fitter runs are memory hungry). A job reserves the peak RSS
+    measured by its last build, or else the `build_memory_mb` of its board.
+    """
+
+    def __init__(self, quartus_dir: str, jobs: Optional[int] = None, max_ram_mb: Optional[int] = None,
+                 projects_root: str = './projects', on_progress: Callable[[str], None] = print, **options):
+        """
+        Args:
+            quartus_dir (str): Quartus installation directory
+            jobs (int): Maximum number of parallel builds (default: CPU count)
+            max_ram_mb (int): Cap on the total memory reserved by running builds
+            projects_root (str): Root of the per-board project directories
+            on_progress (callable): Receives a line for every started/finished job
+            **options: Passed to the builds (batch, incremental, program, profile)
+        """
+        self.quartus_dir = quartus_dir
+        self.jobs = jobs or os.cpu_count() or 1
+        self.max_ram_mb = max_ram_mb
+        self.projects_root = projects_root
+        self.on_progress = on_progress
+        self.options = options
+
+    def make_jobs(self, boards: List[str], projects: Dict[str, List[str]]) -> List[BuildJob]:
+        """
+        Expand boards x projects into jobs.
+
+        Args:
+            boards (list): Board names
+            projects (dict): {project name: [verilog files]}
+        """
+        jobs = []
+        for board_name in boards:
+            board_memory_mb = self.board_memory_mb(board_name)
+            for project_name, verilog_files in projects.items():
+                # Same project directory as run_build_job
+                project_dir = os.path.join(self.projects_root, board_name, project_name)
+                memory_mb = measured_memory_mb(project_dir) or board_memory_mb
+                jobs.append(BuildJob(board_name, project_name, verilog_files, memory_mb))
+        return jobs
+
+    @staticmethod
+    def board_memory_mb(board_name: str) -> int:
+        # Compiled board cache: no YAML parse once the board has been built
+        try:
+            return int(load_board(board_name).get('build_memory_mb', DEFAULT_JOB_MEMORY_MB))
+        except (BoardError, ValueError, TypeError):
+            return DEFAULT_JOB_MEMORY_MB
+
+    def can_start(self, job: BuildJob, reserved_mb: int, running: int) -> bool:
+        if running >= self.jobs:
+            return False
+        if self.max_ram_mb is None or running == 0:
+            # A job bigger than the cap still runs, alone
+            return True
+        return reserved_mb + job.memory_mb <= self.max_ram_mb
+
+    def run(self, jobs: List[BuildJob]) -> List[Dict]:
+        """
+        Run the jobs, streaming progress through on_progress.
+
+        Returns:
+            list: Results of the jobs, in the order they were given
+        """
+        pending = deque(jobs)
+        running = {}
+        results = {}
+        reserved_mb = 0
+        total = len(jobs)
+
+        with ProcessPoolExecutor(max_workers=min(self.jobs, total) or 1) as executor:
+            while pending or running:
+                while pending and self.can_start(pending[0], reserved_mb, len(running)):
+                    job = pending.popleft()
+                    future = executor.submit(run_build_job, self.quartus_dir, job, self.projects_root, self.options)
+                    running[future] = job
+                    reserved_mb += job.memory_mb
+                    self.on_progress(f"[start] {job.name}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    reserved_mb -= job.memory_mb
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # The worker process itself died
+                        result = {'job': job.name, 'board': job.board_name, 'project': job.project_name,
+                                  'status': 'failed', 'error': f"{type(e).__name__}: {e}", 'time': 0.0,
+                                  'log': None}
+                    results[id(job)] = result
+                    self.on_progress(f"[{len(results)}/{total}] {job.name}: {result['status']} "
+                                     f"({result['time']:.1f}s)")
+
+        return [results[id(job)] for job in jobs]
+
+
+def format_summary(results: List[Dict]) -> str:
+    """
+    Summary table of the results of a build matrix.
+    """
+    headers = ['board', 'project', 'status', 'time', 'error']
+    rows = [[result['board'], result['project'], result['status'], f"{result['time']:.1f}s",
+             result['error'] or ''] for result in results]
+    widths = [max(len(str(row[i])) for row in [headers] + rows) for i in range(len(headers))]
+
+    lines = ['  '.join(cell.ljust(width) for cell, width in zip(headers, widths)).rstrip(),
+             '  '.join('-' * width for width in widths)]
+    for row in rows:
+        lines.append('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    lines.append(f"\n{len(results) - failed} ok, {failed} failed")
+    return "\n".join(lines)
+
+
+def build_matrix(quartus_dir: str, boards: List[str], projects: Dict[str, List[str]], **kwargs) -> List[Dict]:
+    """
+    Build every project for every board in parallel, see BuildScheduler.
+
+    Returns:
+        list: Results of the builds
+
+    Raises:
+        ValueError: If program is requested for more than one job (they would all use the same cable)
+    """
+    scheduler = BuildScheduler(quartus_dir, **kwargs)
+    jobs = scheduler.make_jobs(boards, projects)
+    if scheduler.options.get('program') and len(jobs) > 1:
+        raise ValueError(f"program: {len(jobs)} jobs would be sent to the same cable, select a single board "
+                         f"and project")
+    return scheduler.run(jobs)
@@ -0,0 +1,346 @@
+import json
+import os
+import re
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from libs.hashing import StatHashCache
+from libs.paths import get_cache_dir
+from libs.verilog_ports import strip_comments
+
+# Bumped when the parser changes, so that cached results are recomputed
+SCANNER_VERSION = 2
+
+VERILOG_SUFFIXES = ['.v', '.sv']
+VHDL_SUFFIXES = ['.vhd', '.vhdl']
+SOURCE_SUFFIXES = VERILOG_SUFFIXES + VHDL_SUFFIXES
+# Only pulled in by `include, never added to the project as sources
+HEADER_SUFFIXES = ['.vh', '.svh']
+
+_string = re.compile(r'"(?:[^"\\\n]|\\.)*"')
+_verilog_module = re.compile(r'\b(?:module|macromodule|interface|package)\s+(?:automatic\s+|static\s+)?([A-Za-z_]\w*)')
+_verilog_end = re.compile(r'\b(?:endmodule|endinterface|endpackage)\b')
+# "type [#(...)] instance [range] (" once parameter overrides have been removed
+_verilog_instance = re.compile(r'\b([A-Za-z_]\w*)\s+([A-Za-z_]\w*)\s*(?:\[[^\]]*\]\s*)?\(')
+_parameter_override = re.compile(r'#\s*\(')
+_verilog_include = re.compile(r'`include\s+"([^"]+)"')
+# "import pkg::*;", "pkg::item"
+_verilog_package_reference = re.compile(r'\b([A-Za-z_]\w*)\s*::')
+# "type [.modport] name [range] ," e.g. interface ports, variables of a user type
+_verilog_type_reference = re.compile(
+    r'\b([A-Za-z_]\w*)(?:\s*\.\s*[A-Za-z_]\w*)?\s+(?:\[[^\]]*\]\s*)*[A-Za-z_]\w*\s*(?:\[[^\]]*\]\s*)*[,;)=]')
+_verilog_keywords = frozenset("""
+    always always_comb always_ff always_latch and assign assert assume automatic begin buf bufif0 bufif1 case casex
+    casez cmos const cover deassign default defparam disable do else end endcase endfunction endgenerate endtask
+    event export extern final for force foreach forever fork function generate genvar if iff import initial inout
+    input integer interface join localparam logic macromodule module nand negedge nmos nor not notif0 notif1 or
+    output package parameter pmos posedge primitive property pulldown pullup rcmos real realtime reg release
+    repeat return rnmos rpmos rtran rtranif0 rtranif1 sequence signed static supply0 supply1 task time tran
+    tranif0 tranif1 tri tri0 tri1 triand trior trireg unique unsigned var void wait wand while wire wor xnor xor
+    bit byte chandle class clocking endclass endclocking endinterface endpackage enum int longint modport packed
+    ref shortint shortreal string struct type typedef union virtual
+""".split())
+
+_vhdl_comment = re.compile(r'--[^\n]*')
+_vhdl_entity = re.compile(r'\bentity\s+(\w+)\s+is\b', re.IGNORECASE)
+_vhdl_entity_instance = re.compile(r':\s*entity\s+(?:\w+\.)?(\w+)', re.IGNORECASE)
+_vhdl_component_instance = re.compile(r':\s*(?:component\s+)?(\w+)\s+(?:generic|port)\s+map\b', re.IGNORECASE)
+_vhdl_package = re.compile(r'\bpackage\s+(?!body\b)(\w+)\s+is\b', re.IGNORECASE)
+_vhdl_package_body = re.compile(r'\bpackage\s+body\s+(\w+)\s+is\b', re.IGNORECASE)
+# "use work.pkg.all;", "use mylib.pkg.item;"
+_vhdl_use = re.compile(r'\buse\s+\w+\.(\w+)\b', re.IGNORECASE)
+
+
+def _remove_parameter_overrides(source: str) -> str:
+    # "#( ... )" may contain parentheses: removed with a balance count
+    parts = []
+    position = 0
+    while True:
+        start = source.find('#', position)
+        if start < 0:
+            break
+        match = _parameter_override.match(source, start)
+        if not match:
+            parts.append(source[position:start + 1])
+            position = start + 1
+            continue
+        depth = 0
+        end = match.end() - 1
+        while end < len(source):
+            if source[end] == '(':
+                depth += 1
+            elif source[end] == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+            end += 1
+        parts.append(source[position:start] + ' ')
+        position = end + 1
+    parts.append(source[position:])
+    return ''.join(parts)
+
+
+def _verilog_references(text: str) -> List[str]:
+    # Packages and types a piece of source may refer to; only the names some file defines are followed
+    names = _verilog_package_reference.findall(text) + _verilog_type_reference.findall(text)
+    return list(dict.fromkeys(name for name in names if name not in _verilog_keywords))
+
+
+def parse_verilog(source: str) -> Dict:
+    """
+    Modules, interfaces and packages defined in a Verilog/SystemVerilog
+    source, with the modules they instantiate and the names they use
+    (imported packages, interface ports, user types).
+
+    Returns:
+        dict: {'modules': {module: [instantiated modules]}, 'uses': {module: [names]},
+               'bodies': [], 'includes': [files]}
+    """
+    includes = _verilog_include.findall(source)
+    source = _string.sub('""', strip_comments(source))
+    source = _remove_parameter_overrides(source)
+
+    modules = {}
+    uses = {}
+    outside = []
+    position = 0
+    for match in _verilog_module.finditer(source):
+        if match.start() < position:
+            continue
+        end = _verilog_end.search(source, match.end())
+        body_end = end.start() if end else len(source)
+        body = source[match.end():body_end]
+        instances = []
+        for instance in _verilog_instance.finditer(body):
+            module = instance.group(1)
+            if module not in _verilog_keywords and instance.group(2) not in _verilog_keywords \
+                    and module not in instances:
+                instances.append(module)
+        modules[match.group(1)] = instances
+        uses[match.group(1)] = _verilog_references(body)
+        outside.append(source[position:match.start()])
+        position = end.end() if end else len(source)
+    outside.append(source[position:])
+
+    # Imports in the compilation unit scope apply to every module of the file
+    global_uses = _verilog_references(' '.join(outside))
+    for module in uses:
+        uses[module] = list(dict.fromkeys(uses[module] + global_uses))
+
+    return {'modules': modules, 'uses': uses, 'bodies': [], 'includes': includes}
+
+
+def parse_vhdl(source: str) -> Dict:
+    """
+    Entities and packages defined in a VHDL source, with the entities they
+    instantiate and the packages they use (names in lower case).
+
+    Returns:
+        dict: {'modules': {entity: [instantiated entities]}, 'uses': {entity or body: [packages]},
+               'bodies': [packages whose body is in the file], 'includes': []}
+    """
+    source = _vhdl_comment.sub(' ', source)
+    entities = [name.lower() for name in _vhdl_entity.findall(source) + _vhdl_package.findall(source)]
+    bodies = [name.lower() for name in _vhdl_package_body.findall(source)]
+    used = list(dict.fromkeys(name.lower() for name in _vhdl_use.findall(source)))
+
+    instances = []
+    for pattern in (_vhdl_entity_instance, _vhdl_component_instance):
+        for name in pattern.findall(source):
+            if name.lower() not in instances:
+                instances.append(name.lower())
+
+    # Architectures are not matched to their entity: every entity of the
+    # file depends on every instance and every package used in it
+    return {'modules': {entity: instances for entity in entities},
+            'uses': {name: [package for package in used if package != name] for name in entities + bodies},
+            'bodies': bodies, 'includes': []}
+
+
+def is_header_file(path: Union[str, Path]) -> bool:
+    return Path(path).suffix.lower() in HEADER_SUFFIXES
+
+
+def parse_source_file(path: Union[str, Path]) -> Dict:
+    suffix = Path(path).suffix.lower()
+    with open(path, 'r', errors='replace') as file:
+        source = file.read()
+    if suffix in VHDL_SUFFIXES:
+        return parse_vhdl(source)
+    return parse_verilog(source)
+
+
+class SourceScanner:
+    """
+    Finds the HDL sources a top-level entity needs.
+
+    Given files and directories, builds the dependency graph across
+    .v/.sv/.vhd files (instances, packages, interfaces) and keeps the files
+    reachable from the top level. Files given explicitly are always kept:
+    only the files found in directories are pruned.
+    Parsed headers are cached on disk by file hash, so only changed files
+    are parsed again.
+    """
+
+    def __init__(self, cache_path: Union[str, Path, None] = None):
+        """
+        Args:
+            cache_path (Union[str, Path]): JSON cache (default: user cache directory)
+        """
+        self.cache_path = Path(cache_path) if cache_path else get_cache_dir() / "sources.json"
+        self.data = {'version': SCANNER_VERSION, 'files': {}, 'parsed': {}}
+        try:
+            with open(self.cache_path, 'r') as file:
+                data = json.load(file)
+            if data.get('version') == SCANNER_VERSION:
+                self.data = data
+        except (OSError, ValueError):
+            pass
+        self.hashes = StatHashCache(self.data['files'])
+        self.unresolved: List[str] = []
+        self.unreachable: List[str] = []
+        self.dirty = False
+
+    def save(self):
+        if not self.dirty:
+            return
+        # Only the parse results of files still known are kept
+        live = {entry[2] for entry in self.data['files'].values()}
+        self.data['parsed'] = {key: value for key, value in self.data['parsed'].items() if key in live}
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.{uuid.uuid4().hex}.tmp")
+            with open(tmp_path, 'w') as file:
+                json.dump(self.data, file)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+        self.dirty = False
+
+    def parse(self, path: Union[str, Path]) -> Optional[Dict]:
+        """
+        Parsed module header of a file (see parse_verilog/parse_vhdl), None if unreadable.
+        """
+        key = os.path.abspath(path)
+        known = self.data['files'].get(key)
+        digest = self.hashes.hash_file(path)
+        if self.data['files'].get(key) != known:
+            self.dirty = True
+        if digest is None:
+            return None
+        parsed = self.data['parsed'].get(digest)
+        if parsed is None:
+            try:
+                parsed = parse_source_file(path)
+            except OSError:
+                return None
+            self.data['parsed'][digest] = parsed
+            self.dirty = True
+        return parsed
+
+    @staticmethod
+    def discover(paths: Iterable[Union[str, Path]]) -> List[str]:
+        """
+        Source files among the paths; directories are searched recursively.
+        """
+        files = []
+        for path in paths:
+            path = str(path)
+            if os.path.isdir(path):
+                for root, dirs, names in os.walk(path):
+                    dirs.sort()
+                    for name in sorted(names):
+                        if os.path.splitext(name)[1].lower() in SOURCE_SUFFIXES + HEADER_SUFFIXES:
+                            files.append(os.path.join(root, name))
+            else:
+                files.append(path)
+        return list(dict.fromkeys(files))
+
+    def resolve(self, top_entity: str, paths: Iterable[Union[str, Path]]) -> Optional[List[str]]:
+        """
+        Files reachable from the top-level entity, the top-level file first,
+        then in discovery order, plus the headers they `include.
+
+        Files given explicitly (not found in a directory) are kept even if
+        not reachable, and listed in self.unreachable. Instantiated modules
+        that no file defines (IP cores, megafunctions) are listed in
+        self.unresolved.
+
+        Returns:
+            list: Files to add to the project, None if no file defines the top level
+        """
+        files = self.discover(paths)
+        explicit = [str(path) for path in paths if not os.path.isdir(str(path))]
+        definitions = {}
+        bodies = {}
+        parsed_files = {}
+        for path in files:
+            if os.path.splitext(path)[1].lower() in HEADER_SUFFIXES:
+                continue
+            parsed = self.parse(path)
+            if parsed is None:
+                continue
+            parsed_files[path] = parsed
+            for module in parsed['modules']:
+                definitions.setdefault(module, path)
+                definitions.setdefault(module.lower(), path)
+            for package in parsed['bodies']:
+                bodies.setdefault(package, []).append(path)
+        self.save()
+
+        def defined(name):
+            return name in definitions or name.lower() in definitions
+
+        top_file = definitions.get(top_entity) or definitions.get(top_entity.lower())
+        if top_file is None:
+            return None
+
+        reachable = {top_file}
+        visited = set()
+        unresolved = []
+        pending = deque([top_entity])
+        while pending:
+            module = pending.popleft()
+            if module in visited:
+                continue
+            visited.add(module)
+            path = definitions.get(module) or definitions.get(module.lower())
+            if path is None:
+                unresolved.append(module)
+                continue
+            reachable.add(path)
+            parsed = parsed_files[path]
+            pending.extend(parsed['modules'].get(module, parsed['modules'].get(module.lower(), [])))
+            uses = parsed['uses'].get(module, parsed['uses'].get(module.lower(), []))
+            # Names not defined by any file are language types or library packages (ieee, std)
+            pending.extend(name for name in uses if defined(name))
+            # A VHDL package body may be in another file, with its own use clauses
+            for body_path in bodies.get(module.lower(), []):
+                reachable.add(body_path)
+                pending.extend(name for name in parsed_files[body_path]['uses'].get(module.lower(), [])
+                               if defined(name))
+        self.unresolved = unresolved
+
+        self.unreachable = [path for path in explicit if path in parsed_files and path not in reachable]
+        result = [top_file] + [path for path in files
+                               if (path in reachable or path in self.unreachable) and path != top_file]
+
+        # Headers included by the reachable files, looked up next to the including file
+        headers = []
+        for path in result:
+            for include in parsed_files[path]['includes']:
+                header = os.path.join(os.path.dirname(path), include)
+                if os.path.exists(header) and header not in headers:
+                    headers.append(header)
+        headers.extend(path for path in explicit if is_header_file(path) and path not in headers)
+        return result + headers
+
+
+def find_sources(top_entity: str, paths: Iterable[Union[str, Path]],
+                 cache_path: Union[str, Path, None] = None) -> Optional[List[str]]:
+    """
+    Files needed by a top-level entity, see SourceScanner.resolve.
+    """
+    return SourceScanner(cache_path).resolve(top_entity, paths)
@@ -0,0 +1,264 @@
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from libs.execution import run_command_steps, QuartusError
+
+# Markers printed by the generated script, one per step
+STEP_OK = "FAYA_STEP_OK"
+STEP_FAILED = "FAYA_STEP_FAILED"
+# Marker of the values printed by query steps, quartus_sh prints its own lines around them
+VALUE = "FAYA_VALUE"
+
+# Global assignment of each HDL file type (anything else is a VERILOG_FILE)
+SOURCE_FILE_ASSIGNMENTS = {'.sv': 'SYSTEMVERILOG_FILE', '.vhd': 'VHDL_FILE', '.vhdl': 'VHDL_FILE'}
+
+_step_pattern = re.compile(r'^(' + STEP_OK + '|' + STEP_FAILED + r') \{(.*?)\}(?: (.*))?$')
+_value_pattern = re.compile(r'^' + VALUE + r' \{(.*?)\} ?(.*)$')
+
+
+def tcl_quote(value) -> str:
+    """
+    Quote a value so that it is passed verbatim as a single Tcl word.
+
+    Args:
+        value: Value to quote (converted to string)
+
+    Returns:
+        str: Double quoted Tcl word with special characters escaped
+    """
+    value = str(value)
+    for char in ('\\', '"', '$', '[', ']', '{', '}'):
+        value = value.replace(char, '\\' + char)
+    return '"' + value + '"'
+
+
+class TclBatchError(RuntimeError):
+    """
+    Raised when one or more steps of a Tcl batch fail.
+    """
+    def __init__(self, failed: List[Tuple[str, str]], output: str = ''):
+        lines = [f"{name}: {message}" for name, message in failed]
+        super().__init__("Failed steps:\n  " + "\n  ".join(lines))
+        self.failed = failed
+        self.output = output
+
+
+class TclBatch:
+    """
+    Collects the setup steps of a Quartus project and renders them as a
+    single Tcl script, executed by one quartus_sh process.
+
+    The project is opened once at the beginning and the assignments are
+    exported once at the end. Every step runs inside its own catch block
+    and prints a marker, so failures are still reported step by step.
+    """
+
+    def __init__(self, project_name: str):
+        """
+        Args:
+            project_name (str): Name of the Quartus project (and revision)
+        """
+        self.project_name = project_name
+        self.steps = []  # [(name, tcl)]
+        self.output = ''  # output of the last run
+
+    def add_step(self, name: str, tcl: str):
+        """
+        Add a named step to the batch.
+
+        Args:
+            name (str): Name reported in case of success or failure
+            tcl (str): Tcl commands of the step
+        """
+        # Braces would break the quoting of the name in the script
+        name = name.replace('{', '(').replace('}', ')')
+        self.steps.append((name, tcl))
+        return self
+
+    def project_new(self, device_part: str, base_qsf: Optional[Union[str, Path]] = None):
+        """
+        Create (overwrite) the project, optionally replacing its .qsf with a base one.
+        """
+        name = tcl_quote(self.project_name)
+        self.add_step("project_new", f'project_new -overwrite -part {tcl_quote(device_part)} {name}')
+
+        if base_qsf is not None:
+            # The .qsf written by project_new is replaced, so the project must be reopened
+            qsf = tcl_quote(self.project_name + '.qsf')
+            self.add_step("copy_base_qsf", "\n".join([
+                'project_close',
+                f'file copy -force {tcl_quote(Path(base_qsf).as_posix())} {qsf}',
+                f'project_open {name}'
+            ]))
+        return self
+
+    def project_open(self):
+        return self.add_step("project_open", f'project_open {tcl_quote(self.project_name)}')
+
+    def add_verilog_file(self, verilog_file: str):
+        file = tcl_quote(verilog_file)
+        return self.add_step(f"add_verilog_file {verilog_file}", "\n".join([
+            f'if {{![file exists {file}]}} {{ error "Verilog file not found" }}',
+            f'set_global_assignment -name VERILOG_FILE {file}'
+        ]))
+
+    def add_source_file(self, source_file: str):
+        """
+        Add an HDL file with the assignment of its language (.sv, .vhd or Verilog).
+        """
+        assignment = SOURCE_FILE_ASSIGNMENTS.get(Path(source_file).suffix.lower())
+        if assignment is None:
+            return self.add_verilog_file(source_file)
+
+        file = tcl_quote(source_file)
+        return self.add_step(f"add_source_file {source_file}", "\n".join([
+            f'if {{![file exists {file}]}} {{ error "Source file not found" }}',
+            f'set_global_assignment -name {assignment} {file}'
+        ]))
+
+    def set_global_assignment(self, name: str, value):
+        return self.add_step(f"set_global_assignment {name}",
+                             f'set_global_assignment -name {name} {tcl_quote(value)}')
+
+    def get_global_assignment(self, name: str):
+        """
+        Print the value of a global assignment, see parse_values.
+        """
+        name = name.replace('{', '(').replace('}', ')')
+        return self.add_step(f"get_global_assignment {name}", "\n".join([
+            f'set value [get_global_assignment -name {tcl_quote(name)}]',
+            f'puts "{VALUE} {{{name}}} [string map {{"\\n" " "}} $value]"'
+        ]))
+
+    def source(self, script_path: Union[str, Path], name: Optional[str] = None):
+        """
+        Source a Tcl script in the open project, as a single step
+        (e.g. the generated pin assignments).
+        """
+        script = tcl_quote(Path(script_path).as_posix())
+        return self.add_step(name or f"source {Path(script_path).name}", "\n".join([
+            f'if {{![file exists {script}]}} {{ error "Tcl script not found" }}',
+            f'source {script}'
+        ]))
+
+    def set_top_level_entity(self, top_level_entity: str):
+        return self.add_step("set_top_level_entity",
+                             f'set_global_assignment -name TOP_LEVEL_ENTITY {tcl_quote(top_level_entity)}')
+
+    def export_and_close(self):
+        return self.add_step("export_assignments", "export_assignments\nproject_close")
+
+    def render(self) -> str:
+        """
+        Render the batch as a Tcl script for `quartus_sh -t`.
+
+        Returns:
+            str: Content of the Tcl script
+        """
+        lines = [
+            "# Generated by faya.py: project setup in a single quartus_sh session",
+            "",
+            "proc faya_step {name body} {",
+            "    if {[catch {uplevel #0 $body} error_msg]} {",
+            f'        puts "{STEP_FAILED} {{$name}} [string map {{"\\n" " "}} $error_msg]"',
+            "    } else {",
+            f'        puts "{STEP_OK} {{$name}}"',
+            "    }",
+            "}",
+            ""
+        ]
+
+        for name, tcl in self.steps:
+            lines.append(f"faya_step {{{name}}} {{")
+            for line in tcl.splitlines():
+                lines.append("    " + line)
+            lines.append("}")
+            lines.append("")
+
+        return "\n".join(lines)
+
+    def write(self, script_path: Union[str, Path]) -> Path:
+        script_path = Path(script_path)
+        with open(script_path, 'w') as file:
+            file.write(self.render())
+        return script_path
+
+    @staticmethod
+    def parse_output(output: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        Extract the step markers from the output of the script.
+
+        Returns:
+            tuple: (names of succeeded steps, [(name, message)] of failed steps)
+        """
+        succeeded = []
+        failed = []
+        for line in output.splitlines():
+            match = _step_pattern.match(line.strip())
+            if not match:
+                continue
+            if match.group(1) == STEP_OK:
+                succeeded.append(match.group(2))
+            else:
+                failed.append((match.group(2), match.group(3) or ''))
+        return succeeded, failed
+
+    @staticmethod
+    def parse_values(output: str) -> Dict[str, str]:
+        """
+        Values printed by the query steps (get_global_assignment), by name.
+        """
+        values = {}
+        for line in output.splitlines():
+            match = _value_pattern.match(line.strip())
+            if match:
+                values[match.group(1)] = match.group(2)
+        return values
+
+    def run(self, quartus_sh: str, working_dir: str, script_name: str = 'faya_setup.tcl', engine=None) -> List[str]:
+        """
+        Write the script in the working directory and run it with one quartus_sh process.
+
+        Args:
+            quartus_sh (str): Path of the quartus_sh executable
+            working_dir (str): Project directory
+            script_name (str): Name of the generated script
+            engine: Optional persistent shell engine, see run_quartus
+
+        Returns:
+            list: Names of the succeeded steps
+
+        Raises:
+            TclBatchError: If any step failed or did not run at all
+        """
+        return run_command_steps(self.run_steps(quartus_sh, working_dir, script_name, engine))
+
+    def run_steps(self, quartus_sh: str, working_dir: str, script_name: str = 'faya_setup.tcl', engine=None):
+        """
+        Steps of run, to be run within another flow (see run_command_steps).
+        """
+        self.write(os.path.join(working_dir, script_name))
+
+        try:
+            output = yield [str(quartus_sh), '-t', f'"{script_name}"'], {'working_dir': working_dir, 'engine': engine}
+        except QuartusError as e:
+            output = e.stdout
+        self.output = output
+
+        succeeded, failed = self.parse_output(output)
+
+        # Steps without a marker never ran (e.g. quartus_sh crashed)
+        reported = set(succeeded) | {name for name, _ in failed}
+        for name, _ in self.steps:
+            if name not in reported:
+                failed.append((name, "step not executed"))
+
+        for name, message in failed:
+            print(f"Step fallito: {name}: {message}")
+
+        if failed:
+            raise TclBatchError(failed, output)
+
+        return succeeded
@@ -0,0 +1,268 @@
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+from libs.execution import Parallel, StepResult
+from libs.tcl_batch import tcl_quote
+
+# Lines printed by the analysis script, one per clock domain and per clock
+STA_MARKER = "FAYA_STA"
+FMAX_MARKER = "FAYA_FMAX"
+
+ANALYSES = ('setup', 'hold', 'recovery', 'removal')
+
+# Summary written in the project directory after every analysis
+TIMING_REPORT_NAME = 'faya_timing.json'
+
+_sta_pattern = re.compile(r'^' + STA_MARKER + r' (\w+) (\{.*\}|\S+) (\S+) (\S+)')
+_fmax_pattern = re.compile(r'^' + FMAX_MARKER + r' (\{.*\}|\S+) (\S+)(?: (\S+))?')
+_number = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+class TimingCorner(NamedTuple):
+    """
+    An operating condition of the timing analysis.
+    """
+    model: str                         # 'slow' or 'fast'
+    temperature: Optional[int] = None  # °C, the worst case of the model if None
+    voltage: Optional[int] = None      # mV, the nominal core voltage if None
+
+    @property
+    def name(self) -> str:
+        """
+        e.g. "slow", "slow_1200mV_85C"
+        """
+        parts = [self.model]
+        if self.voltage is not None:
+            parts.append(f"{self.voltage}mV")
+        if self.temperature is not None:
+            parts.append(f"{self.temperature}C")
+        return '_'.join(parts)
+
+
+DEFAULT_CORNERS = (TimingCorner('slow'), TimingCorner('fast'))
+
+
+class ClockSlack(NamedTuple):
+    clock: str
+    analysis: str  # see ANALYSES
+    slack: float   # worst slack, ns
+    tns: float     # total negative slack, ns
+
+
+class ClockFmax(NamedTuple):
+    clock: str
+    fmax: Optional[float]             # MHz
+    restricted_fmax: Optional[float]  # MHz, limited by the device (minimum pulse width, ...)
+
+
+class CornerTiming(NamedTuple):
+    """
+    Results of the analysis of one corner.
+    """
+    corner: str
+    slacks: List[ClockSlack]
+    fmax: List[ClockFmax]
+    error: Optional[str] = None
+    wall_s: float = 0.0
+
+    def worst_slack(self, analysis: str = 'setup') -> Optional[float]:
+        slacks = [slack.slack for slack in self.slacks if slack.analysis == analysis]
+        return min(slacks) if slacks else None
+
+
+class TimingReport(NamedTuple):
+    """
+    Results of the timing analysis over all the corners.
+    """
+    corners: List[CornerTiming]
+
+    def worst_slack(self, analysis: str = 'setup') -> Optional[float]:
+        slacks = [slack for slack in (corner.worst_slack(analysis) for corner in self.corners) if slack is not None]
+        return min(slacks) if slacks else None
+
+    @property
+    def met(self) -> bool:
+        """
+        True if every corner was analyzed and no slack is negative.
+        """
+        return all(corner.error is None and all(slack.slack >= 0 for slack in corner.slacks)
+                   for corner in self.corners)
+
+    def fmax(self) -> Dict[str, float]:
+        """
+        Fmax of each clock, the lowest over the corners (restricted Fmax where known), in MHz.
+        """
+        result = {}
+        for corner in self.corners:
+            for clock in corner.fmax:
+                value = clock.restricted_fmax if clock.restricted_fmax is not None else clock.fmax
+                if value is not None:
+                    result[clock.clock] = min(value, result.get(clock.clock, value))
+        return result
+
+    def to_dict(self) -> Dict:
+        return {'corners': [dict(corner._asdict(),
+                                 slacks=[slack._asdict() for slack in corner.slacks],
+                                 fmax=[clock._asdict() for clock in corner.fmax])
+                            for corner in self.corners]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TimingReport':
+        return cls([CornerTiming(**dict(corner,
+                                        slacks=[ClockSlack(**slack) for slack in corner['slacks']],
+                                        fmax=[ClockFmax(**clock) for clock in corner['fmax']]))
+                    for corner in data['corners']])
+
+
+def sta_script(project_name: str, corner: TimingCorner) -> str:
+    """
+    Tcl script for quartus_sta analyzing one corner of a fitted project.
+
+    Nothing is written in the project database: the slack of every clock
+    domain and the Fmax of every clock are printed, see parse_sta_output.
+    """
+    name = tcl_quote(project_name)
+    netlist = f"create_timing_netlist -model {corner.model}"
+    if corner.temperature is not None:
+        netlist += f" -temperature {corner.temperature}"
+    if corner.voltage is not None:
+        netlist += f" -voltage {corner.voltage}"
+
+    return "\n".join([
+        f"# Generated by faya.py: timing analysis, {corner.name} corner",
+        f"project_open {name} -revision {name}",
+        netlist,
+        "read_sdc",
+        "update_timing_netlist",
+        f"foreach analysis {{{' '.join(ANALYSES)}}} {{",
+        "    if {[catch {get_clock_domain_info -$analysis} domains]} { continue }",
+        "    foreach domain $domains {",
+        f'        puts "{STA_MARKER} $analysis [list [lindex $domain 0]] [lindex $domain 1] [lindex $domain 2]"',
+        "    }",
+        "}",
+        "if {![catch {get_clock_fmax_info} clocks]} {",
+        "    foreach clock $clocks {",
+        f'        puts "{FMAX_MARKER} [list [lindex $clock 0]] [lindex $clock 1] [lindex $clock 2]"',
+        "    }",
+        "}",
+        "delete_timing_netlist",
+        "project_close",
+        ""
+    ])
+
+
+def _clock_name(word: str) -> str:
+    return word[1:-1] if word.startswith('{') and word.endswith('}') else word
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    match = _number.search(value or '')
+    return float(match.group(0)) if match else None
+
+
+def parse_sta_output(corner: str, output: str, wall_s: float = 0.0) -> CornerTiming:
+    """
+    Extract the slacks and the Fmax printed by a sta_script.
+    """
+    slacks = []
+    fmax = []
+    for line in output.splitlines():
+        line = line.strip()
+        match = _sta_pattern.match(line)
+        if match:
+            slack, tns = _to_float(match.group(3)), _to_float(match.group(4))
+            if slack is not None:
+                slacks.append(ClockSlack(_clock_name(match.group(2)), match.group(1), slack, tns or 0.0))
+            continue
+        match = _fmax_pattern.match(line)
+        if match:
+            fmax.append(ClockFmax(_clock_name(match.group(1)), _to_float(match.group(2)), _to_float(match.group(3))))
+    return CornerTiming(corner, slacks, fmax, wall_s=wall_s)
+
+
+def sta_requests(quartus_sta: Union[str, Path], project_name: str, working_dir: str,
+                 corners: Sequence[TimingCorner] = DEFAULT_CORNERS) -> Parallel:
+    """
+    One quartus_sta command per corner, to be run concurrently (see Parallel).
+
+    The analysis only reads the fitted netlist, so the corners can run
+    next to each other and next to the assembler.
+    """
+    requests = Parallel()
+    for corner in corners:
+        script_name = f"faya_sta_{corner.name}.tcl"
+        with open(os.path.join(working_dir, script_name), 'w') as file:
+            file.write(sta_script(project_name, corner))
+        requests.append(([str(quartus_sta), '-t', f'"{script_name}"'], {'working_dir': working_dir}))
+    return requests
+
+
+def timing_report(corners: Sequence[TimingCorner], results: Sequence[StepResult]) -> TimingReport:
+    """
+    Report of the results of sta_requests, in the same order as the corners.
+    """
+    timings = []
+    for corner, result in zip(corners, results):
+        if result.error is not None:
+            output = getattr(result.error, 'stdout', '') or ''
+            timing = parse_sta_output(corner.name, output, result.wall_s)._replace(error=str(result.error))
+        else:
+            timing = parse_sta_output(corner.name, result.output, result.wall_s)
+        timings.append(timing)
+    return TimingReport(timings)
+
+
+def timing_analysis_steps(quartus_sta: Union[str, Path], project_name: str, working_dir: str,
+                          corners: Sequence[TimingCorner] = DEFAULT_CORNERS):
+    """
+    Steps of the timing analysis of a fitted project, all corners at once
+    (see run_command_steps).
+
+    Returns:
+        TimingReport: Slack and Fmax of every corner
+    """
+    results = yield sta_requests(quartus_sta, project_name, working_dir, corners)
+    return timing_report(corners, results)
+
+
+def save_timing_report(path: Union[str, Path], report: TimingReport, key: Optional[str] = None):
+    with open(path, 'w') as file:
+        json.dump(dict(report.to_dict(), key=key), file, indent=1)
+
+
+def load_timing_report(path: Union[str, Path], key: Optional[str] = None) -> Optional[TimingReport]:
+    """
+    A saved report, None if missing or saved with another key.
+    """
+    try:
+        with open(path, 'r') as file:
+            data = json.load(file)
+        if key is not None and data.get('key') != key:
+            return None
+        return TimingReport.from_dict(data)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def format_timing_report(report: TimingReport) -> str:
+    """
+    Table with the worst setup and hold slack of every corner and the Fmax of every clock.
+    """
+    def ns(value):
+        return f"{value:>9.3f}" if value is not None else f"{'-':>9}"
+
+    lines = [f"{'corner':<24} {'setup':>9} {'hold':>9} {'wall':>9}"]
+    for corner in report.corners:
+        line = f"{corner.corner[:24]:<24} {ns(corner.worst_slack('setup'))} {ns(corner.worst_slack('hold'))} " \
+               f"{corner.wall_s:>8.2f}s"
+        if corner.error:
+            line += f"  FAILED: {corner.error.splitlines()[0]}"
+        lines.append(line)
+
+    for clock, fmax in sorted(report.fmax().items()):
+        lines.append(f"Fmax {clock}: {fmax:.2f} MHz")
+    lines.append("Timing met" if report.met else "Timing NOT met")
+    return "\n".join(lines)
@@ -0,0 +1,212 @@
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Union
+
+_comment = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+_module_header = r'\bmodule\s+{}\b'
+# A port declaration: direction, net type, signedness and range are all optional,
+# e.g. "input [1:0] KEY", "output reg signed [7:0] q", "b" (same as the previous one)
+_port_item = re.compile(r'^\s*(?:(input|output|inout)\b)?\s*(?:(?:wire|reg|logic|tri|var)\b)?\s*'
+                        r'(?:signed\b|unsigned\b)?\s*(\[[^\]]*\])?\s*(\w+)\s*(?:\[[^\]]*\])?\s*(?:=.*)?$',
+                        re.DOTALL)
+_body_declaration = re.compile(r'\b(input|output|inout)\b([^;]*);')
+_range = re.compile(r'\[\s*([^:\]]+?)\s*:\s*([^\]]+?)\s*\]')
+_parameter = re.compile(r'\bparameter\b(?:\s+(?:integer|int|signed))?(?:\s*\[[^\]]*\])?\s*(\w+)\s*=\s*([^,;)]+)')
+
+
+class Port(NamedTuple):
+    """
+    A port of a Verilog module.
+    """
+    direction: str          # input, output or inout
+    name: str
+    msb: Optional[int]      # None for scalar ports, or if the range cannot be evaluated
+    lsb: Optional[int]
+    vector: bool            # declared with a range
+
+    def signals(self) -> List[str]:
+        """
+        Names of the single bits as used in pin assignments, e.g. LED[0] ... LED[7]
+        """
+        if not self.vector:
+            return [self.name]
+        if self.msb is None:
+            return []
+        low, high = sorted((self.msb, self.lsb))
+        return [f"{self.name}[{i}]" for i in range(low, high + 1)]
+
+
+def strip_comments(source: str) -> str:
+    return _comment.sub(' ', source)
+
+
+def _evaluate(expression: str, parameters: Dict[str, int]) -> Optional[int]:
+    # Only integer arithmetic on numbers and known parameters, e.g. "WIDTH-1"
+    expression = re.sub(r'\w+', lambda m: str(parameters.get(m.group(0), m.group(0))), expression)
+    if not re.fullmatch(r'[\d\s+\-*/()]+', expression):
+        return None
+    try:
+        return int(eval(expression.replace('/', '//'), {'__builtins__': {}}))
+    except (SyntaxError, ZeroDivisionError, TypeError, ValueError):
+        return None
+
+
+def _parse_range(text: Optional[str], parameters: Dict[str, int]):
+    if not text:
+        return None, None, False
+    match = _range.search(text)
+    if not match:
+        return None, None, True
+    return _evaluate(match.group(1), parameters), _evaluate(match.group(2), parameters), True
+
+
+def _split_top_level(text: str, separator: str = ',') -> List[str]:
+    # Split on separators outside of brackets and parentheses
+    items, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+        elif char == separator and depth == 0:
+            items.append(text[start:i])
+            start = i + 1
+    items.append(text[start:])
+    return [item for item in items if item.strip()]
+
+
+def _matching_paren(text: str, start: int) -> int:
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == '(':
+            depth += 1
+        elif text[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def find_module_ports(source: str, module: Optional[str] = None) -> Optional[List[Port]]:
+    """
+    Ports of a module, from its header (ANSI style) or from the declarations
+    that follow it (Verilog-1995 style).
+
+    Args:
+        source (str): Verilog source
+        module (str): Module name (the first module if None)
+
+    Returns:
+        list: Ports in declaration order, None if the module is not in the source
+    """
+    source = strip_comments(source)
+    header = re.search(_module_header.format(re.escape(module) if module else r'\w+'), source)
+    if header is None:
+        return None
+
+    position = header.end()
+    parameters = {}
+
+    # Optional parameter list: #(parameter WIDTH = 8, ...)
+    hash_match = re.match(r'\s*#\s*\(', source[position:])
+    if hash_match:
+        open_paren = position + hash_match.end() - 1
+        close_paren = _matching_paren(source, open_paren)
+        for name, value in _parameter.findall(source[open_paren:close_paren]):
+            value = _evaluate(value, parameters)
+            if value is not None:
+                parameters[name] = value
+        position = close_paren + 1
+
+    list_match = re.match(r'\s*\(', source[position:])
+    if not list_match:
+        return []
+    open_paren = position + list_match.end() - 1
+    close_paren = _matching_paren(source, open_paren)
+    if close_paren < 0:
+        return None
+
+    ports = []
+    names = []
+    direction, range_text = None, None
+    for item in _split_top_level(source[open_paren + 1:close_paren]):
+        match = _port_item.match(item)
+        if not match:
+            continue
+        if match.group(1):
+            # A new direction resets the range; otherwise both are inherited
+            direction, range_text = match.group(1), match.group(2)
+        elif match.group(2):
+            range_text = match.group(2)
+        names.append(match.group(3))
+        if direction:
+            msb, lsb, vector = _parse_range(range_text, parameters)
+            ports.append(Port(direction, match.group(3), msb, lsb, vector))
+
+    if len(ports) == len(names):
+        return ports
+
+    # Verilog-1995: the header only lists names, directions follow in the body
+    body_end = source.find('endmodule', close_paren)
+    body = source[close_paren:body_end if body_end >= 0 else len(source)]
+    for name, value in _parameter.findall(body):
+        value = _evaluate(value, parameters)
+        if value is not None:
+            parameters[name] = value
+
+    declared = {}
+    for direction, declaration in _body_declaration.findall(body):
+        range_match = re.match(r'\s*(?:(?:wire|reg|logic|tri)\b)?\s*(?:signed\b)?\s*(\[[^\]]*\])?(.*)$',
+                               declaration, re.DOTALL)
+        msb, lsb, vector = _parse_range(range_match.group(1), parameters)
+        for name in _split_top_level(range_match.group(2)):
+            name = name.strip().split('=')[0].strip()
+            declared[name] = Port(direction, name, msb, lsb, vector)
+        if all(name in declared for name in names):
+            break
+
+    return [declared[name] for name in names if name in declared]
+
+
+def scan_module_ports(verilog_files: Iterable[Union[str, Path]], module: str) -> Optional[List[Port]]:
+    """
+    Ports of a module defined in one of the files.
+
+    Files are only read until the module is found, and a file is only parsed
+    if its text declares the module.
+
+    Returns:
+        list: Ports, None if no file defines the module
+    """
+    pattern = re.compile(_module_header.format(re.escape(module)))
+    for verilog_file in verilog_files:
+        try:
+            with open(verilog_file, 'r', errors='replace') as file:
+                source = file.read()
+        except OSError:
+            continue
+        if pattern.search(source):
+            ports = find_module_ports(source, module)
+            if ports is not None:
+                return ports
+    return None
+
+
+def port_signal_filter(ports: Iterable[Port]):
+    """
+    Predicate telling whether a pin signal (e.g. "LED[3]") is driven by one of the ports.
+
+    Vector ports whose range could not be evaluated match any index.
+    """
+    exact: Set[str] = set()
+    any_index: Set[str] = set()
+    for port in ports:
+        if port.vector and port.msb is None:
+            any_index.add(port.name)
+        else:
+            exact.update(port.signals())
+
+    def matches(signal: str) -> bool:
+        return signal in exact or signal.split('[', 1)[0] in any_index
+
+    return matches
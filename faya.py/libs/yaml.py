@@ -2,9 +2,6 @@
 # pip install pyyaml
 
 import sys
-from ruamel.yaml import YAML, YAMLError  # Alternative to PyYAML
-# or if you prefer PyYAML:
-# import yaml as pyyaml  # Renaming to avoid confusion
 
 from typing import Dict, Any
 
@@ -23,20 +20,14 @@ def read_yaml_file(file_path: str) -> Dict[str, Any]:
         FileNotFoundError: If the file doesn't exist
         YAMLError: If the YAML is invalid
     """
+    # Imported here: ruamel is slow to import and boards are usually
+    # loaded from the compiled cache (see libs/boards.py)
+    from ruamel.yaml import YAML  # Alternative to PyYAML
+
     yaml = YAML(typ='safe')  # Create a YAML parser instance
 
-    try:
-        with open(file_path, 'r') as file:
-            return yaml.load(file)
-    except FileNotFoundError:
-        print(f"Error: File '{file_path}' not found.")
-        sys.exit(1)
-    except YAMLError as e:
-        print(f"Error parsing YAML file: {e}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        sys.exit(1)
+    with open(file_path, 'r') as file:
+        return yaml.load(file)
 
 
 def print_quartus_config(config: Dict[str, Any]) -> None:
@@ -73,6 +64,9 @@ def main():
     except KeyError as e:
         print(f"Error: Missing expected key in YAML file: {e}")
         sys.exit(1)
+    except Exception as e:
+        print(f"Error reading {yaml_file}: {e}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,32 +1,68 @@
+import asyncio
 import os.path
 
 from libs.yaml import *
 from libs.debug import *
 from libs.this_platform import *
 from libs.paths import *
+from libs.materialize import *
 from libs.qmegawiz import *
 from libs.execution import *
+from libs.async_execution import *
 from libs.quartus_search import *
+from libs.tcl_batch import *
+from libs.quartus_shell import *
+from libs.build_manifest import *
+from libs.bitstream_cache import *
+from libs.build_trace import *
+from libs.boards import *
+from libs.pin_assignments import *
+from libs.verilog_ports import *
+from libs.source_scanner import *
+from libs.programmer import *
+from libs.flash_images import *
+from libs.profiles import *
+from libs.timing import *
+from libs.flow_graph import *
+from libs.ip_cache import *
 
 # Global vars
 quartus_dir = None
 
 class QuartusAutomation:
-    def __init__(self, quartus_dir, board_name, project_name):
+    # Fasi della compilazione e relativo eseguibile
+    COMPILE_STAGES = {
+        'map': "quartus_map",  # Analysis & Synthesis
+        'fit': "quartus_fit",  # Fitter
+        'asm': "quartus_asm"   # Assembler
+    }
+
+    def __init__(self, quartus_dir, board_name, project_name, engine=None, projects_dir='./projects',
+                 prune_pins=True, profile=None):
         """
         Inizializza l'automazione di Quartus
 
         Args:
             quartus_dir (str): Percorso della directory di installazione di Quartus
             board_name (str): Nome del progetto/top level entity
+            engine (QuartusShellPool): Shell quartus_sh persistenti (opzionale)
+            projects_dir (str): Directory in cui creare i progetti
+            prune_pins (bool): Assegna solo i pin usati dalle porte della top level entity
+            profile (str): Profilo di compilazione (fast-iteration, max-fmax, ...), di default quello
+                           della variabile d'ambiente FAYA_PROFILE o del campo board.profile
         """
         self.quartus_dir = Path(quartus_dir)
+        self.engine = engine
+        self.prune_pins = prune_pins
 
         self.project_name = project_name
 
-        self.project_dir = './projects/' + self.project_name
+        self.project_dir = projects_dir + '/' + self.project_name
         create_directory(self.project_dir)
 
+        # Sorgenti e IP collegati nel progetto invece che copiati (vedi libs/materialize.py)
+        self.materializer = Materializer()
+
         self.quartus_bin = self.quartus_dir / "bin64"
 
         # Verifica che la directory di Quartus esista
@@ -34,15 +70,20 @@ class QuartusAutomation:
             raise FileNotFoundError(f"Directory Quartus non trovata: {self.quartus_dir}")
 
         # Get board infos
-        # Read the YAML file
-        device = read_yaml_file("boards/"+board_name+".yaml")
+        # Read the YAML file (compiled once, see libs/boards.py)
+        board_model = load_board(board_name)
 
         self.board_name = board_name
-        self.device = device
-        self.board = board = device['board']
-        self.device_code = board['name']
-        self.device_family = board["device_family"]
-        self.device_part = board["device"]
+        self.board_model = board_model
+        self.device = board_model.data
+        self.board = board_model.info
+        self.device_code = board_model.name
+        self.device_family = board_model.device_family
+        self.device_part = board_model.device
+
+        # Impostazioni di compilazione (processori, effort del fitter, partizioni, ...)
+        # Solo se richiesto: senza profilo restano le impostazioni di Quartus e della board
+        self.profile = board_model.profile(profile or os.environ.get('FAYA_PROFILE') or None)
 
         # Print the configuration
         #print_quartus_config(board)
@@ -51,6 +92,10 @@ class QuartusAutomation:
         return get_faya_path() / "boards" / self.board_name
 
     def create_virtual_jtag(self):
+        return run_command_steps(self.create_virtual_jtag_steps())
+
+    @traced_phase
+    def create_virtual_jtag_steps(self):
 
         '''
         tcls = str(get_faya_path()) + '/quartus_tcls'
@@ -65,38 +110,62 @@ class QuartusAutomation:
 
         ip_core = "Virtual_JTag"
 
-        core_dir = get_faya_path() / 'boards' / self.board_name / "cores" / ip_core
-        copy_files(str(core_dir), self.project_dir)
+        # Solo il sistema .qsys: i file generati arrivano dalla cache o da qsys-generate
+        cores_dir = get_faya_path() / 'boards' / self.board_name / "cores"
+        copy_files(ip_core + '.qsys', self.project_dir, source_dir=str(cores_dir), materializer=self.materializer)
 
         ip_path = ip_core+'.qsys'
-        if os.path.exists(ip_path):
-            #qsys-generate virtual_jtag_system.qsys --synthesis=VERILOG
-            cmd = [
-                check_exe(quartus_dir + '/sopc_builder/bin/qsys-generate'),
-                f'"{ip_path}" --synthesis=VERILOG'
-            ]
+        if os.path.exists(os.path.join(self.project_dir, ip_path)):
+            qsys_generate = check_exe(str(self.quartus_dir) + '/sopc_builder/bin/qsys-generate')
 
-            run_quartus(cmd, working_dir=self.project_dir)
+            # Il risultato dipende solo dal .qsys e dalla versione di Quartus: generato una sola volta
+            ip_cache = GeneratedIPCache()
+            key = ip_cache.key(os.path.join(self.project_dir, ip_path), qsys_generate)
 
-            #quartus_sh --flow compile nome_progetto
-            cmd = [
-                check_exe(str(self.quartus_bin / 'quartus_sh')),
-                f'--flow compile {self.project_name}'
-            ]
+            if ip_cache.restore(key, self.project_dir, self.materializer):
+                print(f"IP core ripristinato dalla cache ({key[:12]})")
+            else:
+                before = snapshot(self.project_dir)
 
-            run_quartus(cmd, working_dir=self.project_dir)
+                #qsys-generate virtual_jtag_system.qsys --synthesis=VERILOG
+                cmd = [
+                    qsys_generate,
+                    f'"{ip_path}" --synthesis=VERILOG'
+                ]
+
+                yield cmd, {'working_dir': self.project_dir}
+
+                ip_cache.store(key, self.project_dir, before, prefix=ip_core)
 
         print("IP Core added")
 
-    def create_project(self, verilog_files):
+    def create_project(self, verilog_files, batch=False, resolve_sources=True, ip=True):
         """
         Crea un nuovo progetto Quartus
 
         Args:
-            verilog_files ([str]): Percorso del file Verilog
+            verilog_files ([str]): Percorso dei file (o directory) dei sorgenti
             device (object): Board device infos
+            batch (bool): Esegue tutti i passi in un'unica sessione di quartus_sh
+            resolve_sources (bool): Aggiunge solo i file raggiungibili dalla top
+                                    level entity (vedi find_sources)
+            ip (bool): Genera anche l'IP core Virtual JTAG (vedi create_virtual_jtag)
+        """
+        return run_command_steps(self.create_project_steps(verilog_files, batch, resolve_sources, ip))
+
+    @traced_phase
+    def create_project_steps(self, verilog_files, batch=False, resolve_sources=True, ip=True):
+        """
+        Passi di create_project: generatore dei comandi Quartus, ognuno riceve
+        il proprio output (vedi run_command_steps)
         """
 
+        if resolve_sources:
+            verilog_files = self.find_sources(verilog_files)
+
+        if batch:
+            return (yield from self.create_project_batch_steps(verilog_files, ip))
+
         device = self.device
         board = self.board
 
@@ -108,31 +177,58 @@ class QuartusAutomation:
             "--tcl_eval",
             f'project_new -overwrite -part {self.device_part} {self.project_name}'
         ]
-        run_quartus(cmd, working_dir=self.project_dir)
+        yield cmd, {'working_dir': self.project_dir, 'engine': self.engine}
 
-        if board['copy_project']:
+        if board.get('copy_project'):
             board_path = self.get_board_path()
-            base_proj = board_path / "base.qsf"
+            base_proj = self.get_base_qsf(board_path / "base.qsf", verilog_files)
             copy_and_rename(base_proj, self.project_dir, self.project_name+".qsf")
+        elif self.board_model.pins or self.board_model.assignments:
+            # Assegnazioni dei pin generate dallo YAML della board, in un solo passo
+            batch = TclBatch(self.project_name).project_open()
+            batch.source(self.get_pin_assignments_file(verilog_files), "pin_assignments")
+            batch.export_and_close()
+            yield from batch.run_steps(quartus_sh, self.project_dir, script_name='faya_pins.tcl', engine=self.engine)
+
+        if self.profile is not None:
+            # Le impostazioni del profilo in un solo passo
+            print(f"Profilo di compilazione: {self.profile.name}")
+            batch = self.profile.apply(TclBatch(self.project_name).project_open())
+            batch.export_and_close()
+            yield from batch.run_steps(quartus_sh, self.project_dir, script_name='faya_profile.tcl', engine=self.engine)
 
         tcls = str(get_faya_path()) + '/quartus_tcls'
 
         # Aggiungi il file Verilog
         for verilog_file in verilog_files:
             # Copy to project directory
-            copy_file(verilog_file, self.project_dir)
+            copy_file(verilog_file, self.project_dir, self.materializer)
+
+            if is_header_file(verilog_file):
+                # Solo copiato, viene incluso dai sorgenti
+                continue
 
             verilog_file_name = get_filename_and_extension(verilog_file)
 
-            cmd = [
-                str(quartus_sh),
-                f'-t "{tcls}"/add_verilog_file.tcl',
-                f'"{self.project_name}" "{verilog_file_name}"'
-            ]
-            run_quartus(cmd, working_dir=self.project_dir)
+            # VHDL e SystemVerilog con la propria assegnazione, come TclBatch.add_source_file
+            assignment = SOURCE_FILE_ASSIGNMENTS.get(Path(verilog_file).suffix.lower())
+            if assignment is None:
+                cmd = [
+                    str(quartus_sh),
+                    f'-t "{tcls}"/add_verilog_file.tcl',
+                    f'"{self.project_name}" "{verilog_file_name}"'
+                ]
+            else:
+                cmd = [
+                    str(quartus_sh),
+                    f'-t "{tcls}/set_global_assignment.tcl"',
+                    f'"{self.project_name}" "{assignment}" "{verilog_file_name}"'
+                ]
+            yield cmd, {'working_dir': self.project_dir, 'engine': self.engine}
 
         # Create Virtual JTag
-        self.create_virtual_jtag()
+        if ip:
+            yield from self.create_virtual_jtag_steps()
 
         # Aggiungi il file SDC se specificato
         sdc_file = str(get_faya_path()) + '/boards/'+device['board']['name']+'/base.SDC'
@@ -143,7 +239,7 @@ class QuartusAutomation:
                 f'-t "{tcls}/set_global_assignment.tcl"',
                 f'"{self.project_name}" "SDC_FILE" "{sdc_file}"'
             ]
-            run_quartus(cmd, working_dir=self.project_dir)
+            yield cmd, {'working_dir': self.project_dir, 'engine': self.engine}
 
             # Abilita l'analisi temporale
             cmd = [
@@ -151,7 +247,7 @@ class QuartusAutomation:
                 f'-t "{tcls}/set_global_assignment.tcl"',
                 f'"{self.project_name}" "ENABLE_ADVANCED_IO_TIMING" "ON"'
             ]
-            run_quartus(cmd, working_dir=self.project_dir)
+            yield cmd, {'working_dir': self.project_dir, 'engine': self.engine}
 
         # Imposta il top level entity
         cmd = [
@@ -159,7 +255,200 @@ class QuartusAutomation:
             f'-t "{tcls}"/set_top_level_entity.tcl',
             f'"{self.project_name}" "{self.project_name}"'
         ]
-        run_quartus(cmd, working_dir=self.project_dir)
+        yield cmd, {'working_dir': self.project_dir, 'engine': self.engine}
+
+        print(f"File del progetto: {self.materializer.summary()}")
+
+    def setup_key(self, verilog_files, batch, manifest):
+        """
+        Chiave degli input della creazione del progetto: sorgenti, .qsf di base o
+        assegnazioni dei pin, SDC, profilo, dispositivo e versione di Quartus
+
+        Args:
+            verilog_files ([str]): Sorgenti gia' risolti (vedi find_sources)
+            batch (bool): Creazione in un'unica sessione di quartus_sh
+            manifest (BuildManifest): Manifest del progetto (hash dei file in cache)
+        """
+        files = list(verilog_files)
+        if self.board.get('copy_project'):
+            files.append(self.get_base_qsf(self.get_board_path() / "base.qsf", verilog_files))
+        elif self.board_model.pins or self.board_model.assignments:
+            files.append(self.get_pin_assignments_file(verilog_files))
+        if self.get_sdc_file():
+            files.append(self.get_sdc_file())
+
+        return hash_strings('setup', self.project_name, self.device_part, batch, repr(self.profile),
+                            manifest.files_hash(files), manifest.tool_version())
+
+    def setup_steps(self, verilog_files, batch=True, resolve_sources=True, incremental=True):
+        """
+        Passi della creazione del progetto nella build (vedi build_graph): con
+        incremental e' saltata se gli input non sono cambiati dall'ultima
+        creazione, senza avviare quartus_sh ne' riscrivere il .qsf
+        """
+        if not incremental:
+            return (yield from self.create_project_steps(verilog_files, batch, resolve_sources, ip=False))
+
+        if resolve_sources:
+            verilog_files = self.find_sources(verilog_files)
+
+        manifest = BuildManifest(self.project_dir, self.project_name, self.quartus_bin)
+        key = self.setup_key(verilog_files, batch, manifest)
+        if manifest.is_setup_up_to_date(key):
+            print("Progetto invariato, creazione saltata")
+            return
+
+        # Una creazione interrotta non deve risultare completa
+        manifest.invalidate_setup()
+        yield from self.create_project_steps(verilog_files, batch, resolve_sources=False, ip=False)
+        manifest.record_setup(key)
+
+    def find_sources(self, paths):
+        """
+        File dei sorgenti necessari alla top level entity, seguendo istanze,
+        package e interfacce tra file .v/.sv/.vhd (vedi SourceScanner).
+        Solo i file trovati nelle directory vengono scartati: quelli indicati
+        esplicitamente restano sempre nel progetto
+
+        Args:
+            paths ([str]): File o directory dei sorgenti
+
+        Returns:
+            list: File da aggiungere al progetto
+        """
+        scanner = SourceScanner()
+        files = scanner.resolve(self.project_name, paths)
+        if files is None:
+            print(f"Top level entity {self.project_name} non trovata nei sorgenti: aggiunti tutti i file")
+            return scanner.discover(paths)
+
+        if scanner.unresolved:
+            print(f"Moduli non definiti nei sorgenti (IP core/megafunction): {', '.join(scanner.unresolved)}")
+        for path in scanner.unreachable:
+            print(f"Attenzione: {path} non e' raggiungibile dalla top level entity {self.project_name}, "
+                  f"aggiunto comunque")
+        return files
+
+    def get_top_level_ports(self, verilog_files):
+        """
+        Porte della top level entity, lette dall'intestazione del modulo
+
+        Returns:
+            list: Porte (vedi Port), None se il modulo non e' nei file
+        """
+        return scan_module_ports(verilog_files, self.project_name)
+
+    def get_pin_filter(self, verilog_files):
+        """
+        Filtro dei pin della board usati dalla top level entity
+
+        Returns:
+            callable: Predicato sul nome del segnale, None per tenere tutti i pin
+        """
+        if not self.prune_pins or not verilog_files:
+            return None
+
+        ports = self.get_top_level_ports(verilog_files)
+        if not ports:
+            print(f"Porte di {self.project_name} non trovate: assegnati tutti i pin della board")
+            return None
+        return port_signal_filter(ports)
+
+    def get_pin_assignments_file(self, verilog_files=None):
+        """
+        Script Tcl con le assegnazioni dei pin della board, generato dallo YAML
+        (una sola volta per versione dello YAML, vedi pin_assignments_file).
+        Con prune_pins contiene solo i pin delle porte della top level entity.
+        """
+        keep = self.get_pin_filter(verilog_files)
+        signals = None if keep is None else [pin.signal for pin in self.board_model.pins if keep(pin.signal)]
+        return pin_assignments_file(self.board_model, signals)
+
+    def get_base_qsf(self, base_qsf, verilog_files=None):
+        """
+        .qsf di base della board; con prune_pins senza le assegnazioni dei pin
+        non usati dalla top level entity (vedi pruned_qsf_file)
+        """
+        keep = self.get_pin_filter(verilog_files)
+        if keep is None or not os.path.exists(base_qsf):
+            return base_qsf
+        return pruned_qsf_file(base_qsf, keep)
+
+    def get_sdc_file(self):
+        sdc_file = str(get_faya_path()) + '/boards/'+self.device['board']['name']+'/base.SDC'
+        return sdc_file if exists(sdc_file) else None
+
+    def create_project_batch(self, verilog_files, ip=True):
+        """
+        Crea il progetto generando un unico script Tcl: il progetto viene aperto
+        ed esportato una sola volta invece che ad ogni passo.
+
+        Args:
+            verilog_files ([str]): Percorso dei file Verilog
+
+        Raises:
+            TclBatchError: Se uno o piu' passi falliscono (riportati singolarmente)
+        """
+        return run_command_steps(self.create_project_batch_steps(verilog_files, ip))
+
+    @traced_phase
+    def create_project_batch_steps(self, verilog_files, ip=True):
+        quartus_sh = self.quartus_bin / check_exe("quartus_sh")
+
+        base_qsf = None
+        if self.board.get('copy_project'):
+            base_qsf = self.get_base_qsf(self.get_board_path() / "base.qsf", verilog_files)
+
+        batch = TclBatch(self.project_name)
+        batch.project_new(self.device_part, base_qsf)
+
+        if base_qsf is None and (self.board_model.pins or self.board_model.assignments):
+            # Assegnazioni dei pin generate dallo YAML della board
+            batch.source(self.get_pin_assignments_file(verilog_files), "pin_assignments")
+
+        for verilog_file in verilog_files:
+            # Copy to project directory
+            copy_file(verilog_file, self.project_dir, self.materializer)
+            if not is_header_file(verilog_file):
+                batch.add_source_file(get_filename_and_extension(verilog_file))
+
+        if self.profile is not None:
+            print(f"Profilo di compilazione: {self.profile.name}")
+            self.profile.apply(batch)
+
+        sdc_file = self.get_sdc_file()
+        if sdc_file:
+            print(f"Aggiunta file SDC: {sdc_file}")
+            batch.set_global_assignment("SDC_FILE", sdc_file)
+            # Abilita l'analisi temporale
+            batch.set_global_assignment("ENABLE_ADVANCED_IO_TIMING", "ON")
+
+        batch.set_top_level_entity(self.project_name)
+        batch.export_and_close()
+
+        yield from batch.run_steps(quartus_sh, self.project_dir, engine=self.engine)
+
+        # Create Virtual JTag
+        if ip:
+            yield from self.create_virtual_jtag_steps()
+
+        print(f"File del progetto: {self.materializer.summary()}")
+
+    def query_assignment(self, name):
+        """
+        Legge il valore di una global assignment del progetto
+
+        Args:
+            name (str): Nome dell'assignment (es. "TOP_LEVEL_ENTITY")
+        """
+        # Il valore arriva su una riga con marcatore: quartus_sh stampa le proprie righe dopo lo script
+        batch = TclBatch(self.project_name).project_open()
+        batch.get_global_assignment(name)
+        batch.add_step("project_close", "project_close")
+
+        quartus_sh = self.quartus_bin / check_exe("quartus_sh")
+        batch.run(quartus_sh, self.project_dir, script_name='faya_query.tcl', engine=self.engine)
+        return TclBatch.parse_values(batch.output).get(name, '')
 
     def set_quartus_settings(self, clock_freq, voltage=1.2):
         """
@@ -177,42 +466,16 @@ class QuartusAutomation:
             if not os.path.exists(project_path):
                 raise FileNotFoundError(f"Project file not found: {project_path}")
 
-            # Get project name without extension
-            project_name = self.project_name
-
-            # Create Tcl commands
-            tcl_commands = [
-                f'project_open {project_name}',
-                # Set core voltage to 3.2V
-                f'set_global_assignment -name CORE_VOLTAGE {voltage}V',
-                # Set clock frequency to 50MHz (convert to Hz)
-                f'set_global_assignment -name CLOCK_FREQUENCY {int(clock_freq * 1e6)}',
-                'export_assignments',
-                'project_close'
-            ]
-
-            # Join commands with semicolons
-            tcl_script = '; '.join(tcl_commands)
+            batch = TclBatch(self.project_name).project_open()
+            batch.set_global_assignment("CORE_VOLTAGE", f"{voltage}V")
+            # Clock frequency in Hz
+            batch.set_global_assignment("CLOCK_FREQUENCY", int(clock_freq * 1e6))
+            batch.export_and_close()
 
             quartus_sh = self.quartus_bin / check_exe("quartus_sh")
 
-            # Run quartus_sh with Tcl commands
-            cmd = [str(quartus_sh), '-t', 'tcl_script']
-            process = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-
-            # Send Tcl commands to quartus_sh
-            stdout, stderr = process.communicate(input=tcl_script)
-
-            if process.returncode != 0:
-                print(f"Error: quartus_sh returned code {process.returncode}")
-                print(f"stderr: {stderr}")
-                return False
+            # Run quartus_sh on the generated script (failed steps raise TclBatchError)
+            batch.run(quartus_sh, self.project_dir, script_name='faya_settings.tcl', engine=self.engine)
 
             print("Successfully updated Quartus project settings:")
             print(f"- Core Voltage: {voltage}V")
@@ -223,80 +486,291 @@ class QuartusAutomation:
             print(f"Error: {str(e)}")
             return False
 
-    def compile_project(self):
-        """
-        Compila il progetto usando quartus_map, quartus_fit e quartus_asm
-        """
-        print("Iniziando la compilazione...")
-
-        # Analysis & Synthesis
-        run_quartus([
-            str(self.quartus_bin / check_exe("quartus_map")),
+    def compile_command(self, tool):
+        return [
+            str(self.quartus_bin / check_exe(tool)),
             "--read_settings_files",
             "--write_settings_files=off",
             self.project_name,
             f"--rev={self.project_name}"
-        ], working_dir=self.project_dir)
+        ]
 
-        # Fitter
-        run_quartus([
-            str(self.quartus_bin / check_exe("quartus_fit")),
-            "--read_settings_files",
-            "--write_settings_files=off",
-            self.project_name,
-            f"--rev={self.project_name}"
-        ], working_dir=self.project_dir)
+    def compile_project(self, incremental=False, cache=None, timing=True, corners=DEFAULT_CORNERS):
+        """
+        Compila il progetto usando quartus_map, quartus_fit e quartus_asm;
+        l'analisi temporale (quartus_sta) gira insieme a quartus_asm
 
-        # Assembler
-        run_quartus([
-            str(self.quartus_bin / check_exe("quartus_asm")),
-            "--read_settings_files",
-            "--write_settings_files=off",
-            self.project_name,
-            f"--rev={self.project_name}"
-        ], working_dir=self.project_dir)
+        Args:
+            incremental (bool): Salta le fasi i cui input non sono cambiati
+                                dall'ultima compilazione (vedi BuildManifest)
+            cache (BitstreamCache): Cache dei bitstream; se contiene gia' il
+                                    risultato, Quartus non viene eseguito
+            timing (bool): Esegue l'analisi temporale
+            corners ([TimingCorner]): Condizioni operative analizzate, in parallelo
+
+        Returns:
+            TimingReport: Slack e Fmax di ogni corner (None senza analisi temporale,
+                          o se il bitstream arriva dalla cache)
+        """
+        return run_command_steps(self.compile_project_steps(incremental, cache, timing, corners))
 
-    def program_device(self, mode='jtag'):
+    @traced_phase
+    def compile_project_steps(self, incremental=False, cache=None, timing=True, corners=DEFAULT_CORNERS):
+        print("Iniziando la compilazione...")
+
+        state = self.prepare_compile(incremental, cache)
+        yield from self.compile_stage_steps('map', state)
+        yield from self.compile_stage_steps('fit', state)
+
+        report = None
+        if timing:
+            # quartus_sta legge solo il risultato del fitter: gira insieme a quartus_asm
+            _, report = yield from parallel_steps([self.compile_stage_steps('asm', state),
+                                                   self.timing_steps(state, corners)])
+        else:
+            yield from self.compile_stage_steps('asm', state)
+
+        if report is not None:
+            print("Analisi temporale:\n" + format_timing_report(report))
+        return report
+
+    def prepare_compile(self, incremental=False, cache=None):
+        """
+        Stato di una compilazione, condiviso dalle sue fasi (vedi compile_stage_steps)
+
+        Args:
+            incremental (bool): Salta le fasi i cui input non sono cambiati
+            cache (BitstreamCache): Cache dei bitstream
+
+        Returns:
+            dict: 'incremental', 'manifest' e 'input_hash' (vedi BuildManifest),
+                  'cache' e 'cache_key', 'restored' se il bitstream arriva dalla cache
+        """
+        state = {'incremental': incremental, 'manifest': None, 'input_hash': None,
+                 'cache': cache, 'cache_key': None, 'restored': False}
+
+        if incremental or cache is not None:
+            manifest = BuildManifest(self.project_dir, self.project_name, self.quartus_bin)
+            state['manifest'] = manifest
+            state['input_hash'] = manifest.input_hash()
+
+        if cache is not None:
+            hashes = manifest.input_hashes()
+            state['cache_key'] = cache.key(hash_strings(hashes['sources'], hashes['ip']), hashes['settings'],
+                                           self.device_part, hashes['tool'])
+            if cache.restore(state['cache_key'], self.project_dir, self.project_name):
+                print(f"Bitstream ripristinato dalla cache ({state['cache_key'][:12]})")
+                state['restored'] = True
+            else:
+                manifest.save()
+
+        return state
+
+    def compile_stage_steps(self, stage, state):
+        """
+        Passi di una fase della compilazione ('map', 'fit' o 'asm'); con
+        incremental la fase e' saltata se i suoi input non sono cambiati
+
+        Args:
+            stage (str): Fase, vedi QuartusAutomation.COMPILE_STAGES
+            state (dict): Stato della compilazione, vedi prepare_compile
+
+        Returns:
+            dict: state, per le fasi successive
+        """
+        if state['restored']:
+            return state
+
+        tool = self.COMPILE_STAGES[stage]
+        manifest = state['manifest']
+
+        run_stage = True
+        if state['incremental']:
+            key = manifest.stage_key(stage, state['input_hash'])
+            if manifest.is_up_to_date(stage, key):
+                print(f"{tool}: input invariati, fase saltata")
+                run_stage = False
+            else:
+                manifest.invalidate(stage)
+
+        if run_stage:
+            # Output streamed to a log file, the fitter output can be huge
+            yield self.compile_command(tool), {'working_dir': self.project_dir,
+                                               'log_file': self.project_dir + f'/{tool}.log',
+                                               'abort_on_error': True}
+            if state['incremental']:
+                manifest.record(stage, key)
+
+        if stage == 'asm' and state['cache'] is not None:
+            state['cache'].store(state['cache_key'], self.project_dir, self.project_name,
+                                 info={'project': self.project_name, 'board': self.board_name,
+                                       'part': self.device_part})
+        return state
+
+    def timing_steps(self, state, corners=DEFAULT_CORNERS):
+        """
+        Passi dell'analisi temporale di una compilazione; con incremental e'
+        saltata se il risultato del fitter non e' cambiato
+
+        Args:
+            state (dict): Stato della compilazione, vedi prepare_compile
+            corners ([TimingCorner]): Condizioni operative analizzate, in parallelo
+
+        Returns:
+            TimingReport: None se il bitstream arriva dalla cache
+        """
+        if state['restored']:
+            return None
+
+        report_path = os.path.join(self.project_dir, TIMING_REPORT_NAME)
+        sta_key = None
+        if state['incremental']:
+            sta_key = hash_strings('sta', state['manifest'].outputs_hash('fit'), *(c.name for c in corners))
+            report = load_timing_report(report_path, sta_key)
+            if report is not None:
+                print("quartus_sta: fit invariato, analisi temporale saltata")
+                return report
+
+        report = yield from timing_analysis_steps(self.quartus_bin / check_exe("quartus_sta"),
+                                                  self.project_name, self.project_dir, corners)
+        # Con un corner fallito il report non va riusato: la prossima compilazione ripete l'analisi
+        complete = all(corner.error is None for corner in report.corners)
+        save_timing_report(report_path, report, sta_key if complete else None)
+        return report
+
+    def timing_analysis(self, corners=DEFAULT_CORNERS):
+        """
+        Analisi temporale del progetto gia' compilato, tutti i corner in parallelo
+
+        Args:
+            corners ([TimingCorner]): Condizioni operative analizzate
+
+        Returns:
+            TimingReport: Slack e Fmax di ogni corner
+        """
+        return run_command_steps(self.timing_analysis_steps(corners))
+
+    @traced_phase
+    def timing_analysis_steps(self, corners=DEFAULT_CORNERS):
+        report = yield from timing_analysis_steps(self.quartus_bin / check_exe("quartus_sta"),
+                                                  self.project_name, self.project_dir, corners)
+        save_timing_report(os.path.join(self.project_dir, TIMING_REPORT_NAME), report)
+        print("Analisi temporale:\n" + format_timing_report(report))
+        return report
+
+    def list_cables(self, chains=False):
+        """
+        Cavi di programmazione collegati
+
+        Args:
+            chains (bool): Rileva anche i dispositivi della catena JTAG di ogni cavo
+
+        Returns:
+            list: Cavi (vedi Cable)
+        """
+        return run_command_steps(self.list_cables_steps(chains))
+
+    def list_cables_steps(self, chains=False):
+        return (yield from list_cables_steps(self.quartus_bin / check_exe("quartus_pgm"), self.project_dir, chains))
+
+    def program_device(self, mode='jtag', cable=DEFAULT_CABLE, all_cables=False):
         """
         Programma il dispositivo usando il programmatore USB-Blaster
 
         Args:
             mode (str): Modalità di programmazione ("JTAG" o "EPCS")
+            cable (str): Cavo da usare: nome, nome completo o pattern
+                         (es. "USB-Blaster", "USB-Blaster [1-1]", "USB-Blaster*")
+            all_cables (bool): Programma lo stesso file su tutti i cavi
+                               corrispondenti, in parallelo
+
+        Returns:
+            list: Esito e tempo di ogni cavo (vedi ProgrammingResult)
+
+        Raises:
+            ProgrammingError: Se la programmazione di uno o piu' cavi fallisce (con all_cables)
         """
+        return run_command_steps(self.program_device_steps(mode, cable, all_cables))
+
+    @traced_phase
+    def program_device_steps(self, mode='jtag', cable=DEFAULT_CABLE, all_cables=False):
         print("\nProgrammazione del dispositivo...")
 
         # Set project voltage
         #self.set_quartus_settings(50, 3.2) # seems useless
 
-        # Cerca il programmatore USB-Blaster
-        result = run_quartus([str(self.quartus_bin/"quartus_pgm"), "-l"], working_dir=self.project_dir)
+        # Cerca i programmatori collegati
+        cables = yield from self.select_cables_steps(cable, all_cables)
+
+        if mode.upper() == "EPCS":
+            yield from self.convert_pof_steps()
+
+        return (yield from self.program_file_steps(cables, mode, all_cables))
+
+    def select_cables_steps(self, cable=DEFAULT_CABLE, all_cables=False):
+        """
+        Passi della ricerca dei cavi da programmare
+
+        Returns:
+            list: Cavi corrispondenti a cable (solo il primo senza all_cables)
+        """
+        cables = match_cables((yield from self.list_cables_steps()), cable)
+
+        if not cables:
+            raise RuntimeError(f"{cable} non trovato. Assicurati che sia collegato e riconosciuto.")
+        if not all_cables:
+            cables = cables[:1]
+        return cables
+
+    def convert_pof_steps(self):
+        """
+        Passi della conversione del .sof in .pof per la programmazione EPCS
+
+        Returns:
+            str: Nome del file .pof
+        """
+        # Genera il file .pof dalla conversione del .sof
+        sof_file = f"{self.project_name}.sof"
+        pof_file = f"{self.project_name}.pof"
+
+        if not os.path.exists(self.project_dir + '/' + sof_file):
+            raise FileNotFoundError(f"File .sof non trovato: {sof_file}")
+
+        flash_device = self.board_model.flash_device
+        if not flash_device:
+            raise RuntimeError(f"flash_device non definito in boards/{self.board_name}.yaml")
 
-        if "USB-Blaster" not in result:
-            raise RuntimeError("USB-Blaster non trovato. Assicurati che sia collegato e riconosciuto.")
+        # La conversione dipende solo dal .sof e dalla memoria flash: fatta una sola volta
+        flash_cache = FlashImageCache()
+        quartus_cpf = self.quartus_bin / check_exe("quartus_cpf")
+        key = flash_cache.key(self.project_dir + '/' + sof_file, flash_device, quartus_cpf)
 
+        if flash_cache.restore(key, self.project_dir + '/' + pof_file):
+            print(f"File .pof ripristinato dalla cache ({key[:12]})")
+        else:
+            print("Conversione .sof in .pof per programmazione EPCS...")
+            yield cpf_command(quartus_cpf, sof_file, pof_file, flash_device), {'working_dir': self.project_dir}
+            flash_cache.store(key, self.project_dir + '/' + pof_file)
+
+        return pof_file
+
+    def program_file_steps(self, cables, mode='jtag', all_cables=False):
+        """
+        Passi della programmazione dei cavi trovati da select_cables_steps;
+        in modalita' EPCS il .pof deve essere gia' stato generato (vedi convert_pof_steps)
+
+        Returns:
+            list: Esito e tempo di ogni cavo (vedi ProgrammingResult)
+        """
         # Determina il file e le opzioni in base alla modalità
         if mode.upper() == "EPCS":
-            # Genera il file .pof dalla conversione del .sof
-            sof_file = f"{self.project_name}.sof"
             pof_file = f"{self.project_name}.pof"
+            if not os.path.exists(self.project_dir + '/' + pof_file):
+                raise FileNotFoundError(f"File .pof non trovato: {pof_file}")
 
-            if not os.path.exists(self.project_dir + '/' + sof_file):
-                raise FileNotFoundError(f"File .sof non trovato: {sof_file}")
-
-            print("Conversione .sof in .pof per programmazione EPCS...")
-            run_quartus([str(self.quartus_bin/"quartus_cpf"),
-                "-c",  # Modalità di conversione
-                sof_file,  # File di input
-                pof_file,  # File di output
-                f'-d "../../boards/{self.device_code}/device.qar"' #todo: set device file
-            ], working_dir=self.project_dir)
-
-            # Programma il dispositivo usando il file .pof
-            run_quartus([str(self.quartus_bin.parent / "qprogrammer" / "bin64" / "quartus_pgm"),
-                "-c", "USB-Blaster",
-                "-m", "AS",  # Active Serial programming
-                "-o", f"P;{pof_file}"  # Program operation
-            ], working_dir=self.project_dir)
+            # Programma il dispositivo usando il file .pof (Active Serial programming)
+            quartus_pgm = self.quartus_bin.parent / "qprogrammer" / "bin64" / "quartus_pgm"
+            pgm_mode, file_name = "AS", pof_file
 
         else:  # JTAG mode
             sof_file = f"{self.project_name}.sof"
@@ -305,21 +779,190 @@ class QuartusAutomation:
 
             # quartus_pgm = self.quartus_bin.parent.parent / "qprogrammer" / "bin64" / check_exe("quartus_pgm") # valid on Quartus Lite
             quartus_pgm = self.quartus_bin / check_exe("quartus_pgm")
+            pgm_mode, file_name = "JTAG", sof_file
 
-            run_quartus([str(quartus_pgm),
-                "-c", "USB-Blaster",
-                "-m", "JTAG",
-                "-o", f"P;{sof_file}",
-                "--program"
-            ], working_dir=self.project_dir)
+        # Un processo quartus_pgm per cavo, tutti insieme
+        report = yield from program_cables_steps(quartus_pgm, [selected.label for selected in cables],
+                                                 pgm_mode, file_name, self.project_dir, fan_out=all_cables)
 
         print("Programmazione completata con successo!")
+        return report
+
+    def build_graph(self, verilog_files, batch=True, resolve_sources=True, incremental=True, cache=None,
+                    timing=True, corners=DEFAULT_CORNERS, program=True, mode='jtag', cable=DEFAULT_CABLE,
+                    all_cables=False):
+        """
+        Grafo delle fasi di una build (vedi FlowGraph): ogni fase parte appena
+        esistono i suoi input, quelle indipendenti girano insieme
+
+            setup ── ip ── map ── fit ──┬── asm ──┬── cpf ──┐
+                                        └── sta   │         ├── pgm
+            cables ───────────────────────────────┴─────────┘
+
+        L'IP core e' generato dopo la creazione del progetto (project_new
+        riscrive la directory), quartus_sta gira insieme a quartus_asm,
+        quartus_cpf (solo EPCS) insieme a quartus_sta e la ricerca dei cavi
+        insieme a tutto il resto. asm e sta condividono lo stato e il
+        BuildManifest, protetto dal suo lock. Con incremental anche la
+        creazione del progetto e' saltata se i suoi input non sono cambiati
+        (vedi setup_steps): una build senza modifiche non avvia quartus_sh.
+
+        Args: vedi create_project, compile_project e program_device
+
+        Returns:
+            FlowGraph: Le fasi, da eseguire con run_graph o run_graph_async
+        """
+        graph = FlowGraph()
+        graph.add('setup', lambda inputs: self.setup_steps(verilog_files, batch, resolve_sources, incremental),
+                  outputs=['project'])
+        graph.add('ip', lambda inputs: self.create_virtual_jtag_steps(), inputs=['project'], outputs=['ip'])
+
+        def map_steps(inputs):
+            # Gli input della compilazione sono completi solo dopo setup e ip; dentro i passi,
+            # perche' la versione asyncio ne esegua l'hashing fuori dall'event loop
+            state = self.prepare_compile(incremental, cache)
+            return (yield from self.compile_stage_steps('map', state))
+
+        # Lo stato della compilazione passa da una fase all'altra
+        graph.add('map', map_steps, inputs=['project', 'ip'], outputs=['netlist'])
+        graph.add('fit', lambda inputs: self.compile_stage_steps('fit', inputs['netlist']),
+                  inputs=['netlist'], outputs=['fitted'])
+        graph.add('asm', lambda inputs: self.compile_stage_steps('asm', inputs['fitted']),
+                  inputs=['fitted'], outputs=['sof'])
+        if timing:
+            graph.add('sta', lambda inputs: self.timing_steps(inputs['fitted'], corners),
+                      inputs=['fitted'], outputs=['timing'])
+
+        if program:
+            graph.add('cables', lambda inputs: self.select_cables_steps(cable, all_cables), outputs=['cables'])
+            bitstream = 'sof'
+            if mode.upper() == "EPCS":
+                graph.add('cpf', lambda inputs: self.convert_pof_steps(), inputs=['sof'], outputs=['pof'])
+                bitstream = 'pof'
+            graph.add('pgm', lambda inputs: self.program_file_steps(inputs['cables'], mode, all_cables),
+                      inputs=['cables', bitstream], outputs=['programmed'])
+
+        return graph
+
+    def build(self, verilog_files, batch=True, incremental=True, cache=None, timing=True, program=True,
+              mode='jtag', cable=DEFAULT_CABLE, all_cables=False):
+        """
+        Crea, compila e (opzionalmente) programma il progetto, con le fasi
+        indipendenti in parallelo (vedi build_graph)
+
+        Returns:
+            dict: Esito e tempi di ogni fase (vedi NodeResult)
+
+        Raises:
+            FlowError: Se una o piu' fasi falliscono (quelle che ne dipendono non vengono eseguite)
+        """
+        graph = self.build_graph(verilog_files, batch=batch, incremental=incremental, cache=cache, timing=timing,
+                                 program=program, mode=mode, cable=cable, all_cables=all_cables)
+        try:
+            results = run_graph(graph)
+        except FlowError as e:
+            print(format_flow_report(e.results))
+            raise
+        print(format_flow_report(results))
+        return results
+
+
+class AsyncQuartusAutomation(QuartusAutomation):
+    """
+    Versione asyncio di QuartusAutomation: create_project, compile_project e
+    program_device sono coroutine e i comandi Quartus girano con
+    asyncio.create_subprocess_exec, cosi' un solo processo segue molte build
+    e programmazioni insieme (es. programma la board A mentre la board B e'
+    ancora nel fitter).
+
+    I passi sono quelli della versione sincrona (vedi run_command_steps): il
+    loro codice tra un comando e l'altro (hashing, cache, scansione dei
+    sorgenti) gira in un thread, senza bloccare le altre build. Cancellando il task, o allo scadere di un timeout, i processi Quartus in
+    corso vengono terminati.
+
+    Esempio:
+        a = AsyncQuartusAutomation(quartus_dir, 'de0_nano', 'DE0_NANO')
+        b = AsyncQuartusAutomation(quartus_dir, 'de10_lite', 'DE10_LITE')
+        await asyncio.gather(a.build(files_a), b.build(files_b))
+    """
+
+    def __init__(self, *args, command_timeout=None, **kwargs):
+        """
+        Args:
+            command_timeout (float): Secondi concessi a ogni comando Quartus
+                                     (nessun limite se None)
+
+        Gli altri argomenti sono quelli di QuartusAutomation (engine non viene
+        usato: le shell persistenti sono sincrone).
+        """
+        super().__init__(*args, **kwargs)
+        self.command_timeout = command_timeout
+
+    async def run_steps(self, steps, timeout=None):
+        """
+        Esegue i passi di un flusso
+
+        Args:
+            steps (Generator): Passi del flusso (es. create_project_steps(...))
+            timeout (float): Secondi concessi all'intero flusso (nessun limite se None)
+
+        Raises:
+            asyncio.TimeoutError: Se il flusso non termina in tempo
+            QuartusTimeoutError: Se un singolo comando supera command_timeout
+        """
+        return await asyncio.wait_for(run_command_steps_async(steps, self.command_timeout), timeout)
+
+    async def create_virtual_jtag(self, timeout=None):
+        return await self.run_steps(self.create_virtual_jtag_steps(), timeout)
+
+    async def create_project(self, verilog_files, batch=False, resolve_sources=True, ip=True, timeout=None):
+        """
+        Crea un nuovo progetto Quartus, vedi QuartusAutomation.create_project
+        """
+        return await self.run_steps(self.create_project_steps(verilog_files, batch, resolve_sources, ip), timeout)
+
+    async def create_project_batch(self, verilog_files, ip=True, timeout=None):
+        return await self.run_steps(self.create_project_batch_steps(verilog_files, ip), timeout)
+
+    async def compile_project(self, incremental=False, cache=None, timing=True, corners=DEFAULT_CORNERS, timeout=None):
+        """
+        Compila il progetto, vedi QuartusAutomation.compile_project
+        """
+        return await self.run_steps(self.compile_project_steps(incremental, cache, timing, corners), timeout)
+
+    async def timing_analysis(self, corners=DEFAULT_CORNERS, timeout=None):
+        return await self.run_steps(self.timing_analysis_steps(corners), timeout)
+
+    async def list_cables(self, chains=False, timeout=None):
+        return await self.run_steps(self.list_cables_steps(chains), timeout)
+
+    async def program_device(self, mode='jtag', cable=DEFAULT_CABLE, all_cables=False, timeout=None):
+        """
+        Programma il dispositivo, vedi QuartusAutomation.program_device
+        """
+        return await self.run_steps(self.program_device_steps(mode, cable, all_cables), timeout)
+
+    async def build(self, verilog_files, batch=True, incremental=True, cache=None, program=True, mode='jtag',
+                    timing=True, cable=DEFAULT_CABLE, all_cables=False, timeout=None):
+        """
+        Crea, compila e (opzionalmente) programma il progetto, con le fasi
+        indipendenti in parallelo, vedi QuartusAutomation.build
+        """
+        graph = self.build_graph(verilog_files, batch=batch, incremental=incremental, cache=cache, timing=timing,
+                                 program=program, mode=mode, cable=cable, all_cables=all_cables)
+        try:
+            results = await asyncio.wait_for(run_graph_async(graph, self.command_timeout), timeout)
+        except FlowError as e:
+            print(format_flow_report(e.results))
+            raise
+        print(format_flow_report(results))
+        return results
 
 
 def main():
     global quartus_dir
 
-    print("Usage: python main.py <quartus_dir> <board_name> [<verilog_file>]")
+    print("Usage: python main.py <quartus_dir> <board_name> [<project_name>] [<verilog_file_or_dir>]")
     if len(sys.argv) < 3 and False: # use default values
         sys.exit(1)
 
@@ -346,12 +989,13 @@ def main():
     try:
         automation = QuartusAutomation(quartus_dir, board_name, project_name)
 
-        # Crea e compila il progetto
-        automation.create_project(verilog_files)
-        automation.compile_project()
-
-        # Programma il dispositivo
-        automation.program_device()
+        # Tempi e risorse di ogni comando in faya_trace.jsonl / faya_trace.json
+        with BuildTrace(automation.project_dir) as trace:
+            try:
+                # Crea, compila e programma il progetto, le fasi indipendenti in parallelo
+                automation.build(verilog_files, batch=True, incremental=True)
+            finally:
+                print(trace.summary())
 
         print("Processo completato con successo!")
 
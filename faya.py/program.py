@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+
+# Solo la parte di programmazione: niente progetti, IP core o compilazione
+from libs.programmer import DEFAULT_CABLE, program_bitstream
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Programma un bitstream gia\' compilato, senza creare il progetto')
+    parser.add_argument('board', help='Nome della board (boards/<board>.yaml)')
+    parser.add_argument('bitstream', help='File .sof/.pof, oppure chiave (o prefisso) della cache dei bitstream')
+    parser.add_argument('--quartus-dir', default=os.environ.get('QUARTUS_ROOTDIR', 'C:\\intelFPGA_lite\\23.1std\\quartus'),
+                        help='Directory di installazione di Quartus (default: QUARTUS_ROOTDIR)')
+    parser.add_argument('--mode', choices=['jtag', 'epcs'], default=None,
+                        help='Modalita\' di programmazione (default: jtag per .sof, epcs per .pof)')
+    parser.add_argument('--cable', '-c', default=DEFAULT_CABLE,
+                        help='Cavo: nome, nome completo o pattern (es. "USB-Blaster [1-1]", "USB-Blaster*")')
+    parser.add_argument('--all-cables', '-a', action='store_true',
+                        help='Programma tutti i cavi corrispondenti in parallelo')
+    parser.add_argument('--cache-dir', default=None, help='Directory della cache dei bitstream')
+
+    args = parser.parse_args()
+
+    is_file = os.path.exists(args.bitstream)
+    try:
+        program_bitstream(args.quartus_dir, args.board,
+                          bitstream=args.bitstream if is_file else None,
+                          cache_key=None if is_file else args.bitstream,
+                          cache_dir=args.cache_dir, mode=args.mode,
+                          cable=args.cable, all_cables=args.all_cables)
+    except Exception as e:
+        print(f"Errore: {e}")
+        sys.exit(1)
+
+    print("Programmazione completata con successo!")
+
+
+if __name__ == "__main__":
+    main()
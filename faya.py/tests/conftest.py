@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules are imported as the scripts do, from the faya.py directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,75 @@
+import asyncio
+import sys
+import time
+
+import pytest
+
+from libs.async_execution import run_command_steps_async
+from libs.build_trace import BuildTrace, traced_phase
+
+COMMAND = [sys.executable, '-c', '"print(42)"']
+
+
+@traced_phase
+def blocking_steps(delay, count=2):
+    outputs = []
+    for _ in range(count):
+        # Stands in for hashing or quartus_sh --version between two commands
+        time.sleep(delay)
+        outputs.append((yield COMMAND, {}))
+    return outputs
+
+
+def test_steps_do_not_block_the_event_loop():
+    async def main():
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(ticker())
+        outputs = await run_command_steps_async(blocking_steps(0.3))
+        task.cancel()
+        return outputs, max(b - a for a, b in zip(ticks, ticks[1:]))
+
+    outputs, longest_gap = asyncio.run(main())
+    assert [str(output).strip() for output in outputs] == ['42', '42']
+    assert longest_gap < 0.2
+
+
+def test_commands_are_recorded_in_the_phases_of_the_steps():
+    async def main():
+        with BuildTrace() as trace:
+            await asyncio.gather(run_command_steps_async(blocking_steps(0.01)),
+                                 run_command_steps_async(blocking_steps(0.01)))
+        return trace
+
+    trace = asyncio.run(main())
+    assert [record['phase'] for record in trace.records] == ['blocking'] * 4
+    assert [span['name'] for span in trace.spans] == ['blocking', 'blocking']
+    # Each build keeps its own track, even if its steps ran in the executor
+    assert len({span['tid'] for span in trace.spans}) == 2
+    assert {record['tid'] for record in trace.records} == {span['tid'] for span in trace.spans}
+
+
+def test_cancelled_while_steps_run_in_the_executor():
+    closed = []
+
+    def steps():
+        try:
+            time.sleep(0.3)
+            yield COMMAND, {}
+        finally:
+            closed.append(True)
+
+    async def main():
+        task = asyncio.ensure_future(run_command_steps_async(steps()))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert closed == [True]
@@ -0,0 +1,122 @@
+import os
+import threading
+
+import pytest
+
+import libs.bitstream_cache
+from libs.bitstream_cache import META_NAME, BitstreamCache
+
+
+def compile_project(project_dir, name, content=b'sof'):
+    project_dir.mkdir(parents=True, exist_ok=True)
+    (project_dir / f"{name}.sof").write_bytes(content)
+    (project_dir / f"{name}.fit.rpt").write_text("Fitter Status : Successful")
+    return project_dir
+
+
+def age(cache, key, seconds_ago):
+    # Last used time of an entry, see BitstreamCache.lookup
+    meta_path = cache.entry_dir(key) / META_NAME
+    mtime = os.path.getmtime(meta_path) - seconds_ago
+    os.utime(meta_path, (mtime, mtime))
+
+
+def test_store_and_restore(tmp_path):
+    cache = BitstreamCache(tmp_path / "cache")
+    project = compile_project(tmp_path / "a", "A", b'bitstream')
+
+    assert cache.store("k1", project, "A", info={'board': 'de0_nano'})
+    assert not cache.store("k1", project, "A")
+
+    # Restored into another project, renamed for its revision
+    other = tmp_path / "b"
+    other.mkdir()
+    assert cache.restore("k1", other, "B")
+    assert (other / "B.sof").read_bytes() == b'bitstream'
+    assert (other / "B.fit.rpt").exists()
+    assert not cache.restore("missing", other, "B")
+    assert cache.lookup("k1")['board'] == 'de0_nano'
+
+
+def test_project_without_bitstream_is_not_stored(tmp_path):
+    cache = BitstreamCache(tmp_path / "cache")
+    project = compile_project(tmp_path / "a", "A")
+    (project / "A.sof").unlink()
+    assert not cache.store("k1", project, "A")
+    assert cache.entries() == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = BitstreamCache(tmp_path / "cache", max_size=10 ** 6)
+    project = compile_project(tmp_path / "a", "A", b'x' * 1000)
+    entry_size = 1000 + len("Fitter Status : Successful")
+
+    for index, key in enumerate(["k1", "k2", "k3"]):
+        assert cache.store(key, project, "A")
+        age(cache, key, 100 - index)
+    # k1 is the oldest, but it has just been used
+    assert cache.lookup("k1") is not None
+
+    cache.evict(max_size=2 * entry_size)
+    assert [meta['key'] for meta in cache.entries()] == ["k3", "k1"]
+    assert cache.size() == 2 * entry_size
+    assert cache.stats['evictions'] == 1
+
+
+def test_store_keeps_the_cache_under_its_cap(tmp_path):
+    project = compile_project(tmp_path / "a", "A", b'x' * 1000)
+    cache = BitstreamCache(tmp_path / "cache", max_size=2500)
+    for index, key in enumerate(["k1", "k2", "k3", "k4"]):
+        cache.store(key, project, "A")
+        age(cache, key, 100 - index)
+
+    assert [meta['key'] for meta in cache.entries()] == ["k3", "k4"]
+    assert cache.size() <= cache.max_size
+    # Nothing left behind by the evictions
+    assert sorted(os.listdir(tmp_path / "cache")) == ["entries"]
+
+
+def test_interrupted_store_leaves_no_entry(tmp_path, monkeypatch):
+    cache = BitstreamCache(tmp_path / "cache")
+    project = compile_project(tmp_path / "a", "A")
+
+    def interrupted(src, dst, *args, **kwargs):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(libs.bitstream_cache, 'materialize', interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            cache.store("k1", project, "A")
+
+    assert cache.lookup("k1") is None
+    assert sorted(os.listdir(tmp_path / "cache")) == ["entries"]
+    # The next build stores it
+    assert cache.store("k1", project, "A")
+    assert cache.restore("k1", project, "A")
+
+
+def test_concurrent_store_of_the_same_key(tmp_path, monkeypatch):
+    cache = BitstreamCache(tmp_path / "cache")
+    projects = [compile_project(tmp_path / name, "A", b'same bitstream') for name in ("a", "b")]
+    materialize = libs.bitstream_cache.materialize
+    both_filling = threading.Barrier(2, timeout=10)
+
+    def slow_materialize(src, dst, *args, **kwargs):
+        # Both builds have checked that the entry does not exist yet
+        if str(dst).endswith('.sof'):
+            both_filling.wait()
+        return materialize(src, dst, *args, **kwargs)
+
+    monkeypatch.setattr(libs.bitstream_cache, 'materialize', slow_materialize)
+    results = []
+    threads = [threading.Thread(target=lambda project=project: results.append(cache.store("k1", project, "A")))
+               for project in projects]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False, True]
+    assert [meta['key'] for meta in cache.entries()] == ["k1"]
+    assert sorted(os.listdir(cache.entry_dir("k1"))) == [META_NAME, "top.fit.rpt", "top.sof"]
+    assert sorted(os.listdir(tmp_path / "cache")) == ["entries"]
@@ -0,0 +1,68 @@
+import json
+import threading
+
+from libs.build_manifest import BuildManifest
+
+
+def test_concurrent_stages_share_the_manifest(tmp_path):
+    (tmp_path / "P.sof").write_bytes(b'sof')
+    (tmp_path / "P.fit.rpt").write_text("fit")
+    manifest = BuildManifest(tmp_path, 'P', tmp_path / "bin64")
+    errors = []
+
+    def asm():
+        try:
+            for i in range(200):
+                manifest.record('asm', f"key{i}")
+        except Exception as e:
+            errors.append(e)
+
+    def sta():
+        # New files hashed while asm saves the manifest
+        try:
+            (tmp_path / "db").mkdir()
+            for i in range(200):
+                (tmp_path / "db" / f"P.map.{i}").write_text(str(i))
+                manifest.outputs_hash('map')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=asm), threading.Thread(target=sta)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    saved = json.loads((tmp_path / "faya_manifest.json").read_text())
+    assert saved['stages']['asm']['key'] == "key199"
+    assert manifest.is_up_to_date('asm', "key199")
+
+
+def test_setup_is_skipped_until_the_project_changes(tmp_path):
+    (tmp_path / "top.v").write_text("module top; endmodule")
+    (tmp_path / "P.qpf").write_text("PROJECT_REVISION = \"P\"\n")
+    (tmp_path / "P.qsf").write_text("set_global_assignment -name VERILOG_FILE top.v\n"
+                                    "set_global_assignment -name FAMILY \"Cyclone IV E\"\n")
+    manifest = BuildManifest(tmp_path, 'P', tmp_path / "bin64")
+    assert not manifest.is_setup_up_to_date("key")
+
+    manifest.record_setup("key")
+    manifest = BuildManifest(tmp_path, 'P', tmp_path / "bin64")
+    assert manifest.is_setup_up_to_date("key")
+    assert not manifest.is_setup_up_to_date("other key")
+
+    # Volatile lines are rewritten by Quartus, real settings are not
+    with open(tmp_path / "P.qsf", 'a') as file:
+        file.write("set_global_assignment -name LAST_QUARTUS_VERSION \"23.1std.0 Lite Edition\"\n")
+    assert manifest.is_setup_up_to_date("key")
+    with open(tmp_path / "P.qsf", 'a') as file:
+        file.write("set_global_assignment -name FITTER_EFFORT \"FAST FIT\"\n")
+    assert not manifest.is_setup_up_to_date("key")
+
+    manifest.record_setup("key")
+    (tmp_path / "top.v").write_text("module top(input a); endmodule")
+    assert not manifest.is_setup_up_to_date("key")
+
+    manifest.invalidate_setup()
+    assert 'setup' not in json.loads((tmp_path / "faya_manifest.json").read_text())
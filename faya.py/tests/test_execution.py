@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from libs.execution import QuartusError, QuartusExitError, run_quartus_streaming, split_command, wait_process
+
+PYTHON = f'"{sys.executable}"'
+
+
+def test_split_command_removes_grouping_quotes():
+    assert split_command(['quartus_sh', '-t', '"dir x"/add.tcl', '"P" "top.v"']) == \
+        ['quartus_sh', '-t', 'dir x/add.tcl', 'P', 'top.v']
+
+
+def test_split_command_keeps_escaped_quotes():
+    command = ['quartus_sh', '--tcl_eval', '"set_global_assignment -name X \\"a b\\""']
+    assert split_command(command) == ['quartus_sh', '--tcl_eval', 'set_global_assignment -name X "a b"']
+
+
+def test_split_command_keeps_hashes():
+    assert split_command(['quartus_sh', "'puts #1'"]) == ['quartus_sh', 'puts #1']
+
+
+def test_streaming_raises_on_exit_status():
+    command = [PYTHON, '-c', '"import sys; print(\'Info: done\'); sys.exit(3)"']
+    with pytest.raises(QuartusExitError) as info:
+        run_quartus_streaming(command, echo=False)
+    assert info.value.returncode == 3
+    assert isinstance(info.value, subprocess.CalledProcessError)
+    assert 'Info: done' in info.value.stdout
+
+
+def test_streaming_stderr_tail_is_in_lines():
+    script = "import sys; sys.stderr.write(''.join('line %d\\n' % i for i in range(1000)))"
+    with pytest.raises(QuartusError) as info:
+        run_quartus_streaming([PYTHON, '-c', f'"{script}"'], echo=False, tail_lines=5)
+    assert info.value.stderr.splitlines() == [f'line {i}' for i in range(995, 1000)]
+
+
+@pytest.mark.skipif(not hasattr(os, 'wait4'), reason="wait4 is POSIX only")
+def test_wait4_reports_the_largest_process_not_the_tree():
+    usage = wait_process(subprocess.Popen([sys.executable, '-c', 'pass']))
+    assert usage['exit_status'] == 0
+    assert usage['max_process_rss_mb'] > 0
+    # The sum over the tree is only known from the psutil sampler
+    assert 'peak_rss_mb' not in usage
@@ -0,0 +1,104 @@
+from libs.quartus_messages import (CRITICAL_WARNING, ERROR, EXTRA_INFO, INFO, WARNING, QuartusMessages,
+                                   parse_messages)
+
+# quartus_map of a design with a syntax error
+MAP_FAILED = """\
+Info: *******************************************************************
+Info: Running Quartus Prime Analysis & Synthesis
+    Info: Version 23.1std.0 Build 991 11/28/2023 SC Lite Edition
+    Info: Processing started: Sat Nov  2 12:33:41 2024
+Info: Command: quartus_map --read_settings_files=on --write_settings_files=off DE0_NANO -c DE0_NANO
+Warning (18236): Number of processors has not been specified which may cause overloading on shared machines.  Set the global assignment NUM_PARALLEL_PROCESSORS in your QSF to an appropriate value for best performance.
+Info (20030): Parallel compilation is enabled and will use 4 of the 4 processors detected
+Info (12021): Found 1 design units, including 1 entities, in source file error_handler.v
+    Info (12023): Found entity 1: error_handler File: /p/error_handler.v Line: 1
+Error (10170): Verilog HDL syntax error at DE0_NANO.v(12) near text: ";";  expecting ")". Check for and fix any syntax errors that appear immediately before or at the specified keyword. The Intel FPGA Knowledge Database contains many articles with specific details on how to resolve this error. Visit the Knowledge Database at https://www.altera.com/support/support-resources/knowledge-base/search.html and search for this specific error message number.
+Error (10112): Ignored design unit "DE0_NANO" at DE0_NANO.v(1) due to previous errors
+Info (144001): Generated suppressed messages file /p/output_files/DE0_NANO.map.smsg
+Error: Quartus Prime Analysis & Synthesis was unsuccessful. 2 errors, 1 warning
+    Error: Peak virtual memory: 4812 megabytes
+    Error: Processing ended: Sat Nov  2 12:33:49 2024
+    Error: Elapsed time: 00:00:08
+    Error: Total CPU time (on all processors): 00:00:19
+"""
+
+# quartus_fit and quartus_sta of a design without constraints
+FIT_WARNINGS = """\
+Info (119006): Selected device EP4CE22F17C6 for design "DE0_NANO"
+Critical Warning (169085): No exact pin location assignment(s) for 1 pins of 9 total pins. For the list of pins please refer to the I/O Assignment Warnings table in the fitter report.
+Info (332104): Reading SDC File: 'DE0_NANO.sdc'
+Critical Warning (332012): Synopsys Design Constraints File file not found: 'DE0_NANO.sdc'. A Synopsys Design Constraints File is required by the Timing Analyzer to get proper timing constraints. Without it, the Compiler will not properly optimize the design.
+Warning (332060): Node: CLOCK_50 was determined to be a clock but was found without an associated clock assignment.
+    Info (13166): Register counter[0] is being clocked by CLOCK_50
+Info (176233): Starting register packing
+    Extra Info (176218): Packed 8 registers into blocks of type I/O Output Buffer
+Info (332146): Worst-case setup slack is 14.209
+    Info (332119):     Slack       End Point TNS Clock
+    Info (332119): ========= =================== =====================
+    Info (332119):    14.209               0.000 CLOCK_50
+Info: Quartus Prime Fitter was successful. 0 errors, 3 warnings
+"""
+
+
+def test_error_ids_and_summary():
+    messages = parse_messages(MAP_FAILED)
+    assert messages.has_errors
+    assert [error.id for error in messages.errors] == [10170, 10112, None, None, None, None, None]
+    assert messages.errors[0].text.startswith('Verilog HDL syntax error at DE0_NANO.v(12)')
+    assert messages.errors[0].line == 10
+    assert messages.summary_errors == 2 and messages.summary_warnings == 1
+
+
+def test_errors_in_an_info_text_are_not_errors():
+    messages = parse_messages(MAP_FAILED.splitlines()[7] + "\n"
+                              "Info (293000): Quartus Prime Full Compilation was successful. 0 errors, 12 warnings\n")
+    assert not messages.has_errors
+    assert messages.counts[INFO] == 2
+    assert messages.summary_warnings == 12
+
+
+def test_sub_messages_keep_their_depth():
+    messages = parse_messages(FIT_WARNINGS)
+    table = messages.query(message_id=332119)
+    assert [message.depth for message in table] == [1, 1, 1]
+    # The rows of a multi-line table keep their alignment
+    assert table[2].text == "   14.209               0.000 CLOCK_50"
+    assert messages.query(severity=EXTRA_INFO)[0].id == 176218
+    assert messages.counts[INFO] == 9
+
+
+def test_critical_warnings_are_not_warnings():
+    messages = parse_messages(FIT_WARNINGS)
+    assert not messages.has_errors
+    assert [message.id for message in messages.critical_warnings] == [169085, 332012]
+    assert [message.id for message in messages.warnings] == [332060]
+    assert messages.query(contains="not found")[0].id == 332012
+    assert messages.summary_warnings == 3
+
+
+def test_suppressed_messages_file_is_an_info():
+    messages = parse_messages(MAP_FAILED)
+    suppressed = messages.query(message_id=144001)
+    assert len(suppressed) == 1 and suppressed[0].severity == INFO
+    assert suppressed[0].text.endswith('DE0_NANO.map.smsg')
+
+
+def test_only_kept_severities_are_stored():
+    messages = QuartusMessages(keep=(ERROR, CRITICAL_WARNING, WARNING))
+    messages.feed_text(FIT_WARNINGS)
+    assert messages.query(severity=INFO) == []
+    # The others are still counted, "Critical Warning" and "Extra Info" apart
+    assert messages.counts[INFO] == 9
+    assert messages.counts[EXTRA_INFO] == 1
+    assert messages.counts[WARNING] == 1
+    assert messages.counts[CRITICAL_WARNING] == 2
+
+
+def test_chunks_give_the_same_result_as_the_whole_output():
+    lines = (MAP_FAILED + FIT_WARNINGS).splitlines(keepends=True)
+    whole = parse_messages(''.join(lines))
+    chunked = QuartusMessages()
+    for start in range(0, len(lines), 3):
+        chunked.feed_text(''.join(lines[start:start + 3]))
+    assert chunked.messages == whole.messages
+    assert chunked.line_count == whole.line_count == len(lines)
@@ -0,0 +1,91 @@
+import pytest
+
+from libs.execution import QuartusError
+from libs.quartus_shell import END, QuartusShellPool, command_to_tcl, get_fake_shell_command
+from libs.tcl_batch import TclBatch
+
+tkinter = pytest.importorskip("tkinter")
+
+
+@pytest.fixture
+def pool():
+    with QuartusShellPool(size=2, command=get_fake_shell_command(), timeout=30) as pool:
+        yield pool
+
+
+def test_command_to_tcl_eval():
+    assert command_to_tcl(['/q/bin64/quartus_sh', '--tcl_eval', 'project_new -part X P']) == 'project_new -part X P'
+
+
+def test_command_to_tcl_script():
+    tcl = command_to_tcl(['quartus_sh', '-t "/faya/quartus_tcls"/add_verilog_file.tcl', '"P" "top.v"'])
+    assert tcl.split('; ') == [
+        'set argv [list "P" "top.v"]',
+        'set argc 2',
+        'set argv0 "/faya/quartus_tcls/add_verilog_file.tcl"',
+        'source "/faya/quartus_tcls/add_verilog_file.tcl"'
+    ]
+
+
+@pytest.mark.parametrize('command', [
+    ['quartus_map', 'P'],
+    ['quartus_sh', '--flow', 'compile', 'P'],
+    ['quartus_sh'],
+])
+def test_command_to_tcl_unsupported(command):
+    assert command_to_tcl(command) is None
+
+
+def test_output_and_result_are_framed(pool):
+    # Lines looking like the markers of another request do not end the reply
+    output = pool.eval(f'puts "before"\nputs "{END} 999 1"\nexpr {{6 * 7}}')
+    assert output == f"before\n{END} 999 1\n42"
+
+
+def test_requests_in_sequence(pool):
+    with pool.shell() as shell:
+        assert [shell.eval(f'expr {{{i} + 1}}') for i in range(5)] == ['1', '2', '3', '4', '5']
+
+
+def test_error_raises_and_shell_survives(pool):
+    with pool.shell() as shell:
+        with pytest.raises(QuartusError) as error:
+            shell.eval('puts "partial"; error "boom"')
+        assert str(error.value) == "boom"
+        assert error.value.stdout == "partial"
+
+        # `exit` of the helper scripts becomes an error, not the end of the shell
+        with pytest.raises(QuartusError):
+            shell.eval('exit 1')
+        assert shell.is_alive()
+        assert shell.eval('expr 1') == '1'
+
+
+def test_crashed_shell_is_respawned(pool):
+    crashed = pool.shells[0]
+    crashed.process.kill()
+    crashed.process.wait()
+
+    # Both shells are checked out: the dead one is replaced
+    with pool.shell() as first, pool.shell() as second:
+        assert first.eval('expr 2') == '2'
+        assert second.eval('expr 3') == '3'
+        assert crashed not in (first, second)
+    assert len(pool.shells) == 2
+    assert all(shell.is_alive() for shell in pool.shells)
+
+
+def test_run_command_in_project(pool, tmp_path):
+    assert pool.run_command(['quartus_sh', '--tcl_eval', 'project_new', '-part', 'EP4CE22', 'P'],
+                            working_dir=str(tmp_path)) is not None
+    assert (tmp_path / "P.qpf").exists()
+
+    batch = TclBatch('P').project_open()
+    batch.add_step("set", 'set_global_assignment -name TOP_LEVEL_ENTITY "top level"')
+    batch.get_global_assignment('TOP_LEVEL_ENTITY')
+    batch.get_global_assignment('DEVICE')
+    batch.export_and_close()
+    batch.run('quartus_sh', str(tmp_path), engine=pool)
+
+    assert TclBatch.parse_values(batch.output) == {'TOP_LEVEL_ENTITY': 'top level', 'DEVICE': 'EP4CE22'}
+    assert 'set_global_assignment -name TOP_LEVEL_ENTITY {top level}' in (tmp_path / "P.qsf").read_text()
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from libs.build_trace import TRACE_JSONL_NAME
+from libs.scheduler import MEASURED_MEMORY_MARGIN, BuildScheduler, build_matrix, measured_memory_mb
+
+
+def write_trace(project_dir, records):
+    project_dir.mkdir(parents=True)
+    with open(project_dir / TRACE_JSONL_NAME, 'w') as file:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+
+
+def test_measured_memory_from_the_fitter_build(tmp_path):
+    write_trace(tmp_path / 'p', [{'name': 'quartus_map', 'peak_rss_mb': 900.0},
+                                 {'name': 'quartus_fit', 'peak_rss_mb': 1600.0},
+                                 {'name': 'quartus_asm', 'max_process_rss_mb': 700.0}])
+    assert measured_memory_mb(tmp_path / 'p') == int(1600 * MEASURED_MEMORY_MARGIN)
+
+
+def test_cached_build_is_not_a_measure(tmp_path):
+    write_trace(tmp_path / 'p', [{'name': 'quartus_sh -t faya_setup.tcl', 'peak_rss_mb': 300.0}])
+    assert measured_memory_mb(tmp_path / 'p') is None
+    assert measured_memory_mb(tmp_path / 'missing') is None
+
+
+def test_jobs_reserve_the_measured_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(BuildScheduler, 'board_memory_mb', staticmethod(lambda board_name: 2048))
+    write_trace(tmp_path / 'de0_nano' / 'A', [{'name': 'quartus_fit', 'max_process_rss_mb': 1000.0}])
+    scheduler = BuildScheduler('quartus', projects_root=str(tmp_path))
+    jobs = scheduler.make_jobs(['de0_nano'], {'A': ['a.v'], 'B': ['b.v']})
+    assert [job.memory_mb for job in jobs] == [int(1000 * MEASURED_MEMORY_MARGIN), 2048]
+
+
+def test_program_needs_a_single_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(BuildScheduler, 'board_memory_mb', staticmethod(lambda board_name: 2048))
+    with pytest.raises(ValueError):
+        build_matrix('quartus', ['de0_nano', 'de10_nano'], {'A': ['a.v']}, projects_root=str(tmp_path),
+                     program=True)
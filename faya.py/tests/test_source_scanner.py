@@ -0,0 +1,74 @@
+from libs.source_scanner import SourceScanner, parse_verilog, parse_vhdl
+
+
+def write(directory, name, text):
+    path = directory / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+def resolve(tmp_path, top, paths):
+    scanner = SourceScanner(tmp_path / "cache.json")
+    return scanner, scanner.resolve(top, paths)
+
+
+def test_verilog_uses_packages_and_interfaces():
+    parsed = parse_verilog("""
+        import cfg_pkg::*;
+        module top(input clk, bus_if.master bus, data_if data);
+          logic [7:0] x = util_pkg::f(1);
+        endmodule
+    """)
+    assert parsed['modules'] == {'top': []}
+    assert {'cfg_pkg', 'util_pkg', 'bus_if', 'data_if'} <= set(parsed['uses']['top'])
+
+
+def test_vhdl_packages_and_bodies():
+    parsed = parse_vhdl("""
+        library ieee; use ieee.std_logic_1164.all;
+        use work.other_pkg.all;
+        package my_pkg is end package;
+        package body my_pkg is end package body;
+    """)
+    assert list(parsed['modules']) == ['my_pkg']
+    assert parsed['bodies'] == ['my_pkg']
+    assert parsed['uses']['my_pkg'] == ['std_logic_1164', 'other_pkg']
+
+
+def test_resolve_follows_systemverilog_packages(tmp_path):
+    top = write(tmp_path, "top.sv", "import cfg_pkg::*;\nmodule top(bus_if.master bus); sub u0 (); endmodule\n")
+    src = tmp_path / "src"
+    write(src, "cfg_pkg.sv", "package cfg_pkg; parameter W = 8; endpackage\n")
+    write(src, "bus_if.sv", "interface bus_if; logic v; modport master(output v); endinterface\n")
+    write(src, "sub.v", "module sub; endmodule\n")
+    write(src, "unused.v", "module unused; endmodule\n")
+
+    scanner, files = resolve(tmp_path, 'top', [top, str(src)])
+
+    assert [path.rsplit('/', 1)[-1] for path in files] == ['top.sv', 'bus_if.sv', 'cfg_pkg.sv', 'sub.v']
+    assert scanner.unresolved == []
+
+
+def test_resolve_follows_vhdl_use_clauses(tmp_path):
+    top = write(tmp_path, "top.vhd", "use work.my_pkg.all;\nentity top is end; architecture a of top is begin end;\n")
+    src = tmp_path / "src"
+    write(src, "my_pkg.vhd", "package my_pkg is end package;\n")
+    write(src, "my_pkg_body.vhd", "use work.util_pkg.all;\npackage body my_pkg is end package body;\n")
+    write(src, "util_pkg.vhd", "package util_pkg is end package;\n")
+    write(src, "other.vhd", "entity other is end;\n")
+
+    _, files = resolve(tmp_path, 'top', [top, str(src)])
+
+    assert [path.rsplit('/', 1)[-1] for path in files] == ['top.vhd', 'my_pkg.vhd', 'my_pkg_body.vhd',
+                                                          'util_pkg.vhd']
+
+
+def test_explicit_files_are_never_pruned(tmp_path):
+    top = write(tmp_path, "top.v", "module top; endmodule\n")
+    extra = write(tmp_path, "extra.v", "module extra; endmodule\n")
+
+    scanner, files = resolve(tmp_path, 'top', [top, extra])
+
+    assert files == [top, extra]
+    assert scanner.unreachable == [extra]
@@ -0,0 +1,300 @@
+import array
+import os
+import threading
+import time
+
+import pytest
+
+serial = pytest.importorskip("serial")
+
+from tools import virtualJTagSerial
+from tools.virtualJTagSerial import VirtualJTAGSerial
+
+TIMEOUT = 0.2
+
+
+@pytest.fixture
+def pty_vjtag():
+    """
+    VirtualJTAGSerial on the slave side of a pty (POSIX descriptor path),
+    with the master side standing in for the board.
+    """
+    if os.name == 'nt':
+        pytest.skip("pty requires POSIX")
+    import pty
+
+    master, slave = pty.openpty()
+    vjtag = VirtualJTAGSerial(os.ttyname(slave), timeout=TIMEOUT, chunk_size=64)
+    try:
+        yield vjtag, master
+    finally:
+        vjtag.close()
+        os.close(slave)
+        os.close(master)
+
+
+@pytest.fixture
+def loop_vjtag(monkeypatch):
+    """
+    VirtualJTAGSerial on a pyserial loop:// port: no descriptor, pyserial fallback path.
+    """
+    monkeypatch.setattr(virtualJTagSerial.serial, 'Serial',
+                        lambda port, **kwargs: serial.serial_for_url('loop://', **kwargs))
+    vjtag = VirtualJTAGSerial('loop://', timeout=TIMEOUT, chunk_size=64)
+    try:
+        yield vjtag
+    finally:
+        vjtag.close()
+
+
+def read_exactly(fd, size):
+    data = b''
+    while len(data) < size:
+        data += os.read(fd, size - len(data))
+    return data
+
+
+def pattern(size):
+    return bytes(i % 251 for i in range(size))
+
+
+def test_pty_uses_descriptor(pty_vjtag):
+    vjtag, _ = pty_vjtag
+    assert vjtag._fileno() is not None
+
+
+@pytest.mark.parametrize('make', [bytes, bytearray, memoryview], ids=['bytes', 'bytearray', 'memoryview'])
+def test_pty_write_buffer(pty_vjtag, make):
+    vjtag, master = pty_vjtag
+    data = pattern(1000)
+
+    # The pty buffer is small: the board side reads while the buffer is written
+    received = []
+    board = threading.Thread(target=lambda: received.append(read_exactly(master, len(data))))
+    board.start()
+    stats = vjtag.write_buffer(make(data))
+    board.join(5)
+
+    assert received == [data]
+    assert stats.nbytes == len(data)
+    assert stats.chunks == 16
+    assert vjtag.last_transfer == stats
+
+
+def test_pty_write_buffer_non_byte_format(pty_vjtag):
+    vjtag, master = pty_vjtag
+    data = array.array('I', range(100))
+
+    stats = vjtag.write_buffer(data)
+
+    assert stats.nbytes == len(data) * data.itemsize
+    assert read_exactly(master, stats.nbytes) == data.tobytes()
+
+
+@pytest.mark.parametrize('make', [bytearray, lambda size: memoryview(bytearray(size))],
+                         ids=['bytearray', 'memoryview'])
+def test_pty_read_into(pty_vjtag, make):
+    vjtag, master = pty_vjtag
+    data = pattern(300)
+    os.write(master, data)
+
+    buffer = make(len(data))
+    stats = vjtag.read_into(buffer)
+
+    assert bytes(buffer) == data
+    assert stats.nbytes == len(data)
+    assert stats.chunks >= 5
+
+
+def test_pty_read_into_non_byte_format(pty_vjtag):
+    vjtag, master = pty_vjtag
+    expected = array.array('H', range(64))
+    os.write(master, expected.tobytes())
+
+    buffer = array.array('H', bytes(len(expected) * expected.itemsize))
+    stats = vjtag.read_into(buffer)
+
+    assert stats.nbytes == len(expected) * expected.itemsize
+    assert buffer == expected
+
+
+def test_pty_read_into_partial_on_timeout(pty_vjtag):
+    vjtag, master = pty_vjtag
+    os.write(master, b'0123456789')
+
+    buffer = bytearray(32)
+    stats = vjtag.read_into(buffer)
+
+    assert stats.nbytes == 10
+    assert buffer[:10] == b'0123456789'
+    assert buffer[10:] == bytes(22)
+    assert stats.seconds >= TIMEOUT * 0.9
+
+
+def test_loop_uses_pyserial(loop_vjtag):
+    assert loop_vjtag._fileno() is None
+
+
+@pytest.mark.parametrize('make', [bytes, bytearray, memoryview], ids=['bytes', 'bytearray', 'memoryview'])
+def test_loop_round_trip(loop_vjtag, make):
+    data = pattern(500)
+
+    written = loop_vjtag.write_buffer(make(data))
+    buffer = bytearray(len(data))
+    read = loop_vjtag.read_into(memoryview(buffer))
+
+    assert written.nbytes == read.nbytes == len(data)
+    assert written.chunks == 8
+    assert bytes(buffer) == data
+
+
+def test_loop_non_byte_format(loop_vjtag):
+    data = array.array('d', [0.5 * i for i in range(50)])
+
+    loop_vjtag.write_buffer(data)
+    buffer = array.array('d', bytes(len(data) * data.itemsize))
+    stats = loop_vjtag.read_into(buffer)
+
+    assert stats.nbytes == len(data) * data.itemsize
+    assert buffer == data
+
+
+def test_loop_read_into_partial_on_timeout(loop_vjtag):
+    loop_vjtag.write_buffer(b'abc')
+
+    buffer = bytearray(16)
+    stats = loop_vjtag.read_into(buffer)
+
+    assert stats.nbytes == 3
+    assert buffer[:3] == b'abc'
+    assert loop_vjtag.last_transfer == stats
+
+
+def failing_after(vjtag, data):
+    """
+    Make the port deliver data, then fail as an unplugged device does.
+    """
+    pending = [data]
+
+    def read_some(chunk, timeout):
+        if not pending:
+            raise serial.SerialException("device disconnected")
+        block = pending.pop()
+        chunk[:len(block)] = block
+        return len(block)
+
+    vjtag._read_some = read_some
+
+
+def test_reader_delivers_then_stops_on_error(loop_vjtag):
+    failing_after(loop_vjtag, b'hello')
+    reader = loop_vjtag.start_reader(capacity=64)
+
+    assert bytes(reader.read(timeout=5)) == b'hello'
+    # Nothing left to wake the consumer but the end of the thread
+    assert reader.read(timeout=None) is None
+    assert not reader.running
+    assert isinstance(reader.error, serial.SerialException)
+
+
+def test_reader_async_returns_none_after_error(loop_vjtag):
+    import asyncio
+
+    failing_after(loop_vjtag, b'abc')
+    reader = loop_vjtag.start_reader(capacity=64)
+
+    async def consume():
+        return [bytes(data) async for data in reader]
+
+    assert asyncio.run(asyncio.wait_for(consume(), 5)) == [b'abc']
+    assert not reader.running
+
+
+class ScriptedPort:
+    """
+    Stands in for _read_some: delivers the bytes fed by the test, at most
+    one reader chunk at a time, as the board would.
+    """
+
+    def __init__(self, vjtag):
+        self.pending = bytearray()
+        self.condition = threading.Condition()
+        # Buffer of every read: the ring buffer, or the scratch of the dropped data
+        self.targets = []
+        vjtag._read_some = self.read_some
+
+    def feed(self, data):
+        with self.condition:
+            self.pending += data
+            self.condition.notify_all()
+
+    def read_some(self, chunk, timeout):
+        self.targets.append(chunk.obj)
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending, timeout)
+            count = min(len(chunk), len(self.pending))
+            chunk[:count] = self.pending[:count]
+            del self.pending[:count]
+            return count
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "the reader thread did not get there"
+        time.sleep(0.005)
+
+
+def collect(reader, size):
+    data = b''
+    while len(data) < size:
+        block = reader.read(timeout=5)
+        assert block is not None
+        data += bytes(block)
+    return data
+
+
+def test_reader_wraps_around_the_buffer(loop_vjtag):
+    port = ScriptedPort(loop_vjtag)
+    reader = loop_vjtag.start_reader(capacity=16, chunk_size=8)
+
+    port.feed(b'0123456789')
+    assert collect(reader, 10) == b'0123456789'
+    reader.release()
+
+    # The consumer lags: the next bytes reach the end of the buffer and continue from its start
+    port.feed(b'abcdefghij')
+    wait_until(lambda: reader.received == 20)
+    assert bytes(reader.read(timeout=5)) == b'abcdef'
+    assert bytes(reader.read(timeout=5)) == b'ghij'
+    assert [(info.offset, info.nbytes) for info in reader.chunk_info] == [(0, 8), (8, 2), (10, 6), (16, 4)]
+    assert reader.overruns == 0
+
+
+def test_reader_drops_new_data_when_the_consumer_falls_behind(loop_vjtag):
+    port = ScriptedPort(loop_vjtag)
+    reader = loop_vjtag.start_reader(capacity=16, chunk_size=8)
+
+    # Nobody reads: the buffer fills up, the rest is read from the link and dropped
+    port.feed(pattern(40))
+    wait_until(lambda: reader.overrun_bytes == 24)
+    assert reader.overruns == 3
+    assert reader.received == 16
+
+    held = reader.read(timeout=5)
+    assert bytes(held) == pattern(16)
+
+    # The slice held by the consumer is not overwritten while it is in use
+    port.feed(b'x' * 8)
+    wait_until(lambda: reader.overrun_bytes == 32)
+    assert bytes(held) == pattern(16)
+
+    # Released by the next read: new data is stored again, from the start of the buffer,
+    # once the read in progress (into the scratch buffer) is over
+    reads = len(port.targets)
+    assert reader.read(timeout=0.05) is None
+    wait_until(lambda: any(target is reader.buffer for target in port.targets[reads:]))
+    port.feed(b'after')
+    assert collect(reader, 5) == b'after'
+    assert reader.stats()['received'] == 21
+    assert reader.stats()['overrun_bytes'] == 32
@@ -0,0 +1,139 @@
+import os
+import sys
+import tkinter
+
+# Quartus project commands emulated on top of a plain Tcl interpreter.
+# Assignments are kept in memory and written to <project>.qsf on export,
+# which is enough to exercise faya.py without a Quartus installation.
+FAKE_QUARTUS_COMMANDS = r'''
+namespace eval ::fake {
+    variable project ""
+    variable assignments [dict create]
+    variable instance_assignments [list]
+}
+
+proc load_package {args} {}
+
+proc project_exists {name} {
+    return [file exists $name.qpf]
+}
+
+proc project_new {args} {
+    set name [lindex $args end]
+    set part ""
+    if {[set i [lsearch $args -part]] >= 0} { set part [lindex $args [expr {$i + 1}]] }
+    if {[file exists $name.qpf] && [lsearch $args -overwrite] < 0} {
+        error "Project $name already exists"
+    }
+    set f [open $name.qpf w]; puts $f "PROJECT_REVISION = \"$name\""; close $f
+    set ::fake::project $name
+    set ::fake::assignments [dict create]
+    set ::fake::instance_assignments [list]
+    if {$part ne ""} { dict set ::fake::assignments DEVICE $part }
+    export_assignments
+}
+
+proc project_open {args} {
+    set name [lindex $args end]
+    if {![file exists $name.qpf]} { error "Project $name does not exist" }
+    set ::fake::project $name
+    set ::fake::assignments [dict create]
+    set ::fake::instance_assignments [list]
+    if {[file exists $name.qsf]} {
+        set f [open $name.qsf r]
+        foreach line [split [read $f] "\n"] {
+            if {[regexp {^set_global_assignment -name (\S+) (.*)$} $line -> key value]} {
+                dict set ::fake::assignments $key [lindex $value 0]
+            } elseif {[regexp {^set_(location|instance)_assignment } $line]} {
+                lappend ::fake::instance_assignments $line
+            }
+        }
+        close $f
+    }
+}
+
+proc project_close {} {
+    if {$::fake::project eq ""} { error "No open project" }
+    set ::fake::project ""
+}
+
+proc set_global_assignment {args} {
+    if {$::fake::project eq ""} { error "No open project" }
+    set i [lsearch $args -name]
+    if {$i < 0} { error "Missing -name" }
+    dict set ::fake::assignments [lindex $args [expr {$i + 1}]] [lindex $args end]
+}
+
+proc get_global_assignment {args} {
+    if {$::fake::project eq ""} { error "No open project" }
+    set key [lindex $args [expr {[lsearch $args -name] + 1}]]
+    if {[dict exists $::fake::assignments $key]} { return [dict get $::fake::assignments $key] }
+    return ""
+}
+
+proc set_location_assignment {args} {
+    if {$::fake::project eq ""} { error "No open project" }
+    lappend ::fake::instance_assignments "set_location_assignment $args"
+}
+
+proc set_instance_assignment {args} {
+    if {$::fake::project eq ""} { error "No open project" }
+    lappend ::fake::instance_assignments "set_instance_assignment $args"
+}
+
+proc export_assignments {} {
+    if {$::fake::project eq ""} { error "No open project" }
+    set f [open $::fake::project.qsf w]
+    dict for {key value} $::fake::assignments {
+        puts $f "set_global_assignment -name $key [list $value]"
+    }
+    foreach line $::fake::instance_assignments {
+        puts $f $line
+    }
+    close $f
+}
+'''
+
+
+def main():
+    """
+    Minimal stand-in for `quartus_sh -s`: a Tcl shell reading commands from stdin.
+    """
+    tcl = tkinter.Tcl()
+
+    # tkinter removes the Tcl `exit` command
+    def exit_shell(code=0):
+        tcl.eval('flush stdout')
+        os._exit(int(code))
+    tcl.createcommand('exit', exit_shell)
+
+    tcl.eval(FAKE_QUARTUS_COMMANDS)
+    tcl.eval('puts "Info: Fake Quartus Shell (faya.py)"; flush stdout')
+
+    script = ""
+    while True:
+        if not script:
+            tcl.eval('puts -nonewline "tcl> "; flush stdout')
+
+        line = sys.stdin.readline()
+        if not line:
+            break
+
+        # Accumulate lines until the command is complete, as the real shell does
+        script += line
+        if not tcl.call('info', 'complete', script):
+            continue
+
+        try:
+            result = tcl.eval(script)
+            if result:
+                tcl.call('puts', result)
+        except tkinter.TclError as e:
+            tcl.call('puts', f"Error: {e}")
+
+        tcl.eval('flush stdout')
+        script = ""
+
+
+if __name__ == "__main__":
+    main()
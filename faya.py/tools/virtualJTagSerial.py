@@ -1,11 +1,37 @@
 import serial
 import time
 import argparse
-from typing import Optional, List
+import os
+import select
+import threading
+from collections import deque
+from typing import NamedTuple, Optional, List
+
+# Blocco dei trasferimenti in blocco: multiplo dei pacchetti USB bulk (64 byte),
+# pari al buffer dei bridge USB-seriale piu' comuni
+DEFAULT_CHUNK_SIZE = 4096
+
+
+class TransferStats(NamedTuple):
+    """
+    Risultato di un trasferimento in blocco.
+    """
+    nbytes: int         # byte trasferiti
+    seconds: float
+    chunks: int         # chiamate di scrittura/lettura
+
+    @property
+    def throughput(self) -> float:
+        """Byte al secondo"""
+        return self.nbytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return f"{self.nbytes} bytes in {self.seconds:.3f} s ({self.throughput / 1024:.1f} KiB/s, {self.chunks} blocchi)"
 
 
 class VirtualJTAGSerial:
-    def __init__(self, port: str, baudrate: int = 115200, timeout: float = 1.0):
+    def __init__(self, port: str, baudrate: int = 115200, timeout: float = 1.0,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
         """
         Inizializza la comunicazione seriale con il Virtual JTAG.
 
@@ -13,7 +39,11 @@ class VirtualJTAGSerial:
             port: Porta seriale (es. 'COM3' su Windows o '/dev/ttyUSB0' su Linux)
             baudrate: Velocità di comunicazione
             timeout: Timeout in secondi
+            chunk_size: Byte per chiamata nei trasferimenti in blocco (write_buffer, read_into)
         """
+        self.chunk_size = chunk_size
+        self.last_transfer: Optional[TransferStats] = None
+        self.reader: Optional[RingBufferReader] = None
         self.serial = serial.Serial(
             port=port,
             baudrate=baudrate,
@@ -31,6 +61,7 @@ class VirtualJTAGSerial:
 
     def close(self):
         """Chiude la connessione seriale."""
+        self.stop_reader()
         if self.serial.is_open:
             self.serial.close()
 
@@ -100,6 +131,343 @@ class VirtualJTAGSerial:
             print(f"Errore durante la lettura multipla: {e}")
             return None
 
+    def _fileno(self) -> Optional[int]:
+        # Porte reali su POSIX: il descrittore e' usato direttamente, senza le copie di pyserial
+        if os.name == 'nt':
+            return None
+        try:
+            return self.serial.fileno()
+        except Exception:
+            return None
+
+    def write_buffer(self, data, chunk_size: Optional[int] = None) -> TransferStats:
+        """
+        Scrive un intero buffer sul Virtual JTAG, a blocchi e con un solo flush finale.
+
+        Accetta qualsiasi oggetto con buffer protocol (bytes, bytearray,
+        memoryview, array numpy contiguo): i blocchi sono slice di una
+        memoryview, il buffer non viene copiato.
+
+        Args:
+            data: Dati da scrivere
+            chunk_size: Byte per chiamata (default: self.chunk_size)
+
+        Returns:
+            TransferStats: Byte scritti, tempo e throughput (anche in self.last_transfer)
+
+        Raises:
+            TimeoutError: Se la porta non accetta dati entro il write_timeout
+        """
+        chunk_size = chunk_size or self.chunk_size
+        view = memoryview(data).cast('B')
+        fd = self._fileno()
+
+        start = time.perf_counter()
+        chunks = 0
+        for offset in range(0, len(view), chunk_size):
+            chunk = view[offset:offset + chunk_size]
+            if fd is not None:
+                self._write_fd(fd, chunk)
+            else:
+                self.serial.write(chunk)
+            chunks += 1
+        self.serial.flush()
+
+        self.last_transfer = TransferStats(len(view), time.perf_counter() - start, chunks)
+        return self.last_transfer
+
+    def _write_fd(self, fd: int, chunk: memoryview):
+        # Il descrittore di pyserial e' non bloccante: si attende con select
+        written = 0
+        while written < len(chunk):
+            try:
+                written += os.write(fd, chunk[written:])
+            except BlockingIOError:
+                _, ready, _ = select.select([], [fd], [], self.serial.write_timeout)
+                if not ready:
+                    raise TimeoutError(f"Timeout durante la scrittura ({written} bytes del blocco scritti)")
+
+    def read_into(self, buffer, chunk_size: Optional[int] = None) -> TransferStats:
+        """
+        Legge dal Virtual JTAG direttamente in un buffer scrivibile, fino a riempirlo.
+
+        Accetta qualsiasi oggetto con buffer protocol scrivibile (bytearray,
+        memoryview, array numpy contiguo): i dati non passano da oggetti
+        bytes intermedi. Si ferma prima se per `timeout` secondi non arriva
+        nulla, come readinto.
+
+        Args:
+            buffer: Buffer da riempire
+            chunk_size: Byte massimi per chiamata (default: self.chunk_size)
+
+        Returns:
+            TransferStats: Byte letti (meno della dimensione del buffer in caso
+                           di timeout), tempo e throughput (anche in self.last_transfer)
+        """
+        chunk_size = chunk_size or self.chunk_size
+        view = memoryview(buffer).cast('B')
+        fd = self._fileno()
+
+        start = time.perf_counter()
+        received = 0
+        chunks = 0
+        while received < len(view):
+            count = self._read_some(view[received:received + chunk_size], self.serial.timeout)
+            if not count:
+                break
+            received += count
+            chunks += 1
+
+        self.last_transfer = TransferStats(received, time.perf_counter() - start, chunks)
+        return self.last_transfer
+
+    def _read_some(self, chunk: memoryview, timeout: Optional[float]) -> int:
+        # I byte disponibili (fino a len(chunk)), letti direttamente nel buffer; 0 se non arriva nulla
+        fd = self._fileno()
+        if fd is None:
+            return self.serial.readinto(chunk) or 0
+        while True:
+            ready, _, _ = select.select([fd], [], [], timeout)
+            if not ready:
+                return 0
+            try:
+                return os.readv(fd, [chunk])
+            except BlockingIOError:
+                continue
+
+    def start_reader(self, capacity: int = 1 << 20, chunk_size: Optional[int] = None) -> 'RingBufferReader':
+        """
+        Avvia la lettura continua in background, vedi RingBufferReader.
+
+        Args:
+            capacity: Dimensione del buffer circolare in byte
+            chunk_size: Byte massimi per lettura (default: self.chunk_size)
+        """
+        self.stop_reader()
+        self.reader = RingBufferReader(self, capacity, chunk_size or self.chunk_size).start()
+        return self.reader
+
+    def stop_reader(self):
+        reader = getattr(self, 'reader', None)
+        if reader is not None:
+            reader.stop()
+            self.reader = None
+
+
+class ChunkInfo(NamedTuple):
+    """
+    Un blocco ricevuto dal lettore in background.
+    """
+    offset: int         # posizione nel flusso (byte ricevuti prima del blocco)
+    nbytes: int
+    timestamp: float    # time.time() alla ricezione
+
+
+class RingBufferReader:
+    """
+    Lettura continua dal Virtual JTAG in un thread, dentro un buffer
+    circolare preallocato.
+
+    Il thread legge direttamente nel bytearray; i consumatori ricevono slice
+    memoryview del buffer, senza copie. Una slice resta valida fino alla
+    richiesta successiva (read, iterazione) o a release(): solo allora il suo
+    spazio torna disponibile per il thread.
+
+    Se il buffer e' pieno i dati in arrivo vengono scartati (non quelli gia'
+    consegnati) e contati in overruns/overrun_bytes. Per ogni blocco
+    ricevuto sono registrati posizione e timestamp (chunk_info).
+
+    Esempio:
+        reader = vjtag.start_reader(capacity=4 << 20)
+        for data in reader:
+            process(data)
+    """
+
+    def __init__(self, vjtag: VirtualJTAGSerial, capacity: int = 1 << 20, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 history: int = 4096, poll_interval: float = 0.1):
+        """
+        Args:
+            vjtag: Connessione da cui leggere
+            capacity: Dimensione del buffer circolare in byte
+            chunk_size: Byte massimi per lettura
+            history: Numero di blocchi di cui tenere posizione e timestamp
+            poll_interval: Attesa massima di una lettura, per potersi fermare
+        """
+        self.vjtag = vjtag
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.chunk_info = deque(maxlen=history)
+
+        # Posizioni assolute nel flusso: ricevuti, consegnati, rilasciati
+        self.received = 0
+        self.delivered = 0
+        self.released = 0
+        self.overruns = 0
+        self.overrun_bytes = 0
+        self.error: Optional[Exception] = None
+
+        self._scratch = memoryview(bytearray(chunk_size))
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Impostato dal thread con il lock, prima dell'ultima notifica: chi si sveglia lo vede gia'
+        self._finished = False
+        self._async_waiters = []
+
+    def start(self) -> 'RingBufferReader':
+        self._stop.clear()
+        with self._condition:
+            self._finished = False
+        self._thread = threading.Thread(target=self._run, name='vjtag-reader', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._notify()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and not self._finished
+
+    @property
+    def available(self) -> int:
+        """Byte ricevuti e non ancora consegnati"""
+        return self.received - self.delivered
+
+    def _run(self):
+        timeout = self.poll_interval
+        while not self._stop.is_set():
+            with self._condition:
+                start = self.received % self.capacity
+                free = self.capacity - (self.received - self.released)
+                size = min(self.chunk_size, free, self.capacity - start)
+
+            try:
+                if size == 0:
+                    # Buffer pieno: i dati vengono letti comunque, per non bloccare il link, e scartati
+                    count = self.vjtag._read_some(self._scratch, timeout)
+                    if count:
+                        with self._condition:
+                            self.overruns += 1
+                            self.overrun_bytes += count
+                    continue
+
+                count = self.vjtag._read_some(self.view[start:start + size], timeout)
+            except Exception as e:
+                self.error = e
+                break
+
+            if count:
+                with self._condition:
+                    self.chunk_info.append(ChunkInfo(self.received, count, time.time()))
+                    self.received += count
+                self._notify()
+
+        with self._condition:
+            self._finished = True
+        self._notify()
+
+    def _notify(self):
+        with self._condition:
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def release(self):
+        """Rende riutilizzabile lo spazio dei dati gia' consegnati."""
+        with self._condition:
+            self.released = self.delivered
+
+    def _take(self, max_bytes: Optional[int]) -> memoryview:
+        # Con il lock: consegna la parte contigua dei dati disponibili
+        start = self.delivered % self.capacity
+        size = min(self.available, self.capacity - start)
+        if max_bytes is not None:
+            size = min(size, max_bytes)
+        self.delivered += size
+        return self.view[start:start + size]
+
+    def read(self, max_bytes: Optional[int] = None, timeout: Optional[float] = None) -> Optional[memoryview]:
+        """
+        Dati ricevuti, come slice del buffer (contigua: al giro del buffer
+        arriva in due letture). Rilascia i dati consegnati in precedenza.
+
+        Args:
+            max_bytes: Byte massimi da consegnare
+            timeout: Attesa massima in secondi (None: finche' arrivano dati o il lettore si ferma)
+
+        Returns:
+            memoryview: Dati, None se non e' arrivato nulla
+        """
+        self.release()
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.available or not self.running, timeout):
+                return None
+            if not self.available:
+                return None
+            return self._take(max_bytes)
+
+    def __iter__(self):
+        """
+        Slice dei dati man mano che arrivano, finche' il lettore e' attivo.
+        """
+        while True:
+            data = self.read(timeout=self.poll_interval)
+            if data is not None:
+                yield data
+            elif not self.running:
+                return
+
+    async def read_async(self, max_bytes: Optional[int] = None) -> Optional[memoryview]:
+        """
+        Versione asyncio di read: attende i dati senza bloccare l'event loop.
+
+        Returns:
+            memoryview: Dati, None se il lettore si e' fermato
+        """
+        import asyncio
+
+        self.release()
+        while True:
+            event = asyncio.Event()
+            with self._condition:
+                if self.available:
+                    return self._take(max_bytes)
+                if not self.running:
+                    return None
+                self._async_waiters.append((asyncio.get_running_loop(), event))
+            await event.wait()
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        while True:
+            data = await self.read_async()
+            if data is None:
+                return
+            yield data
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'received': self.received,
+                'delivered': self.delivered,
+                'available': self.available,
+                'capacity': self.capacity,
+                'overruns': self.overruns,
+                'overrun_bytes': self.overrun_bytes,
+                'running': self.running,
+            }
+
 
 def main():
     parser = argparse.ArgumentParser(description='Comunicazione con Virtual JTAG via Seriale')
@@ -108,11 +476,37 @@ def main():
     parser.add_argument('--write', default=0, type=int, help='Dato da scrivere')
     parser.add_argument('--read', default=True, action='store_true', help='Leggi un byte')
     parser.add_argument('--read-multiple', type=int, help='Numero di bytes da leggere')
+    parser.add_argument('--write-file', help='File da inviare in blocco (es. immagine di memoria)')
+    parser.add_argument('--read-bytes', type=int, help='Numero di bytes da ricevere in blocco')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Byte per blocco')
+    parser.add_argument('--capture', type=float, help='Secondi di acquisizione continua in background')
+    parser.add_argument('--capture-file', help='File in cui salvare i dati acquisiti')
 
     args = parser.parse_args()
 
     try:
-        with VirtualJTAGSerial(args.port, args.baudrate) as vjtag:
+        with VirtualJTAGSerial(args.port, args.baudrate, chunk_size=args.chunk_size) as vjtag:
+            if args.write_file:
+                with open(args.write_file, 'rb') as file:
+                    stats = vjtag.write_buffer(file.read())
+                print(f"Inviati {stats}")
+
+            if args.read_bytes:
+                buffer = bytearray(args.read_bytes)
+                stats = vjtag.read_into(buffer)
+                print(f"Ricevuti {stats}")
+
+            if args.capture:
+                reader = vjtag.start_reader()
+                end = time.time() + args.capture
+                with open(args.capture_file or os.devnull, 'wb') as file:
+                    while time.time() < end:
+                        data = reader.read(timeout=max(0.0, end - time.time()))
+                        if data is not None:
+                            file.write(data)
+                vjtag.stop_reader()
+                print(f"Acquisizione: {reader.stats()}")
+
             if args.write is not None:
                 success = vjtag.write_data(args.write)
                 print(f"Scrittura {'completata' if success else 'fallita'}")